@@ -0,0 +1,82 @@
+"""Media storage keys
+
+Revision ID: 2b6e9d4f8a17
+Revises: 9f4d2b7c1e63
+Create Date: 2026-10-18 10:21:44.306128
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "2b6e9d4f8a17"
+down_revision: Union[str, None] = "9f4d2b7c1e63"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Пути вида "static/images/..." становятся ключами хранилища "images/...":
+# префикс адреса добавляет хранилище (LocalStorage отдает файлы через /static).
+UPGRADE_SQL = (
+    """
+    UPDATE images
+    SET image_path = substr(image_path, length('static/') + 1)
+    WHERE image_path LIKE 'static/%'
+    """,
+    """
+    UPDATE image_blobs
+    SET path = substr(path, length('static/') + 1)
+    WHERE path LIKE 'static/%'
+    """,
+    """
+    UPDATE images
+    SET variants = (
+        SELECT jsonb_object_agg(
+            key,
+            CASE
+                WHEN value LIKE 'static/%' THEN substr(value, length('static/') + 1)
+                ELSE value
+            END
+        )
+        FROM jsonb_each_text(variants)
+    )
+    WHERE variants != '{}'
+    """,
+)
+
+DOWNGRADE_SQL = (
+    """
+    UPDATE images
+    SET image_path = 'static/' || image_path
+    WHERE image_path NOT LIKE 'static/%'
+    """,
+    """
+    UPDATE image_blobs
+    SET path = 'static/' || path
+    WHERE path NOT LIKE 'static/%'
+    """,
+    """
+    UPDATE images
+    SET variants = (
+        SELECT jsonb_object_agg(
+            key,
+            CASE
+                WHEN value LIKE 'static/%' THEN value
+                ELSE 'static/' || value
+            END
+        )
+        FROM jsonb_each_text(variants)
+    )
+    WHERE variants != '{}'
+    """,
+)
+
+
+def upgrade() -> None:
+    for stmt in UPGRADE_SQL:
+        op.execute(stmt)
+
+
+def downgrade() -> None:
+    for stmt in DOWNGRADE_SQL:
+        op.execute(stmt)
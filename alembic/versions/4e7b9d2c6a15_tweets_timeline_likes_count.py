@@ -0,0 +1,63 @@
+"""Tweets timeline likes count
+
+Revision ID: 4e7b9d2c6a15
+Revises: 8c3f1a6e4d27
+Create Date: 2026-10-21 09:27:36.418205
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "4e7b9d2c6a15"
+down_revision: Union[str, None] = "8c3f1a6e4d27"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # До этой миграции копии в home_timeline обновлялись вместе со
+    # счетчиком, поэтому он считается уже скопированным.
+    op.add_column(
+        "tweets",
+        sa.Column(
+            "timeline_likes_count", sa.Integer(), server_default="0", nullable=False
+        ),
+    )
+    op.execute(
+        """
+        UPDATE tweets
+        SET timeline_likes_count = likes_count
+        WHERE likes_count <> 0
+        """
+    )
+    op.create_index(
+        "idx_tweets_timeline_likes_pending",
+        "tweets",
+        ["id"],
+        unique=False,
+        postgresql_where=sa.text("likes_count <> timeline_likes_count"),
+    )
+
+
+def downgrade() -> None:
+    # Копии, которые еще не скопированы, догоняются перед возвратом
+    # к обновлению home_timeline в запросе лайка.
+    op.execute(
+        """
+        UPDATE home_timeline
+        SET likes_count = tweets.likes_count
+        FROM tweets
+        WHERE tweets.id = home_timeline.tweet_id
+          AND tweets.likes_count <> tweets.timeline_likes_count
+        """
+    )
+    op.drop_index(
+        "idx_tweets_timeline_likes_pending",
+        table_name="tweets",
+        postgresql_where=sa.text("likes_count <> timeline_likes_count"),
+    )
+    op.drop_column("tweets", "timeline_likes_count")
@@ -0,0 +1,35 @@
+"""Image variants
+
+Revision ID: 5c81f0e2d9a4
+Revises: e3a9c5b71d48
+Create Date: 2026-10-17 21:05:12.804316
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5c81f0e2d9a4"
+down_revision: Union[str, None] = "e3a9c5b71d48"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "images",
+        sa.Column(
+            "variants",
+            postgresql.JSONB(astext_type=sa.Text()),
+            server_default="{}",
+            nullable=False,
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("images", "variants")
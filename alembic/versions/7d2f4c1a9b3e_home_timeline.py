@@ -0,0 +1,54 @@
+"""Home timeline
+
+Revision ID: 7d2f4c1a9b3e
+Revises: 52058f176361
+Create Date: 2026-10-17 10:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "7d2f4c1a9b3e"
+down_revision: Union[str, None] = "52058f176361"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "home_timeline",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("tweet_id", sa.Integer(), nullable=False),
+        sa.Column("author_id", sa.Integer(), nullable=False),
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.ForeignKeyConstraint(["author_id"], ["users.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["tweet_id"], ["tweets.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "user_id", "tweet_id", name="idx_unique_timeline_user_to_tweet"
+        ),
+    )
+    op.create_index(
+        "idx_timeline_user_author",
+        "home_timeline",
+        ["user_id", "author_id"],
+    )
+    # Заполнение лент по уже существующим подпискам и твитам.
+    op.execute(
+        """
+        INSERT INTO home_timeline (user_id, tweet_id, author_id)
+        SELECT subscriptions.user_id, tweets.id, tweets.author_id
+        FROM subscriptions
+        JOIN tweets ON tweets.author_id = subscriptions.subscribed_to_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("idx_timeline_user_author", table_name="home_timeline")
+    op.drop_table("home_timeline")
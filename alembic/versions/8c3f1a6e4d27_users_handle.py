@@ -0,0 +1,79 @@
+"""Users handle column
+
+Revision ID: 8c3f1a6e4d27
+Revises: d2b7e4a9c1f5
+Create Date: 2026-10-20 10:41:08.274913
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8c3f1a6e4d27"
+down_revision: Union[str, None] = "d2b7e4a9c1f5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 10000
+
+users = sa.table(
+    "users",
+    sa.column("id", sa.Integer()),
+    sa.column("first_name", sa.String()),
+    sa.column("last_name", sa.String()),
+    sa.column("handle", sa.String()),
+)
+
+
+def upgrade() -> None:
+    # Регистр приводится в Python, как в make_user_handle: lower() PostgreSQL
+    # при collation "C" не меняет регистр букв не из ASCII. Упоминания
+    # существующих твитов с такими именами дописываются командой
+    # `python -m backend.cli backfill-tags`.
+    op.add_column("users", sa.Column("handle", sa.String(length=100), nullable=True))
+
+    conn = op.get_bind()
+    set_handle = (
+        users.update()
+        .where(users.c.id == sa.bindparam("user_id"))
+        .values(handle=sa.bindparam("new_handle"))
+    )
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(users.c.id, users.c.first_name, users.c.last_name)
+            .where(users.c.id > last_id)
+            .order_by(users.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        conn.execute(
+            set_handle,
+            [
+                {
+                    "user_id": row.id,
+                    "new_handle": (row.first_name + row.last_name).lower(),
+                }
+                for row in rows
+            ],
+        )
+        last_id = rows[-1].id
+
+    op.alter_column("users", "handle", nullable=False)
+    op.drop_index("idx_users_handle", table_name="users")
+    op.create_index("idx_users_handle", "users", ["handle"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("idx_users_handle", table_name="users")
+    op.create_index(
+        "idx_users_handle",
+        "users",
+        [sa.text("lower(first_name || last_name)")],
+        unique=False,
+    )
+    op.drop_column("users", "handle")
@@ -0,0 +1,47 @@
+"""Image blobs
+
+Revision ID: 9f4d2b7c1e63
+Revises: 5c81f0e2d9a4
+Create Date: 2026-10-17 22:14:37.519208
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9f4d2b7c1e63"
+down_revision: Union[str, None] = "5c81f0e2d9a4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "image_blobs",
+        sa.Column("content_hash", sa.String(length=64), nullable=False),
+        sa.Column("path", sa.String(length=128), nullable=False),
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "idx_unique_image_blobs_content_hash",
+        "image_blobs",
+        ["content_hash"],
+        unique=True,
+    )
+    op.add_column("images", sa.Column("blob_id", sa.Integer(), nullable=True))
+    op.create_index("idx_images_blob_id", "images", ["blob_id"], unique=False)
+    op.create_foreign_key(
+        "images_blob_id_fkey", "images", "image_blobs", ["blob_id"], ["id"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint("images_blob_id_fkey", "images", type_="foreignkey")
+    op.drop_index("idx_images_blob_id", table_name="images")
+    op.drop_column("images", "blob_id")
+    op.drop_index("idx_unique_image_blobs_content_hash", table_name="image_blobs")
+    op.drop_table("image_blobs")
@@ -0,0 +1,76 @@
+"""Tweet hashtags and mentions
+
+Revision ID: a6d3f8b2c9e4
+Revises: f1a7c3e9b5d2
+Create Date: 2026-10-18 19:02:27.915340
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a6d3f8b2c9e4"
+down_revision: Union[str, None] = "f1a7c3e9b5d2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Связи существующих твитов заполняются отдельно:
+    # `python -m backend.cli backfill-tags`.
+    op.create_table(
+        "hashtags",
+        sa.Column("name", sa.String(length=100), nullable=False),
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("idx_unique_hashtags_name", "hashtags", ["name"], unique=True)
+    op.create_table(
+        "tweets_hashtags",
+        sa.Column("hashtag_id", sa.Integer(), nullable=False),
+        sa.Column("tweet_id", sa.Integer(), nullable=False),
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.ForeignKeyConstraint(["hashtag_id"], ["hashtags.id"]),
+        sa.ForeignKeyConstraint(["tweet_id"], ["tweets.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "hashtag_id", "tweet_id", name="idx_unique_hashtag_to_tweet"
+        ),
+    )
+    op.create_index(
+        "idx_tweets_hashtags_tweet_id", "tweets_hashtags", ["tweet_id"], unique=False
+    )
+    op.create_table(
+        "tweets_mentions",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("tweet_id", sa.Integer(), nullable=False),
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.ForeignKeyConstraint(["tweet_id"], ["tweets.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "user_id", "tweet_id", name="idx_unique_mention_user_to_tweet"
+        ),
+    )
+    op.create_index(
+        "idx_tweets_mentions_tweet_id", "tweets_mentions", ["tweet_id"], unique=False
+    )
+    op.create_index(
+        "idx_users_handle",
+        "users",
+        [sa.text("lower(first_name || last_name)")],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("idx_users_handle", table_name="users")
+    op.drop_index("idx_tweets_mentions_tweet_id", table_name="tweets_mentions")
+    op.drop_table("tweets_mentions")
+    op.drop_index("idx_tweets_hashtags_tweet_id", table_name="tweets_hashtags")
+    op.drop_table("tweets_hashtags")
+    op.drop_index("idx_unique_hashtags_name", table_name="hashtags")
+    op.drop_table("hashtags")
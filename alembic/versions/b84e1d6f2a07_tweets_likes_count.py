@@ -0,0 +1,48 @@
+"""Tweets likes count
+
+Revision ID: b84e1d6f2a07
+Revises: 7d2f4c1a9b3e
+Create Date: 2026-10-17 12:40:05.917362
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b84e1d6f2a07"
+down_revision: Union[str, None] = "7d2f4c1a9b3e"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "tweets",
+        sa.Column("likes_count", sa.Integer(), server_default="0", nullable=False),
+    )
+    # Заполнение счетчика по уже поставленным лайкам.
+    op.execute(
+        """
+        UPDATE tweets
+        SET likes_count = likes.count
+        FROM (
+            SELECT tweet_id, count(*) AS count
+            FROM tweets_likes
+            GROUP BY tweet_id
+        ) AS likes
+        WHERE tweets.id = likes.tweet_id
+        """
+    )
+    op.create_index(
+        "idx_tweets_likes_count_id",
+        "tweets",
+        ["likes_count", "id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("idx_tweets_likes_count_id", table_name="tweets")
+    op.drop_column("tweets", "likes_count")
@@ -0,0 +1,46 @@
+"""Images created at
+
+Revision ID: c4e8a1f6d3b2
+Revises: 2b6e9d4f8a17
+Create Date: 2026-10-18 14:02:51.117604
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c4e8a1f6d3b2"
+down_revision: Union[str, None] = "2b6e9d4f8a17"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "images",
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+    )
+    op.create_index(
+        "idx_images_unattached_created_at",
+        "images",
+        ["created_at"],
+        unique=False,
+        postgresql_where=sa.text("tweet_id IS NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "idx_images_unattached_created_at",
+        table_name="images",
+        postgresql_where=sa.text("tweet_id IS NULL"),
+    )
+    op.drop_column("images", "created_at")
@@ -0,0 +1,48 @@
+"""Home timeline likes count
+
+Revision ID: d2b7e4a9c1f5
+Revises: a6d3f8b2c9e4
+Create Date: 2026-10-19 11:14:52.603118
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d2b7e4a9c1f5"
+down_revision: Union[str, None] = "a6d3f8b2c9e4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "home_timeline",
+        sa.Column("likes_count", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.execute(
+        """
+        UPDATE home_timeline
+        SET likes_count = tweets.likes_count
+        FROM tweets
+        WHERE tweets.id = home_timeline.tweet_id AND tweets.likes_count <> 0
+        """
+    )
+    op.create_index(
+        "idx_timeline_user_likes",
+        "home_timeline",
+        ["user_id", "likes_count", "tweet_id"],
+        unique=False,
+    )
+    op.create_index(
+        "idx_timeline_tweet_id", "home_timeline", ["tweet_id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("idx_timeline_tweet_id", table_name="home_timeline")
+    op.drop_index("idx_timeline_user_likes", table_name="home_timeline")
+    op.drop_column("home_timeline", "likes_count")
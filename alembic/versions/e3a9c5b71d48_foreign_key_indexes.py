@@ -0,0 +1,45 @@
+"""Foreign key and api_key indexes
+
+Revision ID: e3a9c5b71d48
+Revises: b84e1d6f2a07
+Create Date: 2026-10-17 15:02:37.551920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e3a9c5b71d48"
+down_revision: Union[str, None] = "b84e1d6f2a07"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "idx_unique_users_api_key",
+        "users",
+        ["api_key"],
+        unique=True,
+    )
+    op.create_index("idx_tweets_author_id", "tweets", ["author_id"])
+    op.create_index("idx_images_tweet_id", "images", ["tweet_id"])
+    op.create_index(
+        "idx_subscriptions_subscribed_to_user",
+        "subscriptions",
+        ["subscribed_to_id", "user_id"],
+    )
+    op.create_index(
+        "idx_tweets_likes_tweet_user",
+        "tweets_likes",
+        ["tweet_id", "user_id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("idx_tweets_likes_tweet_user", table_name="tweets_likes")
+    op.drop_index("idx_subscriptions_subscribed_to_user", table_name="subscriptions")
+    op.drop_index("idx_images_tweet_id", table_name="images")
+    op.drop_index("idx_tweets_author_id", table_name="tweets")
+    op.drop_index("idx_unique_users_api_key", table_name="users")
@@ -0,0 +1,49 @@
+"""Tweets search vector
+
+Revision ID: f1a7c3e9b5d2
+Revises: c4e8a1f6d3b2
+Create Date: 2026-10-18 17:36:09.482715
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f1a7c3e9b5d2"
+down_revision: Union[str, None] = "c4e8a1f6d3b2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Сохраняемый вычисляемый столбец заполняется для всех строк сразу,
+    # таблица tweets перезаписывается под эксклюзивной блокировкой.
+    op.add_column(
+        "tweets",
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed("to_tsvector('simple', tweet_data)", persisted=True),
+            nullable=True,
+        ),
+    )
+    op.create_index(
+        "idx_tweets_search_vector",
+        "tweets",
+        ["search_vector"],
+        unique=False,
+        postgresql_using="gin",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "idx_tweets_search_vector",
+        table_name="tweets",
+        postgresql_using="gin",
+    )
+    op.drop_column("tweets", "search_vector")
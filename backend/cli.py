@@ -0,0 +1,159 @@
+"""
+Служебные команды для обслуживания базы данных.
+
+Запуск из корня проекта: `python -m backend.cli <команда>`.
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import select
+
+from backend.config import settings
+from backend.models.db_helper import db_helper
+from backend.models.users import UserModel
+from backend.services.media_gc import collect_media_garbage
+from backend.services.tags_services import backfill_tweet_entities
+from backend.services.timeline_services import (
+    rebuild_home_timeline,
+    sync_timeline_likes,
+)
+from backend.services.tweets_services import (
+    find_likes_count_drift,
+    find_timeline_likes_drift,
+    repair_likes_count,
+)
+
+
+async def rebuild_timeline(batch_size: int) -> None:
+    """Пересборка лент всех пользователей пачками по batch_size пользователей."""
+    async with db_helper.session_factory() as session:
+        user_ids = (await session.scalars(select(UserModel.id))).all()
+        for start in range(0, len(user_ids), batch_size):
+            batch = list(user_ids[start : start + batch_size])
+            await rebuild_home_timeline(session=session, user_ids=batch)
+            print(f"Rebuilt timelines: {start + len(batch)}/{len(user_ids)}")
+
+
+async def check_likes(repair: bool, batch_size: int) -> None:
+    """Поиск расхождений счетчиков лайков и, при необходимости, их исправление."""
+    async with db_helper.session_factory() as session:
+        drift = await find_likes_count_drift(session=session)
+        for tweet_id, stored, actual in drift:
+            print(f"Tweet {tweet_id}: likes_count={stored}, actual={actual}")
+        print(f"Tweets with drift: {len(drift)}")
+        timeline_drift = await find_timeline_likes_drift(session=session)
+        print(f"Tweets with home_timeline drift: {len(timeline_drift)}")
+
+        if not repair:
+            return
+
+        tweet_ids = sorted({tweet_id for tweet_id, *_ in drift} | set(timeline_drift))
+        for start in range(0, len(tweet_ids), batch_size):
+            batch = tweet_ids[start : start + batch_size]
+            await repair_likes_count(session=session, tweet_ids=batch)
+        print(f"Repaired: {len(tweet_ids)}")
+
+
+async def sync_likes(batch_size: int) -> None:
+    """Копирование изменившихся счетчиков лайков в home_timeline."""
+    async with db_helper.session_factory() as session:
+        synced = await sync_timeline_likes(session=session, batch_size=batch_size)
+    print(f"Synced tweets: {synced}")
+
+
+async def gc_media(grace_period: float, batch_size: int, batch_delay: float) -> None:
+    """Удаление неприкрепленных изображений и файлов без записей в БД."""
+    async with db_helper.session_factory() as session:
+        report = await collect_media_garbage(
+            session=session,
+            grace_period=grace_period,
+            batch_size=batch_size,
+            batch_delay=batch_delay,
+        )
+    print(f"Deleted unattached images: {report.images}")
+    print(f"Deleted unreferenced blobs: {report.blobs}")
+    print(f"Deleted files: {report.files}")
+    print(f"Reclaimed bytes: {report.reclaimed_bytes}")
+
+
+async def backfill_tags(batch_size: int) -> None:
+    """Индексация хэштегов и упоминаний существующих твитов пачками."""
+    async with db_helper.session_factory() as session:
+        last_id, processed = 0, 0
+        while True:
+            last_id = await backfill_tweet_entities(
+                session=session, batch_size=batch_size, after_id=last_id
+            )
+            if last_id is None:
+                break
+            processed += 1
+            print(f"Indexed batches: {processed}, last tweet id: {last_id}")
+
+
+def main() -> None:
+    """Разбор аргументов командной строки и запуск команды."""
+    parser = argparse.ArgumentParser(prog="python -m backend.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    timeline_parser = commands.add_parser(
+        "rebuild-timeline",
+        help="Rebuild home timelines from subscriptions and tweets",
+    )
+    timeline_parser.add_argument("--batch-size", type=int, default=1000)
+
+    likes_parser = commands.add_parser(
+        "check-likes",
+        help="Find tweets whose likes_count differs from tweets_likes",
+    )
+    likes_parser.add_argument("--repair", action="store_true")
+    likes_parser.add_argument("--batch-size", type=int, default=1000)
+
+    sync_parser = commands.add_parser(
+        "sync-timeline-likes",
+        help="Copy changed likes_count values into home_timeline",
+    )
+    sync_parser.add_argument(
+        "--batch-size", type=int, default=settings.timeline_likes_sync_batch_size
+    )
+
+    gc_parser = commands.add_parser(
+        "gc-media",
+        help="Delete unattached images and image files without database rows",
+    )
+    gc_parser.add_argument(
+        "--grace-period", type=float, default=settings.media_gc_grace_period
+    )
+    gc_parser.add_argument(
+        "--batch-size", type=int, default=settings.media_gc_batch_size
+    )
+    gc_parser.add_argument(
+        "--batch-delay", type=float, default=settings.media_gc_batch_delay
+    )
+
+    tags_parser = commands.add_parser(
+        "backfill-tags",
+        help="Index hashtags and mentions of existing tweets",
+    )
+    tags_parser.add_argument("--batch-size", type=int, default=1000)
+
+    args = parser.parse_args()
+    if args.command == "rebuild-timeline":
+        asyncio.run(rebuild_timeline(batch_size=args.batch_size))
+    elif args.command == "check-likes":
+        asyncio.run(check_likes(repair=args.repair, batch_size=args.batch_size))
+    elif args.command == "sync-timeline-likes":
+        asyncio.run(sync_likes(batch_size=args.batch_size))
+    elif args.command == "gc-media":
+        asyncio.run(
+            gc_media(
+                grace_period=args.grace_period,
+                batch_size=args.batch_size,
+                batch_delay=args.batch_delay,
+            )
+        )
+    elif args.command == "backfill-tags":
+        asyncio.run(backfill_tags(batch_size=args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,97 @@
-from typing import Annotated
+import asyncio
+import os
+from contextlib import asynccontextmanager, suppress
+from typing import Annotated, AsyncIterator
+from urllib.parse import urljoin
 
-from fastapi import Depends, FastAPI, Request, UploadFile
+from fastapi import BackgroundTasks, Depends, FastAPI, Path, Request, UploadFile
 from fastapi.openapi.utils import get_openapi
 from sqlalchemy.ext.asyncio import AsyncSession
-from starlette.responses import HTMLResponse, JSONResponse
+from starlette.responses import HTMLResponse, JSONResponse, RedirectResponse
 from starlette.staticfiles import StaticFiles
 from starlette.templating import Jinja2Templates
 
-from backend.config import STATIC_DIR
+from backend.config import STATIC_DIR, settings
+from backend.middlewares import MaxBodySizeMiddleware
 from backend.models.db_helper import db_helper
+from backend.responses import model_response
 from backend.routes.tweets_routes import router as tweets_router
 from backend.routes.users_rouets import router as users_router
 from backend.schemas import Error, OutMediaSchema
-from backend.services.medias_services import add_image_path_to_db, save_image
-from backend.services.security import get_user_id_from_api_key
+from backend.services.image_processing import (
+    ImageTooLarge,
+    ProcessingQueueFull,
+    image_processor,
+)
+from backend.services.media_gc import run_media_gc_periodically
+from backend.services.medias_services import (
+    create_image_variants_task,
+    get_image_variant,
+    save_image,
+    spool_upload,
+)
+from backend.services.security import api_key_cache, get_user_id_from_api_key
+from backend.services.storage import media_storage
+from backend.services.timeline_services import run_timeline_likes_sync_periodically
 from backend.tests.factories import generate_data
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """
+    Application lifespan: start the media garbage collector and the timeline
+    likes sync if enabled, release database connections and workers on shutdown.
+    """
+    tasks = []
+    if settings.media_gc_interval > 0:
+        tasks.append(
+            asyncio.create_task(run_media_gc_periodically(settings.media_gc_interval))
+        )
+    if settings.timeline_likes_sync_interval > 0:
+        tasks.append(
+            asyncio.create_task(
+                run_timeline_likes_sync_periodically(
+                    settings.timeline_likes_sync_interval
+                )
+            )
+        )
+    yield
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    image_processor.shutdown()
+    await db_helper.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(tweets_router)
 app.include_router(users_router)
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 templates = Jinja2Templates(directory=STATIC_DIR)
+app.add_middleware(
+    MaxBodySizeMiddleware,
+    max_size=settings.image_max_upload_bytes,
+    paths=frozenset(("/api/medias",)),
+)
+
+READ_METHODS = frozenset(("GET", "HEAD", "OPTIONS"))
+
+
+@app.middleware("http")
+async def track_writes(request: Request, call_next):
+    """
+    Keep reads of a client on the primary for a while after its writes.
+
+    Only requests that passed API key authentication are tracked, so
+    rejected keys do not fill the read-your-writes window.
+    """
+    response = await call_next(request)
+    authenticated = getattr(request.state, "user_id", None) is not None
+    if authenticated and request.method not in READ_METHODS:
+        db_helper.recent_writes.mark(request.headers["api-key"])
+    return response
 
 
 @app.get("/openapi.json", tags=["documentation"])
@@ -43,14 +113,22 @@ async def get_open_api_endpoint(
     status_code=201,
     tags=["tweets"],
     response_model=OutMediaSchema,
-    responses={415: {"model": Error}},
+    responses={413: {"model": Error}, 415: {"model": Error}, 503: {"model": Error}},
 )
 async def upload_image(
     file: UploadFile,
+    background_tasks: BackgroundTasks,
     _: Annotated[int, Depends(get_user_id_from_api_key)],
-    session: AsyncSession = Depends(db_helper.scoped_session_dependency),
+    session: AsyncSession = Depends(db_helper.request_session_dependency),
 ):
-    """Upload an image. Expects a JPEG or PNG image."""
+    """
+    Upload an image. Expects a JPEG or PNG image.
+
+    The request body is limited to IMAGE_MAX_UPLOAD_BYTES and the image
+    to IMAGE_MAX_PIXELS pixels. The upload is streamed to a temporary file
+    instead of being read into memory.
+    Resized copies are created after the response is sent.
+    """
     error = Error(
         error_type="Media Type error",
         error_message="Only JPEG and PNG images are allowed.",
@@ -59,15 +137,79 @@ async def upload_image(
     if file.content_type not in {"image/jpeg", "image/png"}:
         return JSONResponse(status_code=415, content=error.model_dump())
 
-    file_data = await file.read()
     try:
-        image_path = await save_image(image=file_data)
+        upload_path = await asyncio.to_thread(
+            spool_upload,
+            file.file,
+            settings.image_max_upload_bytes,
+        )
+        try:
+            image = await save_image(session=session, image=upload_path)
+        finally:
+            await asyncio.to_thread(os.unlink, upload_path)
     except TypeError:
         return JSONResponse(status_code=415, content=error.model_dump())
+    except ImageTooLarge as exc:
+        size_error = Error(error_type="Payload too large", error_message=str(exc))
+        return JSONResponse(status_code=413, content=size_error.model_dump())
+    except ProcessingQueueFull as exc:
+        busy_error = Error(error_type="Service unavailable", error_message=str(exc))
+        return JSONResponse(
+            status_code=503,
+            content=busy_error.model_dump(),
+            headers={"Retry-After": "1"},
+        )
 
-    image_id = await add_image_path_to_db(session=session, photo_path=image_path)
+    background_tasks.add_task(create_image_variants_task, image.id, image.image_path)
 
-    return OutMediaSchema(media_id=image_id)
+    return model_response(OutMediaSchema(media_id=image.id), status_code=201)
+
+
+@app.get(
+    "/api/medias/{image_id}/variants/{size}",
+    status_code=307,
+    tags=["tweets"],
+    responses={404: {"model": Error}, 503: {"model": Error}},
+)
+async def get_image_variant_file(
+    image_id: Annotated[int, Path(gt=0)],
+    size: Annotated[int, Path(gt=0)],
+    session: AsyncSession = Depends(db_helper.request_session_dependency),
+):
+    """
+    Redirect to a resized copy of an image, creating it if it does not exist yet.
+
+    Does not require an api-key, so it can be used as an image source.
+    Each variant is encoded once: concurrent requests for the same variant
+    wait for the first one instead of queueing their own processing tasks.
+    """
+    try:
+        key = await get_image_variant(session=session, image_id=image_id, size=size)
+    except ValueError as exc:
+        error = Error(error_type="Not found", error_message=str(exc))
+        return JSONResponse(status_code=404, content=error.model_dump())
+    except ProcessingQueueFull as exc:
+        busy_error = Error(error_type="Service unavailable", error_message=str(exc))
+        return JSONResponse(
+            status_code=503,
+            content=busy_error.model_dump(),
+            headers={"Retry-After": "1"},
+        )
+
+    return RedirectResponse(url=urljoin("/", media_storage.url(key)), status_code=307)
+
+
+@app.get("/stats", tags=["monitoring"])
+async def get_stats(
+    _: Annotated[int, Depends(get_user_id_from_api_key)],
+) -> dict:
+    """Get in-process cache, connection pool and image processing statistics."""
+    return {
+        "api_key_cache": api_key_cache.stats(),
+        "db_pool": db_helper.pool_stats(),
+        "db_replica_pools": db_helper.replica_pool_stats(),
+        "image_processing": image_processor.stats(),
+    }
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -78,7 +220,7 @@ async def root(request: Request):
 
 @app.get("/test/generate_data")
 async def create_test_data(
-    session: AsyncSession = Depends(db_helper.scoped_session_dependency),
+    session: AsyncSession = Depends(db_helper.request_session_dependency),
 ):
     """Create test data."""
     await generate_data(session=session)
@@ -0,0 +1,71 @@
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from backend.schemas import Error
+
+
+class BodyTooLarge(Exception):
+    """Тело запроса больше допустимого размера."""
+
+
+class MaxBodySizeMiddleware:
+    """
+    Ограничение размера тела запросов к указанным путям.
+
+    Запрос с заголовком Content-Length больше max_size отклоняется с 413
+    до чтения тела. Тело без Content-Length или с неверным заголовком
+    считается по мере получения и обрывается, как только превысит max_size.
+    Ответ приложения на оборванное тело (FastAPI превращает ошибку чтения
+    тела в 400) заменяется на 413.
+    """
+
+    def __init__(self, app: ASGIApp, max_size: int, paths: frozenset[str]):
+        """Инициализация middleware для путей paths."""
+        self.app = app
+        self.max_size = max_size
+        self.paths = paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Обработка запроса с подсчетом полученных байт тела."""
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit():
+                if int(value) > self.max_size:
+                    await self._reject(scope, receive, send)
+                    return
+
+        received = 0
+        exceeded = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_size:
+                    exceeded = True
+                    raise BodyTooLarge
+            return message
+
+        async def guarded_send(message: Message) -> None:
+            if not exceeded:
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not exceeded:
+                raise
+        if exceeded:
+            await self._reject(scope, receive, send)
+
+    async def _reject(self, scope: Scope, receive: Receive, send: Send) -> None:
+        error = Error(
+            error_type="Payload too large",
+            error_message=f"Request body is larger than {self.max_size} bytes",
+        )
+        response = JSONResponse(status_code=413, content=error.model_dump())
+        await response(scope, receive, send)
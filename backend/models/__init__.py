@@ -2,16 +2,23 @@ __all__ = (
     "Base",
     "DatabaseHelper",
     "db_helper",
+    "HashtagModel",
+    "HomeTimelineModel",
+    "ImageBlobModel",
     "ImageModel",
     "UserModel",
     "TweetModel",
     "SubscriptionModel",
     "TweetLikes",
+    "TweetHashtagModel",
+    "TweetMentionModel",
 )
 
 from backend.models.base import Base
 from backend.models.db_helper import DatabaseHelper, db_helper
-from backend.models.images import ImageModel
+from backend.models.hashtags import HashtagModel, TweetHashtagModel, TweetMentionModel
+from backend.models.home_timeline import HomeTimelineModel
+from backend.models.images import ImageBlobModel, ImageModel
 from backend.models.likes_tweets import TweetLikes
 from backend.models.tweets import TweetModel
 from backend.models.users import SubscriptionModel, UserModel
@@ -1,52 +1,223 @@
-from asyncio import current_task
-from typing import AsyncGenerator
-
-from sqlalchemy.ext.asyncio import (
-    AsyncSession,
-    async_scoped_session,
-    async_sessionmaker,
-    create_async_engine,
-)
+import time
+from collections import OrderedDict
+from typing import AsyncGenerator, Sequence
+
+from fastapi import Request
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.pool.base import ConnectionPoolEntry
 
 from backend.config import settings
 
 
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Пул соединений, который считает время ожидания свободного соединения."""
+
+    def __init__(self, *args, **kwargs):
+        """Инициализация пула и счетчиков ожидания."""
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            wait_time = time.perf_counter() - start
+            self.checkouts += 1
+            self.wait_time_total += wait_time
+            self.wait_time_max = max(self.wait_time_max, wait_time)
+
+    def stats(self) -> dict:
+        """Состояние пула и статистика ожидания соединений (время в мс)."""
+        return {
+            "size": self.size(),
+            "checked_in": self.checkedin(),
+            "checked_out": self.checkedout(),
+            "overflow": self.overflow(),
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_time_total_ms": self.wait_time_total * 1000,
+            "wait_time_max_ms": self.wait_time_max * 1000,
+        }
+
+
+class RecentWrites:
+    """
+    Окно read-your-writes: клиенты, недавно выполнявшие запись.
+
+    Чтения таких клиентов идут на основную БД, пока реплики могут отставать.
+    """
+
+    def __init__(self, window: float, max_size: int = 100000):
+        """Инициализация окна длительностью window секунд."""
+        self.window = window
+        self.max_size = max_size
+        self._deadlines: OrderedDict[str, float] = OrderedDict()
+
+    def mark(self, client_key: str) -> None:
+        """Отметка записи, выполненной клиентом."""
+        self._deadlines[client_key] = time.monotonic() + self.window
+        self._deadlines.move_to_end(client_key)
+        while len(self._deadlines) > self.max_size:
+            self._deadlines.popitem(last=False)
+
+    def is_recent(self, client_key: str) -> bool:
+        """Находится ли клиент в окне после своей записи."""
+        deadline = self._deadlines.get(client_key)
+        if deadline is None:
+            return False
+        if deadline <= time.monotonic():
+            self._deadlines.pop(client_key)
+            return False
+
+        return True
+
+
 class DatabaseHelper:
-    """Класс для работы с БД."""
+    """Класс для работы с БД и ее репликами для чтения."""
 
-    def __init__(self, url: str, echo: bool = False):
-        """Инициализируется с параметрами для создания engine."""
-        self.engine = create_async_engine(
-            url=url,
-            echo=echo,
-        )
-        self.session_factory = async_sessionmaker(
-            bind=self.engine,
+    def __init__(
+        self,
+        url: str,
+        echo: bool = False,
+        pool_size: int = 5,
+        max_overflow: int = 10,
+        pool_timeout: float = 30,
+        pool_recycle: int = -1,
+        pool_pre_ping: bool = False,
+        prepare_threshold: int | None = 5,
+        replica_urls: Sequence[str] = (),
+        read_your_writes_window: float = 5,
+    ):
+        """
+        Инициализируется с параметрами для создания engine и пула соединений.
+
+        Для каждого URL из replica_urls создается отдельный engine
+        с такими же параметрами пула.
+        """
+        engine_options = {
+            "echo": echo,
+            "poolclass": InstrumentedPool,
+            "pool_size": pool_size,
+            "max_overflow": max_overflow,
+            "pool_timeout": pool_timeout,
+            "pool_recycle": pool_recycle,
+            "pool_pre_ping": pool_pre_ping,
+            "connect_args": {"prepare_threshold": prepare_threshold},
+        }
+        self.engine = create_async_engine(url=url, **engine_options)
+        self.session_factory = self._create_session_factory(self.engine)
+
+        self.replica_engines = [
+            create_async_engine(url=replica_url, **engine_options)
+            for replica_url in replica_urls
+        ]
+        self.replica_session_factories = [
+            self._create_session_factory(engine) for engine in self.replica_engines
+        ]
+        self.recent_writes = RecentWrites(window=read_your_writes_window)
+        self._next_replica = 0
+
+    @staticmethod
+    def _create_session_factory(engine) -> async_sessionmaker[AsyncSession]:
+        return async_sessionmaker(
+            bind=engine,
             autoflush=False,
             autocommit=False,
             expire_on_commit=False,
         )
 
-    def get_scoped_session(self):
-        """Создание и получение объекта асинхронной сессии область действия asyncio."""
-        return async_scoped_session(
-            session_factory=self.session_factory,
-            scopefunc=current_task,
-        )
+    def pool_stats(self) -> dict:
+        """Статистика пула соединений основной БД."""
+        return self.engine.pool.stats()
+
+    def replica_pool_stats(self) -> list[dict]:
+        """Статистика пулов соединений реплик."""
+        return [engine.pool.stats() for engine in self.replica_engines]
+
+    def get_read_session_factory(
+        self,
+        client_key: str | None,
+    ) -> async_sessionmaker[AsyncSession]:
+        """
+        Выбор фабрики сессий для чтения.
+
+        Реплики выбираются по кругу. Основная БД используется, если реплик нет
+        или клиент недавно выполнял запись (read-your-writes).
+        """
+        if not self.replica_session_factories:
+            return self.session_factory
+        if client_key is not None and self.recent_writes.is_recent(client_key):
+            return self.session_factory
+
+        index = self._next_replica % len(self.replica_session_factories)
+        self._next_replica = index + 1
+        return self.replica_session_factories[index]
+
+    async def dispose(self) -> None:
+        """Закрытие соединений основной БД и реплик."""
+        await self.engine.dispose()
+        for engine in self.replica_engines:
+            await engine.dispose()
 
     async def session_dependency(self) -> AsyncGenerator[AsyncSession, None]:
         """Возвращает генератор с асинхронной сессией."""
         async with self.session_factory() as session:
             yield session
 
-    async def scoped_session_dependency(self) -> AsyncGenerator[AsyncSession, None]:
-        """Возвращает генератор с сессией с ограниченной областью действия."""
-        session = self.get_scoped_session()
-        yield session
-        await session.close()
+    async def request_session_dependency(
+        self,
+        request: Request,
+    ) -> AsyncGenerator[AsyncSession, None]:
+        """
+        Возвращает генератор с одной сессией на запрос.
+
+        FastAPI кэширует зависимость в пределах запроса, поэтому авторизация
+        и обработчик получают одну и ту же сессию. Для маршрутов, отмеченных
+        read_only_dependency, сессия открывается на реплике (клиент определяется
+        по заголовку api-key). При ошибке транзакция откатывается,
+        а сессия закрывается в любом случае.
+        """
+        if getattr(request.state, "read_only", False):
+            api_key = request.headers.get("api-key")
+            session_factory = self.get_read_session_factory(api_key)
+        else:
+            session_factory = self.session_factory
+
+        async with session_factory() as session:
+            try:
+                yield session
+            except Exception:
+                await session.rollback()
+                raise
+
+    async def read_only_dependency(self, request: Request) -> None:
+        """
+        Отметка маршрута как выполняющего только чтение.
+
+        Указывается в dependencies декоратора маршрута: такие зависимости
+        выполняются до параметров обработчика и до создания сессии запроса.
+        """
+        request.state.read_only = True
 
 
 db_helper = DatabaseHelper(
     url=settings.db_url,
     echo=settings.echo,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
+    pool_pre_ping=settings.db_pool_pre_ping,
+    prepare_threshold=settings.prepare_threshold,
+    replica_urls=settings.db_replica_urls,
+    read_your_writes_window=settings.db_read_your_writes_window,
 )
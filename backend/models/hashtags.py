@@ -0,0 +1,59 @@
+from sqlalchemy import ForeignKey, Index, String, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+from backend.models.base import Base
+
+
+class HashtagModel(Base):
+    """Модель хэштега. Имя хранится в нижнем регистре, без символа #."""
+
+    __tablename__ = "hashtags"
+    __table_args__ = (Index("idx_unique_hashtags_name", "name", unique=True),)
+
+    name: Mapped[str] = mapped_column(String(100))
+
+
+class TweetHashtagModel(Base):
+    """
+    Модель связи хэштега и твита.
+
+    Id твитов монотонно растут, поэтому уникальный индекс (hashtag_id, tweet_id)
+    служит ключом (хэштег, время, твит) для чтения твитов по хэштегу диапазоном.
+    """
+
+    __tablename__ = "tweets_hashtags"
+    __table_args__ = (
+        UniqueConstraint(
+            "hashtag_id",
+            "tweet_id",
+            name="idx_unique_hashtag_to_tweet",
+        ),
+        # Каскадное удаление связей твита.
+        Index("idx_tweets_hashtags_tweet_id", "tweet_id"),
+    )
+
+    hashtag_id: Mapped[int] = mapped_column(ForeignKey("hashtags.id"))
+    tweet_id: Mapped[int] = mapped_column(ForeignKey("tweets.id", ondelete="CASCADE"))
+
+
+class TweetMentionModel(Base):
+    """
+    Модель упоминания пользователя в твите.
+
+    Уникальный индекс (user_id, tweet_id) служит ключом (пользователь, время,
+    твит) для чтения упоминаний пользователя диапазоном.
+    """
+
+    __tablename__ = "tweets_mentions"
+    __table_args__ = (
+        UniqueConstraint(
+            "user_id",
+            "tweet_id",
+            name="idx_unique_mention_user_to_tweet",
+        ),
+        # Каскадное удаление упоминаний в твите.
+        Index("idx_tweets_mentions_tweet_id", "tweet_id"),
+    )
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
+    tweet_id: Mapped[int] = mapped_column(ForeignKey("tweets.id", ondelete="CASCADE"))
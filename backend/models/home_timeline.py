@@ -0,0 +1,40 @@
+from sqlalchemy import ForeignKey, Index, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+from backend.models.base import Base
+
+
+class HomeTimelineModel(Base):
+    """
+    Модель материализованной ленты пользователя.
+
+    Строка означает, что твит tweet_id попадает в ленту пользователя user_id.
+    Id твитов монотонно растут, поэтому уникальный индекс (user_id, tweet_id)
+    служит ключом (пользователь, время, твит) для чтения ленты диапазоном.
+
+    likes_count - копия счетчика лайков твита: лента сортируется по нему, и
+    индекс (user_id, likes_count, tweet_id) позволяет читать страницу ленты
+    диапазоном внутри ленты пользователя, а не обходом индекса всех твитов.
+    Лайк меняет только счетчик в tweets: копии обновляются пачками вне
+    запроса лайка (sync_timeline_likes) и отстают на интервал синхронизации.
+    """
+
+    __tablename__ = "home_timeline"
+    __table_args__ = (
+        UniqueConstraint(
+            "user_id",
+            "tweet_id",
+            name="idx_unique_timeline_user_to_tweet",
+        ),
+        Index("idx_timeline_user_author", "user_id", "author_id"),
+        Index("idx_timeline_user_likes", "user_id", "likes_count", "tweet_id"),
+        # Обновление счетчиков и каскадное удаление строк твита.
+        Index("idx_timeline_tweet_id", "tweet_id"),
+    )
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
+    tweet_id: Mapped[int] = mapped_column(ForeignKey("tweets.id", ondelete="CASCADE"))
+    author_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"),
+    )
+    likes_count: Mapped[int] = mapped_column(default=0, server_default="0")
@@ -1,15 +1,57 @@
-from sqlalchemy import ForeignKey, String
+from datetime import datetime
+
+from sqlalchemy import DateTime, ForeignKey, Index, String, func, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column
 
 from backend.models.base import Base
 
 
+class ImageBlobModel(Base):
+    """
+    Модель файла изображения, адресуемого по хэшу содержимого.
+
+    Одинаковые загрузки ссылаются на один файл. Файл удаляется вместе
+    с последним ссылающимся на него изображением.
+    """
+
+    __tablename__ = "image_blobs"
+    __table_args__ = (
+        Index("idx_unique_image_blobs_content_hash", "content_hash", unique=True),
+    )
+
+    content_hash: Mapped[str] = mapped_column(String(64))
+    path: Mapped[str] = mapped_column(String(128))
+
+
 class ImageModel(Base):
     """Модель изображения."""
 
     __tablename__ = "images"
+    __table_args__ = (
+        Index("idx_images_tweet_id", "tweet_id"),
+        Index("idx_images_blob_id", "blob_id"),
+        # Поиск неприкрепленных изображений сборщиком мусора (media_gc).
+        Index(
+            "idx_images_unattached_created_at",
+            "created_at",
+            postgresql_where=text("tweet_id IS NULL"),
+        ),
+    )
 
     image_path: Mapped[str] = mapped_column(String(128))
+    # Изображения, загруженные до хранения по хэшу, ссылаются только на файл.
+    blob_id: Mapped[int | None] = mapped_column(ForeignKey("image_blobs.id"))
     tweet_id: Mapped[int | None] = mapped_column(
         ForeignKey("tweets.id", ondelete="CASCADE"),
     )
+    # Ключи уменьшенных копий по размеру большей стороны: {"150": "images/..."}.
+    variants: Mapped[dict[str, str]] = mapped_column(
+        JSONB,
+        default=dict,
+        server_default="{}",
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import ForeignKey, UniqueConstraint
+from sqlalchemy import ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column
 
 from backend.models.base import Base
@@ -14,6 +14,8 @@ class TweetLikes(Base):
             "tweet_id",
             name="idx_unique_user_to_tweet",
         ),
+        # Лайкнувшие твит пользователи и каскадное удаление лайков твита.
+        Index("idx_tweets_likes_tweet_user", "tweet_id", "user_id"),
     )
 
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
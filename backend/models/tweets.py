@@ -1,6 +1,7 @@
 from typing import TYPE_CHECKING
 
-from sqlalchemy import ForeignKey, String
+from sqlalchemy import Computed, ForeignKey, Index, String, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -10,28 +11,56 @@ if TYPE_CHECKING:
     from backend.models.images import ImageModel
     from backend.models.users import UserModel
 
+# Конфигурация полнотекстового поиска: без стемминга и стоп-слов,
+# так как твиты пишутся на разных языках. Запросы поиска должны
+# использовать ту же конфигурацию, иначе индекс не применяется.
+SEARCH_CONFIG = "simple"
+
 
 class TweetModel(Base):
     """Модель твита."""
 
     __tablename__ = "tweets"
+    __table_args__ = (
+        Index("idx_tweets_likes_count_id", "likes_count", "id"),
+        Index("idx_tweets_author_id", "author_id"),
+        Index("idx_tweets_search_vector", "search_vector", postgresql_using="gin"),
+        # Твиты, счетчик которых еще не скопирован в home_timeline.
+        Index(
+            "idx_tweets_timeline_likes_pending",
+            "id",
+            postgresql_where=text("likes_count <> timeline_likes_count"),
+        ),
+    )
 
     author_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
     tweet_data: Mapped[str] = mapped_column(String(500))
+    likes_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    # Значение likes_count, последним скопированное в home_timeline
+    # (sync_timeline_likes).
+    timeline_likes_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    # Вычисляется PostgreSQL при вставке и изменении текста твита.
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(f"to_tsvector('{SEARCH_CONFIG}', tweet_data)", persisted=True),
+        deferred=True,
+    )
     images: Mapped[list["ImageModel"]] = relationship(
         backref="tweet",
         cascade="all, delete-orphan",
-        lazy="joined",
+        lazy="raise",
+        order_by="ImageModel.id",
     )
 
-    author: Mapped["UserModel"] = relationship(back_populates="tweets", lazy="joined")
+    author: Mapped["UserModel"] = relationship(back_populates="tweets", lazy="raise")
     liked_by: Mapped[list["UserModel"]] = relationship(
         secondary="tweets_likes",
         back_populates="liked_tweets",
-        lazy="joined",
+        lazy="raise",
+        order_by="TweetLikes.id",
     )
 
     @hybrid_property
     def count_likes(self):
-        """Подсчитывает количество лайков у данного твита."""
-        return len(self.liked_by)
+        """Количество лайков у данного твита по денормализованному счетчику."""
+        return self.likes_count
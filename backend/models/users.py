@@ -1,7 +1,15 @@
 from typing import TYPE_CHECKING
 from uuid import UUID, uuid4
 
-from sqlalchemy import CheckConstraint, ForeignKey, String, UniqueConstraint, func
+from sqlalchemy import (
+    CheckConstraint,
+    ForeignKey,
+    Index,
+    String,
+    UniqueConstraint,
+    func,
+)
+from sqlalchemy.engine.default import DefaultExecutionContext
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from backend.models.base import Base
@@ -24,16 +32,43 @@ class SubscriptionModel(Base):
             "user_id != subscribed_to_id",
             name="ck_user_not_subscribed_to_self",
         ),
+        # Подписчики пользователя и рассылка твитов по лентам.
+        Index("idx_subscriptions_subscribed_to_user", "subscribed_to_id", "user_id"),
     )
 
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
     subscribed_to_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
 
 
+def make_user_handle(first_name: str, last_name: str) -> str:
+    """
+    Имя, по которому пользователя упоминают в твитах: @ИмяФамилия.
+
+    Регистр приводится в Python, а не функцией lower() PostgreSQL: при
+    collation "C" она не меняет регистр букв не из ASCII.
+    """
+    return (first_name + last_name).lower()
+
+
+def _default_handle(context: DefaultExecutionContext) -> str:
+    params = context.get_current_parameters()
+    return make_user_handle(params["first_name"], params["last_name"])
+
+
 class UserModel(Base):
-    """Модель пользователя."""
+    """
+    Модель пользователя.
+
+    handle вычисляется из имени и фамилии при вставке и не уникален:
+    упоминание относится ко всем пользователям с тем же handle.
+    """
 
     __tablename__ = "users"
+    __table_args__ = (
+        Index("idx_unique_users_api_key", "api_key", unique=True),
+        # Поиск упомянутых пользователей (tags_services.index_tweet_entities).
+        Index("idx_users_handle", "handle"),
+    )
 
     api_key: Mapped[UUID] = mapped_column(
         default=uuid4,
@@ -42,6 +77,7 @@ class UserModel(Base):
     first_name: Mapped[str] = mapped_column(String(50))
     last_name: Mapped[str] = mapped_column(String(50))
     email: Mapped[str] = mapped_column(String(50))
+    handle: Mapped[str] = mapped_column(String(100), default=_default_handle)
 
     following: Mapped[list["UserModel"]] = relationship(
         secondary="subscriptions",
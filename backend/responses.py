@@ -0,0 +1,25 @@
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+from starlette.responses import Response
+
+from backend.config import settings
+
+
+class ModelORJSONResponse(ORJSONResponse):
+    """Ответ, который кодирует уже провалидированную pydantic-модель через orjson."""
+
+    def render(self, content: BaseModel) -> bytes:
+        """Кодирование модели без повторной валидации."""
+        return super().render(content.model_dump())
+
+
+def model_response(model: BaseModel, status_code: int = 200) -> BaseModel | Response:
+    """
+    Подготовка успешного ответа из уже провалидированной модели.
+
+    При включенной настройке fast_json модель сразу кодируется через orjson,
+    и FastAPI не валидирует и не сериализует ее повторно по response_model.
+    """
+    if settings.fast_json:
+        return ModelORJSONResponse(model, status_code=status_code)
+    return model
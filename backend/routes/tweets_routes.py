@@ -1,11 +1,12 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, Path
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, BackgroundTasks, Depends, Path, Query
+from fastapi.responses import JSONResponse, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from backend.config import MAX_NUMBER
+from backend.config import MAX_NUMBER, settings
 from backend.models.db_helper import db_helper
+from backend.responses import model_response
 from backend.schemas import (
     BaseResponse,
     CreateTweetSchema,
@@ -13,14 +14,26 @@ from backend.schemas import (
     OutTweetIDSchema,
     OutTweetsSchema,
 )
-from backend.services.other_services import get_tweet
+from backend.services.feed_sql_services import render_tweet_feed_json
+from backend.services.medias_services import release_image_blobs_task
 from backend.services.security import get_user_id_from_api_key
+from backend.services.tags_services import (
+    decode_tweet_id_cursor,
+    encode_tweet_id_cursor,
+    get_mentions_tweets_db,
+    get_tweets_by_tag_db,
+)
 from backend.services.tweets_services import (
     add_like_to_tweet_db,
     create_tweet_db,
+    decode_feed_cursor,
+    decode_search_cursor,
     delete_tweet_db,
+    encode_feed_cursor,
+    encode_search_cursor,
     get_tweet_feed_db,
     remove_like_from_tweet_db,
+    search_tweets_db,
     serialize_tweets,
 )
 
@@ -36,7 +49,7 @@ router = APIRouter(prefix="/api/tweets", tags=["tweets"])
 async def add_tweet(
     tweet_data: CreateTweetSchema,
     current_user_id: Annotated[int, Depends(get_user_id_from_api_key)],
-    session: AsyncSession = Depends(db_helper.scoped_session_dependency),
+    session: AsyncSession = Depends(db_helper.request_session_dependency),
 ):
     """Create a tweet."""
     try:
@@ -49,19 +62,192 @@ async def add_tweet(
         error = Error(error_type="Bad Request", error_message=str(exc))
         return JSONResponse(status_code=400, content=error.model_dump())
 
-    return OutTweetIDSchema(tweet_id=tweet_id)
+    return model_response(OutTweetIDSchema(tweet_id=tweet_id), status_code=201)
 
 
-@router.get("", response_model=OutTweetsSchema)
+@router.get(
+    "",
+    response_model=OutTweetsSchema,
+    responses={400: {"model": Error}},
+    dependencies=[Depends(db_helper.read_only_dependency)],
+)
 async def get_tweet_feed(
     current_user_id: Annotated[int, Depends(get_user_id_from_api_key)],
-    session: AsyncSession = Depends(db_helper.scoped_session_dependency),
+    limit: Annotated[
+        int,
+        Query(gt=0, le=settings.feed_max_page_size),
+    ] = settings.feed_page_size,
+    cursor: Annotated[
+        str | None,
+        Query(description="The next_cursor value from the previous page"),
+    ] = None,
+    session: AsyncSession = Depends(db_helper.request_session_dependency),
+):
+    """Get a page of the tweet feed."""
+    try:
+        position = decode_feed_cursor(cursor) if cursor else None
+    except ValueError as exc:
+        error = Error(error_type="Bad Request", error_message=str(exc))
+        return JSONResponse(status_code=400, content=error.model_dump())
+
+    if settings.feed_renderer == "sql":
+        document = await render_tweet_feed_json(
+            session=session,
+            user_id=current_user_id,
+            limit=limit,
+            cursor=position,
+        )
+        return Response(content=document, media_type="application/json")
+
+    rows = await get_tweet_feed_db(
+        session=session,
+        user_id=current_user_id,
+        limit=limit,
+        cursor=position,
+    )
+    tweets = await serialize_tweets([tweet for tweet, _ in rows])
+    next_cursor = None
+    if len(rows) == limit:
+        next_cursor = encode_feed_cursor(*rows[-1])
+
+    return model_response(OutTweetsSchema(tweets=tweets, next_cursor=next_cursor))
+
+
+@router.get(
+    "/search",
+    response_model=OutTweetsSchema,
+    responses={400: {"model": Error}},
+    dependencies=[Depends(db_helper.read_only_dependency)],
+)
+async def search_tweets(
+    q: Annotated[
+        str,
+        Query(
+            min_length=1,
+            max_length=500,
+            description='Words to find. Supports "phrases", OR and -excluded words',
+        ),
+    ],
+    _: Annotated[int, Depends(get_user_id_from_api_key)],
+    limit: Annotated[
+        int,
+        Query(gt=0, le=settings.feed_max_page_size),
+    ] = settings.feed_page_size,
+    cursor: Annotated[
+        str | None,
+        Query(description="The next_cursor value from the previous page"),
+    ] = None,
+    session: AsyncSession = Depends(db_helper.request_session_dependency),
+):
+    """Get a page of tweets matching a full-text query, most relevant first."""
+    try:
+        position = decode_search_cursor(cursor) if cursor else None
+    except ValueError as exc:
+        error = Error(error_type="Bad Request", error_message=str(exc))
+        return JSONResponse(status_code=400, content=error.model_dump())
+
+    found = await search_tweets_db(
+        session=session,
+        query=q,
+        limit=limit,
+        cursor=position,
+    )
+    tweets = await serialize_tweets([tweet for tweet, _ in found])
+    next_cursor = None
+    if len(found) == limit:
+        next_cursor = encode_search_cursor(*found[-1])
+
+    return model_response(OutTweetsSchema(tweets=tweets, next_cursor=next_cursor))
+
+
+@router.get(
+    "/tags/{tag}",
+    response_model=OutTweetsSchema,
+    responses={400: {"model": Error}},
+    dependencies=[Depends(db_helper.read_only_dependency)],
+)
+async def get_tweets_by_tag(
+    tag: Annotated[
+        str,
+        Path(
+            pattern=r"^#?\w{1,100}$",
+            description="Hashtag with or without the leading #, case-insensitive",
+        ),
+    ],
+    _: Annotated[int, Depends(get_user_id_from_api_key)],
+    limit: Annotated[
+        int,
+        Query(gt=0, le=settings.feed_max_page_size),
+    ] = settings.feed_page_size,
+    cursor: Annotated[
+        str | None,
+        Query(description="The next_cursor value from the previous page"),
+    ] = None,
+    session: AsyncSession = Depends(db_helper.request_session_dependency),
 ):
-    """Get a tweet feed."""
-    model_tweets = await get_tweet_feed_db(session=session, user_id=current_user_id)
+    """Get a page of tweets with a hashtag, newest first."""
+    try:
+        position = decode_tweet_id_cursor(cursor) if cursor else None
+    except ValueError as exc:
+        error = Error(error_type="Bad Request", error_message=str(exc))
+        return JSONResponse(status_code=400, content=error.model_dump())
+
+    model_tweets = await get_tweets_by_tag_db(
+        session=session,
+        tag=tag,
+        limit=limit,
+        cursor=position,
+    )
     tweets = await serialize_tweets(model_tweets)
+    next_cursor = None
+    if len(model_tweets) == limit:
+        next_cursor = encode_tweet_id_cursor(model_tweets[-1])
 
-    return OutTweetsSchema(tweets=tweets)
+    return model_response(OutTweetsSchema(tweets=tweets, next_cursor=next_cursor))
+
+
+@router.get(
+    "/mentions/{user_id}",
+    response_model=OutTweetsSchema,
+    responses={400: {"model": Error}},
+    dependencies=[Depends(db_helper.read_only_dependency)],
+)
+async def get_mentions_tweets(
+    user_id: Annotated[int, Path(gt=0, le=MAX_NUMBER)],
+    _: Annotated[int, Depends(get_user_id_from_api_key)],
+    limit: Annotated[
+        int,
+        Query(gt=0, le=settings.feed_max_page_size),
+    ] = settings.feed_page_size,
+    cursor: Annotated[
+        str | None,
+        Query(description="The next_cursor value from the previous page"),
+    ] = None,
+    session: AsyncSession = Depends(db_helper.request_session_dependency),
+):
+    """
+    Get a page of tweets that mention a user, newest first.
+
+    A user is mentioned as @FirstNameLastName, case-insensitive.
+    """
+    try:
+        position = decode_tweet_id_cursor(cursor) if cursor else None
+    except ValueError as exc:
+        error = Error(error_type="Bad Request", error_message=str(exc))
+        return JSONResponse(status_code=400, content=error.model_dump())
+
+    model_tweets = await get_mentions_tweets_db(
+        session=session,
+        user_id=user_id,
+        limit=limit,
+        cursor=position,
+    )
+    tweets = await serialize_tweets(model_tweets)
+    next_cursor = None
+    if len(model_tweets) == limit:
+        next_cursor = encode_tweet_id_cursor(model_tweets[-1])
+
+    return model_response(OutTweetsSchema(tweets=tweets, next_cursor=next_cursor))
 
 
 @router.delete(
@@ -72,24 +258,30 @@ async def get_tweet_feed(
 async def delete_tweet(
     tweet_id: Annotated[int, Path(gt=0, le=MAX_NUMBER)],
     current_user_id: Annotated[int, Depends(get_user_id_from_api_key)],
-    session: AsyncSession = Depends(db_helper.scoped_session_dependency),
+    background_tasks: BackgroundTasks,
+    session: AsyncSession = Depends(db_helper.request_session_dependency),
 ):
-    """Delete your tweet."""
+    """
+    Delete your tweet.
+
+    Files of the tweet images are released after the response is sent.
+    """
     try:
-        tweet = await get_tweet(session=session, tweet_id=tweet_id)
+        blob_ids = await delete_tweet_db(
+            session=session,
+            tweet_id=tweet_id,
+            author_id=current_user_id,
+        )
     except ValueError as exc:
         error = Error(error_type="Not found", error_message=str(exc))
         return JSONResponse(status_code=404, content=error.model_dump())
-
-    if tweet.author_id != current_user_id:
-        error = Error(
-            error_type="Forbidden",
-            error_message="You are not the author of the tweet",
-        )
+    except PermissionError as exc:
+        error = Error(error_type="Forbidden", error_message=str(exc))
         return JSONResponse(status_code=403, content=error.model_dump())
 
-    await delete_tweet_db(session=session, tweet_id=tweet_id)
-    return BaseResponse()
+    if blob_ids:
+        background_tasks.add_task(release_image_blobs_task, blob_ids)
+    return model_response(BaseResponse())
 
 
 @router.post(
@@ -100,7 +292,7 @@ async def delete_tweet(
 async def add_like_to_tweet(
     tweet_id: Annotated[int, Path(gt=0, le=MAX_NUMBER)],
     current_user_id: Annotated[int, Depends(get_user_id_from_api_key)],
-    session: AsyncSession = Depends(db_helper.scoped_session_dependency),
+    session: AsyncSession = Depends(db_helper.request_session_dependency),
 ):
     """Adding a like to a tweet."""
     try:
@@ -113,7 +305,7 @@ async def add_like_to_tweet(
         error = Error(error_type="Not found", error_message=str(exc))
         return JSONResponse(status_code=404, content=error.model_dump())
 
-    return BaseResponse()
+    return model_response(BaseResponse())
 
 
 @router.delete(
@@ -124,7 +316,7 @@ async def add_like_to_tweet(
 async def remove_like_from_tweet(
     tweet_id: Annotated[int, Path(gt=0, le=MAX_NUMBER)],
     current_user_id: Annotated[int, Depends(get_user_id_from_api_key)],
-    session: AsyncSession = Depends(db_helper.scoped_session_dependency),
+    session: AsyncSession = Depends(db_helper.request_session_dependency),
 ):
     """Delete your like on a tweet."""
     try:
@@ -137,4 +329,4 @@ async def remove_like_from_tweet(
         error = Error(error_type="Not found", error_message=str(exc))
         return JSONResponse(status_code=404, content=error.model_dump())
 
-    return BaseResponse()
+    return model_response(BaseResponse())
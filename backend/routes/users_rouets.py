@@ -6,6 +6,7 @@ from starlette.responses import JSONResponse
 
 from backend.config import MAX_NUMBER
 from backend.models.db_helper import db_helper
+from backend.responses import model_response
 from backend.schemas import BaseResponse, Error, OutUserSchema
 from backend.services.security import get_user_id_from_api_key
 from backend.services.users_services import (
@@ -25,7 +26,7 @@ router = APIRouter(prefix="/api/users", tags=["users"])
 async def add_follow_user(
     user_id: Annotated[int, Path(gt=0, le=MAX_NUMBER)],
     current_user_id: Annotated[int, Depends(get_user_id_from_api_key)],
-    session: AsyncSession = Depends(db_helper.scoped_session_dependency),
+    session: AsyncSession = Depends(db_helper.request_session_dependency),
 ):
     """Create a subscription for a user."""
     if current_user_id == user_id:
@@ -42,7 +43,7 @@ async def add_follow_user(
         error = Error(error_type="Not found", error_message=str(exc))
         return JSONResponse(status_code=404, content=error.model_dump())
 
-    return BaseResponse()
+    return model_response(BaseResponse())
 
 
 @router.delete(
@@ -53,7 +54,7 @@ async def add_follow_user(
 async def delete_follow_user(
     user_id: Annotated[int, Path(gt=0, le=MAX_NUMBER)],
     current_user_id: Annotated[int, Depends(get_user_id_from_api_key)],
-    session: AsyncSession = Depends(db_helper.scoped_session_dependency),
+    session: AsyncSession = Depends(db_helper.request_session_dependency),
 ):
     """Delete a subscription to a user."""
     try:
@@ -66,13 +67,17 @@ async def delete_follow_user(
         error = Error(error_type="Not found", error_message=str(exc))
         return JSONResponse(status_code=404, content=error.model_dump())
 
-    return BaseResponse()
+    return model_response(BaseResponse())
 
 
-@router.get("/me", response_model=OutUserSchema)
+@router.get(
+    "/me",
+    response_model=OutUserSchema,
+    dependencies=[Depends(db_helper.read_only_dependency)],
+)
 async def get_me_info(
     info: Annotated[int | dict, Depends(get_user_id_from_api_key)],
-    session: AsyncSession = Depends(db_helper.scoped_session_dependency),
+    session: AsyncSession = Depends(db_helper.request_session_dependency),
 ) -> OutUserSchema | dict:
     """Get information about the current user."""
     if isinstance(info, dict):
@@ -80,18 +85,19 @@ async def get_me_info(
 
     user = await serialize_user_extended(session=session, user_id=info)
 
-    return OutUserSchema(user=user)
+    return model_response(OutUserSchema(user=user))
 
 
 @router.get(
     "/{user_id}",
     response_model=OutUserSchema,
     responses={404: {"model": Error}},
+    dependencies=[Depends(db_helper.read_only_dependency)],
 )
 async def get_user_info(
     user_id: Annotated[int, Path(gt=0, le=MAX_NUMBER)],
     _: Annotated[int, Depends(get_user_id_from_api_key)],
-    session: AsyncSession = Depends(db_helper.scoped_session_dependency),
+    session: AsyncSession = Depends(db_helper.request_session_dependency),
 ):
     """Get information about the specified user."""
     try:
@@ -100,4 +106,4 @@ async def get_user_info(
         error = Error(error_type="Not found", error_message=str(exc))
         return JSONResponse(status_code=404, content=error.model_dump())
 
-    return OutUserSchema(user=user)
+    return model_response(OutUserSchema(user=user))
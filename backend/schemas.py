@@ -42,6 +42,18 @@ class TweetLikesSchema(BaseModel):
     )
 
 
+class AttachmentSchema(BaseModel):
+    """Tweet attachment scheme with image variants."""
+
+    id: int = Field(gt=0, le=MAX_NUMBER)
+    variants: dict[str, str] = Field(
+        description="Paths of resized copies by the longest side in pixels"
+        " and of the original image under the key 'original'."
+        " A copy that is not created yet points to the endpoint"
+        " /api/medias/{id}/variants/{size} which creates it",
+    )
+
+
 class TweetSchema(BaseModel):
     """Tweet scheme."""
 
@@ -51,6 +63,11 @@ class TweetSchema(BaseModel):
         default_factory=list,
         description="Array of paths with media",
     )
+    attachment_variants: list[AttachmentSchema] = Field(
+        default_factory=list,
+        description="Attachments with paths of their resized copies,"
+        " in the same order as attachments",
+    )
     author: UserSchema
     likes: list[TweetLikesSchema] = Field(default_factory=list)
 
@@ -85,6 +102,10 @@ class OutTweetsSchema(BaseResponse):
     """Response scheme with tweets."""
 
     tweets: list[TweetSchema]
+    next_cursor: str | None = Field(
+        default=None,
+        description="Opaque cursor of the next page. Absent on the last page",
+    )
 
 
 class OutMediaSchema(BaseResponse):
@@ -0,0 +1,152 @@
+"""
+Сборка JSON-документа ленты целиком на стороне PostgreSQL.
+
+Документ совпадает побайтно с ответом сериализатора serialize_tweets:
+ключи идут в порядке полей схем, а разделители компактные, как у JSONResponse.
+Поэтому документ собирается через string_agg, а строки экранируются to_json:
+json_build_object и json_agg добавляют пробелы после ":" и ",".
+"""
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.config import settings
+from backend.services.storage import media_storage
+
+# Соединение для выборки ленты и ключ сортировки (лайки, id твита),
+# как в _select_feed_tweets и _feed_sort_key.
+FEED_SOURCES = {
+    "timeline": (
+        """
+        JOIN home_timeline ON home_timeline.tweet_id = tweets.id
+        WHERE home_timeline.user_id = :user_id
+        """,
+        "home_timeline.likes_count",
+        "home_timeline.tweet_id",
+    ),
+    "subscriptions": (
+        """
+        JOIN subscriptions ON subscriptions.subscribed_to_id = tweets.author_id
+        WHERE subscriptions.user_id = :user_id
+        """,
+        "tweets.likes_count",
+        "tweets.id",
+    ),
+}
+
+# Адрес уменьшенной копии или адрес ее создания, как в get_image_variants.
+VARIANT_SQL = """
+            || '"{size}":' || to_json(coalesce(
+                :media_url_prefix || (images.variants->>'{size}'),
+                'api/medias/' || images.id || '/variants/{size}'
+            ))::text || ','"""
+
+CURSOR_CONDITION = "AND ({likes_key}, {id_key}) < (:cursor_likes, :cursor_id)"
+
+FEED_DOCUMENT_SQL = """
+WITH page AS (
+    SELECT tweets.id, tweets.tweet_data, tweets.author_id,
+        {likes_key} AS likes_count
+    FROM tweets
+    {source}
+    {cursor_condition}
+    ORDER BY {likes_key} DESC, {id_key} DESC
+    LIMIT :limit
+),
+rendered AS (
+    SELECT
+        page.id,
+        page.likes_count,
+        '{{"id":' || page.id
+        || ',"content":' || to_json(page.tweet_data)::text
+        || ',"attachments":[' || coalesce((
+            SELECT string_agg(
+                to_json(:media_url_prefix || images.image_path)::text,
+                ',' ORDER BY images.id
+            )
+            FROM images
+            WHERE images.tweet_id = page.id
+        ), '') || ']'
+        || ',"attachment_variants":[' || coalesce((
+            SELECT string_agg(
+                '{{"id":' || images.id || ',"variants":{{'{variants}
+                || '"original":'
+                || to_json(:media_url_prefix || images.image_path)::text || '}}}}',
+                ',' ORDER BY images.id
+            )
+            FROM images
+            WHERE images.tweet_id = page.id
+        ), '') || ']'
+        || ',"author":{{"id":' || author.id
+        || ',"name":' || to_json(author.first_name || ' ' || author.last_name)::text
+        || '}},"likes":[' || coalesce((
+            SELECT string_agg(
+                '{{"user_id":' || liker.id
+                || ',"name":' || to_json(liker.first_name || ' ' || liker.last_name)::text
+                || '}}',
+                ',' ORDER BY tweets_likes.id
+            )
+            FROM tweets_likes
+            JOIN users AS liker ON liker.id = tweets_likes.user_id
+            WHERE tweets_likes.tweet_id = page.id
+        ), '') || ']}}' AS document
+    FROM page
+    JOIN users AS author ON author.id = page.author_id
+)
+SELECT
+    '{{"result"\\:true,"tweets":['
+    || coalesce(string_agg(document, ',' ORDER BY likes_count DESC, id DESC), '')
+    || '],"next_cursor":'
+    || CASE
+        WHEN count(*) = :limit THEN '"' || translate(
+            encode(
+                convert_to(
+                    (array_agg(likes_count || ':' || id ORDER BY likes_count, id))[1],
+                    'UTF8'
+                ),
+                'base64'
+            ),
+            '+/',
+            '-_'
+        ) || '"'
+        ELSE 'null'
+    END
+    || '}}'
+FROM rendered
+"""
+
+
+async def render_tweet_feed_json(
+    session: AsyncSession,
+    user_id: int,
+    limit: int,
+    cursor: tuple[int, int] | None = None,
+) -> bytes:
+    """
+    Получение страницы ленты в виде готового JSON-документа ответа.
+
+    Порядок твитов и курсор совпадают с get_tweet_feed_db и encode_feed_cursor.
+    Адреса изображений собираются из префикса адресов хранилища и ключей.
+    """
+    source, likes_key, id_key = FEED_SOURCES[settings.feed_source]
+    cursor_condition = ""
+    if cursor:
+        cursor_condition = CURSOR_CONDITION.format(likes_key=likes_key, id_key=id_key)
+    stmt = FEED_DOCUMENT_SQL.format(
+        source=source,
+        likes_key=likes_key,
+        id_key=id_key,
+        cursor_condition=cursor_condition,
+        variants="".join(
+            VARIANT_SQL.format(size=int(size)) for size in settings.image_variant_sizes
+        ),
+    )
+    params = {
+        "user_id": user_id,
+        "limit": limit,
+        "media_url_prefix": media_storage.url_prefix,
+    }
+    if cursor:
+        params["cursor_likes"], params["cursor_id"] = cursor
+
+    document = await session.scalar(text(stmt), params)
+    return document.encode()
@@ -0,0 +1,338 @@
+"""
+Обработка изображений вне цикла событий.
+
+Декодирование и кодирование Pillow выполняются в пуле процессов или потоков.
+Одновременно в пуле находится не больше max_workers задач, остальные ждут
+своей очереди в цикле событий. Если очередь заполнена, новая задача
+сразу отклоняется: так загрузки не копятся без ограничения.
+"""
+import asyncio
+import hashlib
+import io
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable, Literal, TypeVar
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from backend.config import settings
+
+T = TypeVar("T")
+
+
+class ProcessingQueueFull(Exception):
+    """Очередь обработки изображений заполнена."""
+
+
+class ImageTooLarge(Exception):
+    """Число пикселей изображения превышает допустимое."""
+
+
+class ImageProcessor:
+    """Ограниченный пул для обработки изображений с метриками очереди."""
+
+    def __init__(
+        self,
+        executor_type: Literal["process", "thread"],
+        max_workers: int,
+        max_queue: int,
+    ):
+        """
+        Инициализация пула. Пул процессов или потоков создается при первой задаче.
+
+        :param max_queue: Сколько задач может ждать свободного исполнителя.
+        """
+        self.executor_type = executor_type
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.running = 0
+        self.queued = 0
+        self.rejected = 0
+        self._executor: Executor | None = None
+        self._slots = asyncio.Semaphore(max_workers)
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_type == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="image-processing",
+                )
+        return self._executor
+
+    async def run(self, func: Callable[..., T], *args) -> T:
+        """
+        Выполнение func(*args) в пуле.
+
+        Для пула процессов func и аргументы должны сериализоваться через pickle.
+        Отмена ожидающей корутины не останавливает исполнителя, поэтому место
+        в пуле освобождается, только когда задача в пуле завершится.
+
+        :raise ProcessingQueueFull: Если очередь ожидающих задач заполнена.
+        """
+        if self._slots.locked() and self.queued >= self.max_queue:
+            self.rejected += 1
+            raise ProcessingQueueFull("Image processing queue is full")
+
+        self.queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+
+        self.running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._get_executor(), partial(func, *args))
+        except BaseException:
+            self._release()
+            raise
+
+        future.add_done_callback(self._on_done)
+        return await asyncio.shield(future)
+
+    def _on_done(self, future: asyncio.Future) -> None:
+        # Исключение задачи, результат которой уже никто не ждет, извлекается,
+        # чтобы asyncio не писал в лог "exception was never retrieved".
+        if not future.cancelled():
+            future.exception()
+        self._release()
+
+    def _release(self) -> None:
+        self.running -= 1
+        self._slots.release()
+
+    def stats(self) -> dict:
+        """Тип пула, число выполняемых и ожидающих задач."""
+        return {
+            "executor": self.executor_type,
+            "max_workers": self.max_workers,
+            "running": self.running,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self) -> None:
+        """Остановка пула процессов или потоков."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+@dataclass(frozen=True)
+class EncodingOptions:
+    """Параметры кодирования загруженных изображений."""
+
+    output_format: Literal["original", "webp"] = "original"
+    jpeg_quality: int = 85
+    webp_quality: int = 80
+    max_side: int = 2560
+    max_bytes: int = 2 * 1024 * 1024
+    max_pixels: int = 40_000_000
+
+
+@dataclass(frozen=True)
+class EncodedImage:
+    """Закодированное изображение и хэш SHA-256 его содержимого."""
+
+    data: bytes
+    suffix: str
+    content_hash: str
+
+
+FILE_SUFFIXES = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp"}
+METADATA_KEYS = ("exif", "xmp", "XML:com.adobe.xmp", "comment")
+JPEG_END = b"\xff\xd9"
+PNG_END = b"IEND\xaeB`\x82"
+
+
+def check_image_header(image_path: str, options: EncodingOptions) -> None:
+    """
+    Проверка изображения по заголовку, без декодирования пикселей.
+
+    :raise TypeError: Если файл не является изображением.
+    :raise ImageTooLarge: Если число пикселей больше max_pixels.
+    """
+    try:
+        img = Image.open(image_path)
+    except UnidentifiedImageError:
+        raise TypeError("Not a valid image")
+    except Image.DecompressionBombError as exc:
+        raise ImageTooLarge(str(exc))
+
+    with img:
+        _check_pixels(img, options)
+
+
+def encode_image(image: bytes | str, options: EncodingOptions) -> EncodedImage:
+    """
+    Кодирование изображения с учетом его формата.
+
+    JPEG остается JPEG (progressive, качество jpeg_quality), остальные
+    форматы сохраняются в PNG. При output_format="webp" все изображения
+    сохраняются в WebP. Метаданные (EXIF, XMP, комментарии) удаляются,
+    ориентация из EXIF применяется к пикселям, слишком большие изображения
+    уменьшаются до max_side по большей стороне. Изображение, которое уже
+    в нужном формате, без метаданных (в том числе текстовых блоков PNG) и
+    данных после конца изображения, в пределах max_side и max_bytes,
+    возвращается без перекодирования. Пиксели декодируются полностью в любом
+    случае, поэтому поврежденный файл не сохраняется как есть.
+
+    Одинаковые изображения дают одинаковые байты и хэш содержимого.
+    Выполняется в пуле ImageProcessor.
+
+    :param image: Байты изображения или путь к файлу с ним.
+    :raise TypeError: Если полученное изображение не является валидными bytes.
+    :raise ImageTooLarge: Если число пикселей больше max_pixels.
+    """
+    if isinstance(image, str):
+        with open(image, "rb") as file:
+            image = file.read()
+
+    try:
+        img = Image.open(io.BytesIO(image))
+    except Image.DecompressionBombError as exc:
+        raise ImageTooLarge(str(exc))
+    except OSError:
+        # Как UnidentifiedImageError, так и ошибки усеченного файла.
+        raise TypeError("Not a valid image")
+    _check_pixels(img, options)
+
+    try:
+        img.load()
+    except OSError:
+        raise TypeError("Not a valid image")
+
+    if options.output_format == "webp":
+        output_format = "WEBP"
+    else:
+        output_format = "JPEG" if img.format == "JPEG" else "PNG"
+    suffix = FILE_SUFFIXES[output_format]
+
+    if not _is_within_limits(img, image, output_format, options):
+        ImageOps.exif_transpose(img, in_place=True)
+        img.thumbnail((options.max_side, options.max_side), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        _save(img, buffer, output_format, options)
+        image = buffer.getvalue()
+
+    return EncodedImage(
+        data=image,
+        suffix=suffix,
+        content_hash=hashlib.sha256(image).hexdigest(),
+    )
+
+
+def encode_variant(
+    image: bytes,
+    size: int,
+    options: EncodingOptions,
+) -> EncodedImage | None:
+    """
+    Уменьшенная копия изображения в том же формате.
+
+    Выполняется в пуле ImageProcessor.
+
+    :return EncodedImage | None: Копия или None, если исходное изображение
+     не больше size и уменьшенная копия не нужна.
+    """
+    img = Image.open(io.BytesIO(image))
+    if max(img.size) <= size:
+        return None
+
+    output_format = img.format
+    img.thumbnail((size, size), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    _save(img, buffer, output_format, options)
+    data = buffer.getvalue()
+    return EncodedImage(
+        data=data,
+        suffix=FILE_SUFFIXES[output_format],
+        content_hash=hashlib.sha256(data).hexdigest(),
+    )
+
+
+def _save(
+    img: Image.Image,
+    buffer: io.BytesIO,
+    output_format: str,
+    options: EncodingOptions,
+) -> None:
+    # EXIF и XMP не копируются, если не переданы явно. Комментарий JPEG
+    # копируется из исходного изображения, поэтому сбрасывается.
+    params = {"icc_profile": img.info.get("icc_profile")}
+    if output_format == "JPEG":
+        if img.mode not in {"RGB", "L", "CMYK"}:
+            img = img.convert("RGB")
+        params.update(quality=options.jpeg_quality, progressive=True, comment=b"")
+    elif output_format == "WEBP":
+        if img.mode not in {"RGB", "RGBA"}:
+            has_alpha = "A" in img.getbands() or "transparency" in img.info
+            img = img.convert("RGBA" if has_alpha else "RGB")
+        params.update(quality=options.webp_quality)
+    img.save(buffer, format=output_format, **params)
+
+
+def _check_pixels(img: Image.Image, options: EncodingOptions) -> None:
+    if img.width * img.height > options.max_pixels:
+        raise ImageTooLarge(
+            f"Image has more than {options.max_pixels} pixels",
+        )
+
+
+def _is_within_limits(
+    img: Image.Image,
+    image: bytes,
+    output_format: str,
+    options: EncodingOptions,
+) -> bool:
+    # Текстовые блоки PNG (tEXt, zTXt, iTXt) попадают в img.text под
+    # произвольными ключами.
+    has_metadata = (
+        bool(img.getexif())
+        or any(key in img.info for key in METADATA_KEYS)
+        or bool(getattr(img, "text", None))
+    )
+    return (
+        img.format == output_format
+        and not has_metadata
+        and not _has_trailing_data(image, img.format)
+        and max(img.size) <= options.max_side
+        and len(image) <= options.max_bytes
+    )
+
+
+def _has_trailing_data(image: bytes, image_format: str) -> bool:
+    # Байты после маркера конца изображения (например, приклеенный архив)
+    # не должны отдаваться клиентам вместе с картинкой.
+    if image_format == "JPEG":
+        return not image.endswith(JPEG_END)
+    if image_format == "PNG":
+        return not image.endswith(PNG_END)
+    if image_format == "WEBP":
+        riff_size = int.from_bytes(image[4:8], "little")
+        return len(image) != 8 + riff_size + riff_size % 2
+    return True
+
+
+image_processor = ImageProcessor(
+    executor_type=settings.image_executor,
+    max_workers=settings.image_workers,
+    max_queue=settings.image_queue_size,
+)
+encoding_options = EncodingOptions(
+    output_format=settings.image_output_format,
+    jpeg_quality=settings.image_jpeg_quality,
+    webp_quality=settings.image_webp_quality,
+    max_side=settings.image_max_side,
+    max_bytes=settings.image_max_bytes,
+    max_pixels=settings.image_max_pixels,
+)
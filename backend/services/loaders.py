@@ -0,0 +1,17 @@
+"""
+Наборы опций загрузки связей TweetModel для разных сценариев.
+
+Связи модели по умолчанию не загружаются (lazy="raise"), поэтому каждая
+функция сервисов явно указывает, какие данные ей нужны.
+"""
+from sqlalchemy.orm import joinedload, selectinload
+
+from backend.models.tweets import TweetModel
+
+# Лента и сериализация: автор, вложения и лайкнувшие пользователи.
+# Коллекции загружаются отдельными запросами, без декартова произведения.
+TWEET_FEED_VIEW = (
+    joinedload(TweetModel.author),
+    selectinload(TweetModel.images),
+    selectinload(TweetModel.liked_by),
+)
@@ -0,0 +1,224 @@
+"""
+Сборка мусора файлов изображений.
+
+Изображение загружается до создания твита, и неприкрепленные изображения
+иначе остались бы навсегда. Удаление твита удаляет строки images каскадно,
+но не файлы. Сборщик проходит три этапа пачками по batch_size с паузой
+batch_delay после каждой пачки, чтобы не нагружать БД и хранилище:
+
+1. удаление неприкрепленных изображений старше grace_period;
+2. удаление записей image_blobs, на которые не ссылается ни одно изображение;
+3. удаление из хранилища файлов старше grace_period, у которых нет записи
+   в БД, вместе с уменьшенными копиями и брошенными временными файлами.
+
+Файлы удаляются только на третьем этапе: размеры освобожденного места
+берутся из листинга хранилища.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from functools import partial
+from pathlib import PurePosixPath
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.config import settings
+from backend.models import ImageBlobModel, ImageModel
+from backend.models.db_helper import db_helper
+from backend.services.medias_services import get_source_key
+from backend.services.storage import StoredFile, media_storage
+
+logger = logging.getLogger(__name__)
+
+# Временные файлы незавершенной записи LocalStorage.
+TEMP_SUFFIX = ".tmp"
+
+
+@dataclass
+class MediaGCReport:
+    """Результат сборки мусора."""
+
+    images: int = 0
+    blobs: int = 0
+    files: int = 0
+    reclaimed_bytes: int = 0
+
+
+async def collect_media_garbage(
+    session: AsyncSession,
+    grace_period: float,
+    batch_size: int,
+    batch_delay: float,
+) -> MediaGCReport:
+    """
+    Удаление неприкрепленных изображений и файлов без записей в БД.
+
+    :param grace_period: Возраст в секундах, после которого неприкрепленное
+     изображение или файл без записи считается мусором.
+    :param batch_delay: Пауза в секундах после каждой пачки.
+    """
+    report = MediaGCReport()
+    report.images = await _delete_in_batches(
+        session,
+        partial(_delete_unattached_images, grace_period=grace_period),
+        batch_size,
+        batch_delay,
+    )
+    report.blobs = await _delete_in_batches(
+        session, _delete_unreferenced_blobs, batch_size, batch_delay
+    )
+
+    legacy_keys = set(
+        await session.scalars(
+            select(ImageModel.image_path).where(ImageModel.blob_id.is_(None))
+        )
+    )
+    modified_before = time.time() - grace_period
+    async for page in media_storage.list_files("images/", batch_size):
+        files = [file for file in page if file.modified < modified_before]
+        deleted = await _delete_orphan_files(session, files, legacy_keys)
+        report.files += len(deleted)
+        report.reclaimed_bytes += sum(file.size for file in deleted)
+        await asyncio.sleep(batch_delay)
+
+    return report
+
+
+async def _delete_in_batches(
+    session: AsyncSession,
+    delete_batch,
+    batch_size: int,
+    batch_delay: float,
+) -> int:
+    total = 0
+    while True:
+        deleted = await delete_batch(session, batch_size=batch_size)
+        await session.commit()
+        total += deleted
+        if deleted < batch_size:
+            return total
+        await asyncio.sleep(batch_delay)
+
+
+async def _delete_unattached_images(
+    session: AsyncSession,
+    batch_size: int,
+    grace_period: float,
+) -> int:
+    # Изображения, которые прикрепляются к твиту прямо сейчас, заблокированы
+    # и пропускаются. Файлы остаются до третьего этапа.
+    stale = (
+        select(ImageModel.id)
+        .where(
+            ImageModel.tweet_id.is_(None),
+            ImageModel.created_at < func.now() - timedelta(seconds=grace_period),
+        )
+        .order_by(ImageModel.created_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    stmt = (
+        delete(ImageModel)
+        .where(ImageModel.id.in_(stale.scalar_subquery()))
+        .returning(ImageModel.id)
+    )
+    return len((await session.scalars(stmt)).all())
+
+
+async def _delete_unreferenced_blobs(session: AsyncSession, batch_size: int) -> int:
+    # Возраст записи не проверяется: запись и изображение вставляются в одной
+    # транзакции, и до коммита запись видна только загрузке. Записи,
+    # заблокированные загрузкой того же изображения, пропускаются.
+    referenced = select(ImageModel.id).where(ImageModel.blob_id == ImageBlobModel.id)
+    orphans = (
+        select(ImageBlobModel.id)
+        .where(~referenced.exists())
+        .order_by(ImageBlobModel.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    stmt = (
+        delete(ImageBlobModel)
+        .where(ImageBlobModel.id.in_(orphans.scalar_subquery()))
+        .returning(ImageBlobModel.id)
+    )
+    return len((await session.scalars(stmt)).all())
+
+
+async def _delete_orphan_files(
+    session: AsyncSession,
+    files: list[StoredFile],
+    legacy_keys: set[str],
+) -> list[StoredFile]:
+    """
+    Удаление файлов без записей в БД. Возвращает удаленные файлы.
+
+    Для каждого оригинала вставляется временная запись image_blobs с хэшем
+    из имени файла. Вставленная запись означает, что файл ни на что не ссылается,
+    и до коммита блокирует загрузку того же изображения: загрузка дождется
+    удаления файла и запишет его заново. Записи удаляются в той же транзакции.
+    """
+    deleted = []
+    candidates: dict[str, list[StoredFile]] = {}
+    for file in files:
+        source_key = get_source_key(file.key)
+        if file.key.endswith(TEMP_SUFFIX):
+            deleted.append(file)
+        elif source_key not in legacy_keys and _is_blob_key(source_key):
+            candidates.setdefault(source_key, []).append(file)
+
+    if candidates:
+        stmt = (
+            insert(ImageBlobModel)
+            .values(
+                [
+                    {"content_hash": PurePosixPath(key).stem, "path": key}
+                    for key in candidates
+                ]
+            )
+            .on_conflict_do_nothing(index_elements=[ImageBlobModel.content_hash])
+            .returning(ImageBlobModel.id, ImageBlobModel.path)
+        )
+        orphans = (await session.execute(stmt)).all()
+        for _, key in orphans:
+            deleted.extend(candidates[key])
+
+    await media_storage.delete([file.key for file in deleted])
+    if candidates:
+        blob_ids = [blob_id for blob_id, _ in orphans]
+        await session.execute(
+            delete(ImageBlobModel).where(ImageBlobModel.id.in_(blob_ids))
+        )
+    await session.commit()
+    return deleted
+
+
+def _is_blob_key(key: str) -> bool:
+    # Приложение не создает ключей длиннее столбцов image_blobs, такие файлы
+    # пропускаются.
+    return (
+        len(PurePosixPath(key).stem) <= ImageBlobModel.content_hash.type.length
+        and len(key) <= ImageBlobModel.path.type.length
+    )
+
+
+async def run_media_gc_periodically(interval: float) -> None:
+    """Сборка мусора каждые interval секунд с параметрами из настроек."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with db_helper.session_factory() as session:
+                report = await collect_media_garbage(
+                    session=session,
+                    grace_period=settings.media_gc_grace_period,
+                    batch_size=settings.media_gc_batch_size,
+                    batch_delay=settings.media_gc_batch_delay,
+                )
+        except Exception:
+            logger.exception("Media garbage collection failed")
+        else:
+            logger.info("Media garbage collection: %s", report)
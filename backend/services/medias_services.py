@@ -1,14 +1,36 @@
-import io
-from datetime import datetime
-from pathlib import Path
-from uuid import uuid4
+import asyncio
+import os
+import tempfile
+import weakref
+from pathlib import PurePosixPath
+from typing import BinaryIO
 
-from PIL import Image, UnidentifiedImageError
-from sqlalchemy import select
+from sqlalchemy import delete, literal, select, update
+from sqlalchemy.dialects.postgresql import JSONB, insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from backend.config import STATIC_DIR
-from backend.models import ImageModel
+from backend.config import settings
+from backend.models import ImageBlobModel, ImageModel
+from backend.models.db_helper import db_helper
+from backend.services.image_processing import (
+    EncodedImage,
+    ImageTooLarge,
+    ProcessingQueueFull,
+    check_image_header,
+    encode_image,
+    encode_variant,
+    encoding_options,
+    image_processor,
+)
+from backend.services.storage import media_storage
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Блокировки создания копий по (id изображения, размер). Запись удаляется,
+# когда блокировку больше никто не держит и не ждет.
+_variant_locks: weakref.WeakValueDictionary[
+    tuple[int, int], asyncio.Lock
+] = weakref.WeakValueDictionary()
 
 
 async def get_image(session: AsyncSession, image_id: int) -> ImageModel:
@@ -23,63 +45,289 @@ async def get_image(session: AsyncSession, image_id: int) -> ImageModel:
     raise ValueError("Image not found")
 
 
-async def get_images_obj_from_ids(
+def spool_upload(file: BinaryIO, max_bytes: int) -> str:
+    """
+    Копирование загруженного файла во временный файл на диске частями.
+
+    Выполняется в потоке. Временный файл удаляет вызывающий код.
+    :raise ImageTooLarge: Если файл больше max_bytes.
+    :return str: Путь к временному файлу.
+    """
+    copied = 0
+    with tempfile.NamedTemporaryFile(prefix="upload_", delete=False) as spooled:
+        try:
+            while chunk := file.read(UPLOAD_CHUNK_SIZE):
+                copied += len(chunk)
+                if copied > max_bytes:
+                    raise ImageTooLarge(f"Image is larger than {max_bytes} bytes")
+                spooled.write(chunk)
+        except ImageTooLarge:
+            os.unlink(spooled.name)
+            raise
+    return spooled.name
+
+
+async def save_image(session: AsyncSession, image: bytes | str) -> ImageModel:
+    """
+    Сохранение изображения на диск и в БД.
+
+    Декодирование и кодирование выполняются в пуле image_processor,
+    а не в цикле событий. Формат файла выбирается по encoding_options.
+    Изображение из файла сначала проверяется по заголовку, и слишком большие
+    изображения отклоняются, не занимая пул.
+    Файл называется по хэшу закодированного содержимого, поэтому одинаковые
+    загрузки ссылаются на один файл (ImageBlobModel).
+    :param image: Байты изображения или путь к файлу с ним.
+    :raise TypeError: Если полученное изображение не является валидными bytes.
+    :raise ImageTooLarge: Если число пикселей больше допустимого.
+    :raise ProcessingQueueFull: Если очередь обработки изображений заполнена.
+    """
+    if isinstance(image, str):
+        await asyncio.to_thread(check_image_header, image, encoding_options)
+    encoded = await image_processor.run(encode_image, image, encoding_options)
+    blob_id, path = await _acquire_image_blob(session, encoded)
+
+    photo = ImageModel(image_path=path, blob_id=blob_id)
+    session.add(photo)
+    await session.commit()
+    return photo
+
+
+async def _acquire_image_blob(
     session: AsyncSession,
-    image_ids: list[int],
-) -> list[ImageModel]:
+    encoded: EncodedImage,
+) -> tuple[int, str]:
     """
-    Получение списка объектов модели ImageModel из списка id изображений.
+    Получение записи файла по хэшу содержимого с блокировкой строки до коммита.
 
-    :raise ValueError: Если хотя бы одно изображение не удалось получить.
+    Пока строка заблокирована, release_image_blobs не может удалить файл,
+    поэтому файл записывается в хранилище, только если его там нет.
+    :return tuple[int, str]: id записи и ключ файла в хранилище.
     """
-    stmt = select(ImageModel).where(ImageModel.id.in_(image_ids))
-    images_obj = await session.scalars(stmt)
-    images = images_obj.all()
-    if len(images) != len(image_ids):
-        raise ValueError("Image not found")
+    insert_stmt = insert(ImageBlobModel).values(
+        content_hash=encoded.content_hash,
+        path=f"images/{encoded.content_hash}{encoded.suffix}",
+    )
+    # DO UPDATE, в отличие от DO NOTHING, блокирует существующую строку.
+    stmt = insert_stmt.on_conflict_do_update(
+        index_elements=[ImageBlobModel.content_hash],
+        set_={"path": insert_stmt.excluded.path},
+    ).returning(ImageBlobModel.id, ImageBlobModel.path)
+    blob_id, blob_key = (await session.execute(stmt)).one()
 
-    return list(images)
+    if not await media_storage.exists(blob_key):
+        await media_storage.save(blob_key, encoded.data)
+    return blob_id, blob_key
 
 
-async def save_image(image: bytes) -> str:
+async def release_image_blobs(session: AsyncSession, blob_ids: list[int]) -> int:
     """
-    Сохранение изображения на диск.
-    :raise TypeError: Если полученное изображение не является валидными bytes.
-    :return str: Путь к сохраненному изображению.
-    """
-    try:
-        img = Image.open(io.BytesIO(image))
-    except UnidentifiedImageError:
-        raise TypeError("Not a valid image")
-
-    date = datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
-
-    unique_filename = f"{date}_{uuid4()}.png"
-    file_path = STATIC_DIR / "images" / unique_filename
-    img.save(
-        file_path.absolute(),
-        optimize=True,
-        quality=80,
-        format="PNG",
+    Удаление файлов, на которые больше не ссылается ни одно изображение.
+
+    Строки файлов блокируются FOR UPDATE: параллельная загрузка того же
+    изображения дождется коммита и создаст запись и файл заново.
+    Файлы и их уменьшенные копии удаляются из хранилища до коммита,
+    под блокировкой. Коммит выполняет вызывающий код.
+    :return int: Число удаленных файлов.
+    """
+    if not blob_ids:
+        return 0
+
+    await session.execute(
+        select(ImageBlobModel.id)
+        .where(ImageBlobModel.id.in_(blob_ids))
+        .order_by(ImageBlobModel.id)
+        .with_for_update()
     )
-    return file_path.as_posix()
+    referenced = select(ImageModel.id).where(ImageModel.blob_id == ImageBlobModel.id)
+    stmt = (
+        delete(ImageBlobModel)
+        .where(ImageBlobModel.id.in_(blob_ids), ~referenced.exists())
+        .returning(ImageBlobModel.path)
+    )
+    keys = (await session.scalars(stmt)).all()
+    await media_storage.delete(_with_variant_keys(keys))
+    return len(keys)
+
+
+async def release_image_blobs_task(blob_ids: list[int]) -> None:
+    """Фоновое удаление файлов изображений удаленного твита."""
+    async with db_helper.session_factory() as session:
+        await release_image_blobs(session, blob_ids)
+        await session.commit()
+
+
+def get_variant_key(key: str, size: int) -> str:
+    """Ключ уменьшенной копии: рядом с оригиналом, <имя>_<размер>.<расширение>."""
+    path = PurePosixPath(key)
+    return path.with_stem(f"{path.stem}_{size}").as_posix()
+
+
+def get_source_key(key: str) -> str:
+    """Ключ оригинала по ключу уменьшенной копии, обратное get_variant_key."""
+    path = PurePosixPath(key)
+    stem, _, size = path.stem.rpartition("_")
+    if stem and size.isdigit():
+        return path.with_stem(stem).as_posix()
+    return key
+
+
+def _with_variant_keys(keys: list[str]) -> list[str]:
+    return [
+        variant_key
+        for key in keys
+        for variant_key in (
+            key,
+            *(get_variant_key(key, size) for size in settings.image_variant_sizes),
+        )
+    ]
+
 
+def get_variant_url(image_id: int, size: int) -> str:
+    """Адрес, по которому уменьшенная копия будет создана при первом запросе."""
+    return f"api/medias/{image_id}/variants/{size}"
 
-async def add_image_path_to_db(session: AsyncSession, photo_path: str) -> int:
+
+def get_image_url(image: ImageModel) -> str:
+    """Публичный адрес оригинала изображения."""
+    return media_storage.url(image.image_path)
+
+
+def get_image_variants(image: ImageModel) -> dict[str, str]:
     """
-    Добавление в БД информации о пути файла.
-    :return int: id добавленного изображения.
+    Адреса уменьшенных копий изображения по размерам из настроек и оригинала.
+
+    Для еще не созданных копий возвращается адрес get_variant_url.
     """
-    photo = ImageModel(image_path=photo_path)
+    variants = {}
+    for size in settings.image_variant_sizes:
+        if key := image.variants.get(str(size)):
+            variants[str(size)] = media_storage.url(key)
+        else:
+            variants[str(size)] = get_variant_url(image.id, size)
+    variants["original"] = get_image_url(image)
+    return variants
 
-    session.add(photo)
+
+async def create_image_variants(
+    session: AsyncSession,
+    image_id: int,
+    image_path: str,
+    sizes: list[int],
+) -> dict[str, str]:
+    """
+    Создание уменьшенных копий изображения и сохранение их ключей в БД.
+
+    Копия сохраняется под ключом get_variant_key. Копия, которая уже есть
+    в хранилище (у того же файла другого изображения), не создается заново.
+    Если оригинал не больше размера копии, ключом копии считается ключ оригинала.
+    Ключи дописываются в variants одним UPDATE, не затирая копии,
+    созданные параллельно.
+    :raise ProcessingQueueFull: Если очередь обработки изображений заполнена.
+    :return dict[str, str]: Ключи созданных копий по размерам.
+    """
+    source = None
+    variants = {}
+    for size in sizes:
+        variant_key = get_variant_key(image_path, size)
+        if await media_storage.exists(variant_key):
+            variants[str(size)] = variant_key
+            continue
+
+        source = source or await media_storage.load(image_path)
+        encoded = await image_processor.run(
+            encode_variant,
+            source,
+            size,
+            encoding_options,
+        )
+        if encoded is None:
+            variants[str(size)] = image_path
+        else:
+            await media_storage.save(variant_key, encoded.data)
+            variants[str(size)] = variant_key
+
+    stmt = (
+        update(ImageModel)
+        .where(ImageModel.id == image_id)
+        .values(variants=ImageModel.variants.op("||")(literal(variants, JSONB)))
+    )
+    await session.execute(stmt)
     await session.commit()
-    return photo.id
+    return variants
+
+
+async def create_image_variants_task(image_id: int, image_path: str) -> None:
+    """
+    Фоновое создание всех уменьшенных копий после загрузки изображения.
 
+    Если очередь обработки заполнена, копии будут созданы при первом
+    запросе через get_image_variant.
+    """
+    async with db_helper.session_factory() as session:
+        try:
+            await create_image_variants(
+                session=session,
+                image_id=image_id,
+                image_path=image_path,
+                sizes=settings.image_variant_sizes,
+            )
+        except ProcessingQueueFull:
+            pass
+
+
+async def get_image_variant(session: AsyncSession, image_id: int, size: int) -> str:
+    """
+    Получение ключа уменьшенной копии изображения, с созданием при отсутствии.
+
+    Параллельные запросы одной копии в процессе ждут первый из них и ставят
+    в очередь обработки одну задачу, а не по задаче на запрос. Созданная копия
+    сохраняется, поэтому каждая копия кодируется один раз.
+    :raise ValueError: Если размер не указан в настройках или изображение не найдено.
+    :raise ProcessingQueueFull: Если очередь обработки изображений заполнена.
+    """
+    if size not in settings.image_variant_sizes:
+        raise ValueError("Image variant not found")
+
+    async with _get_variant_lock(image_id, size):
+        image = await get_image(session=session, image_id=image_id)
+        if key := image.variants.get(str(size)):
+            return key
+
+        variants = await create_image_variants(
+            session=session,
+            image_id=image.id,
+            image_path=image.image_path,
+            sizes=[size],
+        )
+        return variants[str(size)]
 
-async def delete_image_from_memory(path: str) -> None:
+
+def _get_variant_lock(image_id: int, size: int) -> asyncio.Lock:
+    lock = _variant_locks.get((image_id, size))
+    if lock is None:
+        lock = _variant_locks[image_id, size] = asyncio.Lock()
+    return lock
+
+
+async def delete_image_from_memory(session: AsyncSession, image_id: int) -> None:
     """
-    Удаление изображения из памяти.
-    :raise FileNotFoundError: Если по полученному пути ничего не найдено.
+    Удаление изображения из БД и его файла из хранилища.
+
+    Файл удаляется, только если на него больше не ссылаются другие изображения.
+    :raise ValueError: Если изображение не найдено.
     """
-    Path(path).unlink()
+    stmt = (
+        delete(ImageModel)
+        .where(ImageModel.id == image_id)
+        .returning(ImageModel.blob_id, ImageModel.image_path)
+    )
+    image = (await session.execute(stmt)).one_or_none()
+    if image is None:
+        raise ValueError("Image not found")
+
+    if image.blob_id is not None:
+        await release_image_blobs(session, [image.blob_id])
+    else:
+        await media_storage.delete(_with_variant_keys([image.image_path]))
+    await session.commit()
@@ -1,9 +1,13 @@
+from typing import Sequence
+
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
+from sqlalchemy.sql.base import ExecutableOption
 
 from backend.models.tweets import TweetModel
 from backend.models.users import UserModel
+from backend.services.loaders import TWEET_FEED_VIEW
 
 
 async def get_user(session: AsyncSession, user_id: int) -> UserModel:
@@ -18,25 +22,6 @@ async def get_user(session: AsyncSession, user_id: int) -> UserModel:
     raise ValueError("User not found")
 
 
-async def get_user_with_liked_tweets(
-    session: AsyncSession,
-    user_id: int,
-) -> UserModel:
-    """
-    Получение юзера по id. Подгружается список понравившихся твитов.
-
-    :raise ValueError: Если пользователь не найден.
-    """
-    stmt = (
-        select(UserModel)
-        .where(UserModel.id == user_id)
-        .options(selectinload(UserModel.liked_tweets))
-    )
-    if user := await session.scalar(stmt):
-        return user
-    raise ValueError("User not found")
-
-
 async def get_user_with_following(
     session: AsyncSession,
     user_id: int,
@@ -56,25 +41,6 @@ async def get_user_with_following(
     raise ValueError("User not found")
 
 
-async def get_user_with_tweets(
-    session: AsyncSession,
-    user_id: int,
-) -> UserModel:
-    """
-    Получение юзера по id. Подгружается список твитов.
-
-    :raise ValueError: Если пользователь не найден.
-    """
-    stmt = (
-        select(UserModel)
-        .where(UserModel.id == user_id)
-        .options(selectinload(UserModel.tweets))
-    )
-    if user := await session.scalar(stmt):
-        return user
-    raise ValueError("User not found")
-
-
 async def get_user_with_following_and_followers(
     session: AsyncSession,
     user_id: int,
@@ -119,13 +85,17 @@ async def get_user_with_following_and_liked_tweets(
     raise ValueError("User not found")
 
 
-async def get_tweet(session: AsyncSession, tweet_id: int) -> TweetModel:
+async def get_tweet(
+    session: AsyncSession,
+    tweet_id: int,
+    options: Sequence[ExecutableOption] = TWEET_FEED_VIEW,
+) -> TweetModel:
     """
-    Получение твита по id.
+    Получение твита по id с указанным набором опций загрузки.
 
     :raise ValueError: Если твит не найден.
     """
-    stmt = select(TweetModel).where(TweetModel.id == tweet_id)
+    stmt = select(TweetModel).where(TweetModel.id == tweet_id).options(*options)
     if tweet := await session.scalar(stmt):
         return tweet
     raise ValueError("Tweet not found")
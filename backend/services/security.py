@@ -1,3 +1,5 @@
+import time
+from collections import OrderedDict
 from typing import NoReturn
 from uuid import UUID
 
@@ -6,29 +8,108 @@ from fastapi.security import APIKeyHeader
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from backend.config import settings
 from backend.models.db_helper import db_helper
 from backend.models.users import UserModel
 from backend.schemas import ExtendedUserSchema
 
 api_key_h = APIKeyHeader(name="api-key")
 
+_MISSING = object()
+
+
+class ApiKeyCache:
+    """
+    Ограниченный по размеру кэш соответствия API-ключа и id юзера.
+
+    Записи вытесняются по LRU и устаревают через ttl секунд.
+    Для неверных ключей хранится None со сроком negative_ttl.
+    """
+
+    def __init__(self, max_size: int, ttl: float, negative_ttl: float):
+        """Инициализация пустого кэша."""
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[int | None, float]] = OrderedDict()
+
+    def get(self, api_key: str) -> int | None | object:
+        """Получение id юзера из кэша или _MISSING, если записи нет или она устарела."""
+        entry = self._entries.get(api_key)
+        if entry is None or entry[1] <= time.monotonic():
+            self._entries.pop(api_key, None)
+            self.misses += 1
+            return _MISSING
+
+        self._entries.move_to_end(api_key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, api_key: str, user_id: int | None) -> None:
+        """Сохранение id юзера (или None для неверного ключа) в кэш."""
+        if self.max_size <= 0:
+            return
+
+        ttl = self.ttl if user_id is not None else self.negative_ttl
+        self._entries[api_key] = (user_id, time.monotonic() + ttl)
+        self._entries.move_to_end(api_key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, api_key: str | UUID) -> None:
+        """Удаление ключа из кэша, например при смене ключа или удалении юзера."""
+        self._entries.pop(str(api_key), None)
+
+    def clear(self) -> None:
+        """Очистка кэша и счетчиков."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        """Размер кэша и счетчики попаданий и промахов."""
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+api_key_cache = ApiKeyCache(
+    max_size=settings.api_key_cache_size,
+    ttl=settings.api_key_cache_ttl,
+    negative_ttl=settings.api_key_cache_negative_ttl,
+)
+
 
 async def get_user_id_from_api_key(
     request: Request,
     api_key_header: str = Security(api_key_h),
-    session: AsyncSession = Depends(db_helper.scoped_session_dependency),
+    session: AsyncSession = Depends(db_helper.request_session_dependency),
 ) -> int | dict:
-    """Проверка API-ключа и получение id юзера."""
+    """
+    Проверка API-ключа и получение id юзера.
+
+    id проверенного пользователя сохраняется в request.state.user_id.
+    """
     if _is_valid_uuid(api_key_header):
-        api_key = api_key_header
+        api_key = str(UUID(api_key_header))
     elif api_key_header == "test" and request.get("path") == "/api/users/me":
         return _get_test_user()
     else:
         _raise_forbidden()
 
-    stmt = select(UserModel.id).where(UserModel.api_key == api_key)
-    user = await session.scalar(stmt)
+    user = api_key_cache.get(api_key)
+    if user is _MISSING:
+        stmt = select(UserModel.id).where(UserModel.api_key == api_key)
+        user = await session.scalar(stmt)
+        api_key_cache.set(api_key, user)
+
     if user:
+        request.state.user_id = user
         return user
     else:
         _raise_forbidden()
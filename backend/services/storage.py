@@ -0,0 +1,280 @@
+"""
+Хранилища файлов изображений.
+
+Файлы адресуются ключами вида "images/<хэш>.jpg": ключи хранятся
+в ImageModel.image_path и ImageBlobModel.path. Публичный адрес файла -
+url_prefix хранилища и ключ, поэтому адреса собираются и в SQL
+(feed_sql_services). Локальное хранилище отдает файлы через /static,
+S3-совместимое - по адресу бакета или CDN, общему для всех реплик.
+"""
+import asyncio
+import mimetypes
+import os
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from itertools import islice
+from pathlib import Path
+from typing import AsyncIterator, Iterator
+from uuid import uuid4
+
+from backend.config import STATIC_DIR, settings
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:  # pragma: no cover
+    boto3 = None
+
+# Максимальное число ключей в одном запросе DeleteObjects.
+S3_DELETE_BATCH_SIZE = 1000
+
+
+@dataclass(frozen=True)
+class StoredFile:
+    """Файл в хранилище: ключ, размер в байтах и время изменения (Unix time)."""
+
+    key: str
+    size: int
+    modified: float
+
+
+class MediaStorage(ABC):
+    """Интерфейс хранилища файлов изображений."""
+
+    url_prefix: str
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        """Проверка наличия файла."""
+
+    @abstractmethod
+    async def load(self, key: str) -> bytes:
+        """
+        Чтение файла.
+
+        :raise FileNotFoundError: Если файла нет.
+        """
+
+    @abstractmethod
+    async def save(self, key: str, data: bytes) -> None:
+        """Запись файла целиком: читатели не видят частично записанный файл."""
+
+    @abstractmethod
+    async def delete(self, keys: list[str]) -> None:
+        """Удаление файлов. Отсутствующие файлы пропускаются."""
+
+    @abstractmethod
+    def list_files(
+        self, prefix: str, page_size: int
+    ) -> AsyncIterator[list[StoredFile]]:
+        """
+        Обход файлов с ключами, начинающимися с prefix, страницами до page_size.
+
+        :param prefix: Префикс ключей, заканчивающийся "/", например "images/".
+        """
+
+    def url(self, key: str) -> str:
+        """Публичный адрес файла."""
+        return f"{self.url_prefix}{key}"
+
+
+class LocalStorage(MediaStorage):
+    """Файлы в локальной директории. Операции с диском выполняются в потоках."""
+
+    def __init__(self, root: Path, url_prefix: str):
+        """
+        Инициализация хранилища.
+
+        :param root: Директория, относительно которой разрешаются ключи.
+        :param url_prefix: Префикс адресов, например "static/" для монтирования /static.
+        """
+        self.root = root
+        self.url_prefix = url_prefix
+
+    def path(self, key: str) -> Path:
+        """Путь к файлу на диске."""
+        return self.root / key
+
+    async def exists(self, key: str) -> bool:
+        """Проверка наличия файла."""
+        return await asyncio.to_thread(self.path(key).exists)
+
+    async def load(self, key: str) -> bytes:
+        """Чтение файла."""
+        return await asyncio.to_thread(self.path(key).read_bytes)
+
+    async def save(self, key: str, data: bytes) -> None:
+        """Запись файла через временный файл и переименование."""
+        await asyncio.to_thread(write_file_atomically, self.path(key), data)
+
+    async def delete(self, keys: list[str]) -> None:
+        """Удаление файлов."""
+        await asyncio.to_thread(self._delete, keys)
+
+    def _delete(self, keys: list[str]) -> None:
+        for key in keys:
+            self.path(key).unlink(missing_ok=True)
+
+    async def list_files(
+        self,
+        prefix: str,
+        page_size: int,
+    ) -> AsyncIterator[list[StoredFile]]:
+        """Обход директории prefix. Страницы читаются в потоках."""
+        files = self._walk(prefix)
+        while page := await asyncio.to_thread(list, islice(files, page_size)):
+            yield page
+
+    def _walk(self, prefix: str) -> Iterator[StoredFile]:
+        for directory, _, names in os.walk(self.root / prefix):
+            for name in names:
+                path = Path(directory, name)
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                yield StoredFile(
+                    key=path.relative_to(self.root).as_posix(),
+                    size=stat.st_size,
+                    modified=stat.st_mtime,
+                )
+
+
+class S3Storage(MediaStorage):
+    """
+    Файлы в бакете S3-совместимого хранилища (AWS S3, MinIO).
+
+    Требует пакет boto3. Вызовы клиента boto3 блокирующие,
+    поэтому выполняются в потоках.
+    """
+
+    def __init__(self, bucket: str, url_prefix: str, client=None, **client_params):
+        """
+        Инициализация хранилища.
+
+        :param url_prefix: Префикс публичных адресов: адрес бакета или CDN.
+        :param client: Готовый клиент boto3, иначе создается по client_params
+         (endpoint_url, region_name).
+        """
+        if boto3 is None:
+            raise RuntimeError("S3 storage requires the boto3 package")
+
+        self.bucket = bucket
+        self.url_prefix = url_prefix
+        self.client = client or boto3.client("s3", **client_params)
+
+    async def exists(self, key: str) -> bool:
+        """Проверка наличия объекта."""
+        try:
+            await asyncio.to_thread(
+                self.client.head_object, Bucket=self.bucket, Key=key
+            )
+        except ClientError as exc:
+            if exc.response["Error"]["Code"] in {"404", "NoSuchKey"}:
+                return False
+            raise
+        return True
+
+    async def load(self, key: str) -> bytes:
+        """Чтение объекта."""
+        try:
+            response = await asyncio.to_thread(
+                self.client.get_object,
+                Bucket=self.bucket,
+                Key=key,
+            )
+        except ClientError as exc:
+            if exc.response["Error"]["Code"] in {"404", "NoSuchKey"}:
+                raise FileNotFoundError(key)
+            raise
+        return await asyncio.to_thread(response["Body"].read)
+
+    async def save(self, key: str, data: bytes) -> None:
+        """Запись объекта. PutObject атомарен: объект появляется целиком."""
+        content_type, _ = mimetypes.guess_type(key)
+        await asyncio.to_thread(
+            self.client.put_object,
+            Bucket=self.bucket,
+            Key=key,
+            Body=data,
+            ContentType=content_type or "application/octet-stream",
+        )
+
+    async def delete(self, keys: list[str]) -> None:
+        """
+        Удаление объектов пачками DeleteObjects.
+
+        DeleteObjects отвечает успехом, даже если часть объектов не удалена,
+        и перечисляет их в Errors. Все пачки отправляются, после чего
+        ошибки поднимаются одним исключением.
+        :raise OSError: Если хотя бы один объект не удален.
+        """
+        errors = []
+        for start in range(0, len(keys), S3_DELETE_BATCH_SIZE):
+            batch = keys[start : start + S3_DELETE_BATCH_SIZE]
+            response = await asyncio.to_thread(
+                self.client.delete_objects,
+                Bucket=self.bucket,
+                Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+            )
+            errors.extend(response.get("Errors", []))
+
+        if errors:
+            first = errors[0]
+            raise OSError(
+                f"Failed to delete {len(errors)} objects from S3, first: "
+                f"{first.get('Key')} ({first.get('Code')}: {first.get('Message')})"
+            )
+
+    async def list_files(
+        self,
+        prefix: str,
+        page_size: int,
+    ) -> AsyncIterator[list[StoredFile]]:
+        """Обход объектов через ListObjectsV2. Страницы запрашиваются в потоках."""
+        paginator = self.client.get_paginator("list_objects_v2")
+        pages = iter(
+            paginator.paginate(
+                Bucket=self.bucket,
+                Prefix=prefix,
+                PaginationConfig={"PageSize": page_size},
+            )
+        )
+        while page := await asyncio.to_thread(next, pages, None):
+            if objects := page.get("Contents"):
+                yield [
+                    StoredFile(
+                        key=obj["Key"],
+                        size=obj["Size"],
+                        modified=obj["LastModified"].timestamp(),
+                    )
+                    for obj in objects
+                ]
+
+
+def write_file_atomically(file_path: Path, data: bytes) -> None:
+    """
+    Запись файла через временный файл и переименование.
+
+    Параллельные читатели видят либо прежний файл, либо новый целиком.
+    """
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = f"{file_path}.{os.getpid()}.{uuid4().hex}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(data)
+    os.replace(temp_path, file_path)
+
+
+def create_storage() -> MediaStorage:
+    """Создание хранилища по настройкам."""
+    if settings.media_storage == "s3":
+        return S3Storage(
+            bucket=settings.s3_bucket,
+            url_prefix=settings.s3_public_url,
+            endpoint_url=settings.s3_endpoint_url,
+            region_name=settings.s3_region,
+        )
+    return LocalStorage(root=STATIC_DIR, url_prefix="static/")
+
+
+media_storage = create_storage()
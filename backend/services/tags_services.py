@@ -0,0 +1,218 @@
+"""
+Хэштеги и упоминания пользователей в твитах.
+
+При создании твита из текста извлекаются #хэштеги и @упоминания и
+записываются в таблицы связей tweets_hashtags и tweets_mentions. Твиты по
+хэштегу и твиты с упоминанием пользователя читаются из этих таблиц по
+индексу (хэштег или пользователь, id твита): id твитов монотонно растут,
+поэтому страница новых твитов - это диапазон индекса без OFFSET.
+
+Имен пользователей (логинов) в модели нет, поэтому упоминание ищется по
+имени и фамилии, записанным слитно (UserModel.handle): @ИванИванов упоминает
+всех пользователей с таким именем и фамилией. Регистр имен приводится
+в Python и при записи handle, и при разборе твита, поэтому сравнение
+не зависит от collation БД.
+"""
+import base64
+import binascii
+import re
+
+from sqlalchemy import ARRAY, Integer, String, bindparam, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models import (
+    HashtagModel,
+    TweetHashtagModel,
+    TweetMentionModel,
+    TweetModel,
+    UserModel,
+)
+from backend.services.loaders import TWEET_FEED_VIEW
+
+TAG_PATTERN = re.compile(r"(?<!\w)#(\w+)")
+MENTION_PATTERN = re.compile(r"(?<!\w)@(\w+)")
+MAX_TAG_LENGTH = HashtagModel.name.type.length
+
+
+def normalize_tag(tag: str) -> str:
+    """Хэштег без символа # в нижнем регистре."""
+    return tag.removeprefix("#").lower()
+
+
+def parse_tweet_entities(text: str) -> tuple[list[str], list[str]]:
+    """
+    Извлечение хэштегов и упоминаний из текста твита.
+
+    Хэштеги длиннее MAX_TAG_LENGTH пропускаются. Повторы удаляются.
+    :return tuple[list[str], list[str]]: Хэштеги и имена упомянутых
+     пользователей в нижнем регистре, в порядке появления в тексте.
+    """
+    tags = [
+        normalize_tag(tag)
+        for tag in TAG_PATTERN.findall(text)
+        if len(tag) <= MAX_TAG_LENGTH
+    ]
+    handles = [handle.lower() for handle in MENTION_PATTERN.findall(text)]
+    return list(dict.fromkeys(tags)), list(dict.fromkeys(handles))
+
+
+async def index_tweet_entities(
+    session: AsyncSession,
+    tweets: list[tuple[int, str]],
+) -> None:
+    """
+    Запись хэштегов и упоминаний твитов в таблицы связей.
+
+    Выполняет не больше трех запросов на любое число твитов. Новые хэштеги
+    вставляются с ON CONFLICT DO NOTHING, без блокировки строк популярных
+    хэштегов. Уже записанные связи пропускаются, поэтому повторный вызов
+    для тех же твитов безопасен.
+    Изменения не фиксируются: вызывающая функция делает commit сама.
+    :param tweets: Пары (id твита, текст твита).
+    """
+    tag_rows, mention_rows = [], []
+    for tweet_id, text in tweets:
+        tags, handles = parse_tweet_entities(text)
+        tag_rows.extend((tweet_id, tag) for tag in tags)
+        mention_rows.extend((tweet_id, handle) for handle in handles)
+
+    if tag_rows:
+        tags = sorted({tag for _, tag in tag_rows})
+        await session.execute(
+            insert(HashtagModel)
+            .values([{"name": tag} for tag in tags])
+            .on_conflict_do_nothing(index_elements=[HashtagModel.name])
+        )
+        entities = _unnest_entities(tag_rows)
+        links = select(HashtagModel.id, entities.c.tweet_id).join(
+            entities, HashtagModel.name == entities.c.name
+        )
+        await session.execute(
+            insert(TweetHashtagModel)
+            .from_select(("hashtag_id", "tweet_id"), links)
+            .on_conflict_do_nothing()
+        )
+
+    if mention_rows:
+        entities = _unnest_entities(mention_rows)
+        mentions = select(UserModel.id, entities.c.tweet_id).join(
+            entities, UserModel.handle == entities.c.name
+        )
+        await session.execute(
+            insert(TweetMentionModel)
+            .from_select(("user_id", "tweet_id"), mentions)
+            .on_conflict_do_nothing()
+        )
+
+
+def _unnest_entities(rows: list[tuple[int, str]]):
+    # Два параметра-массива вместо отдельного параметра на каждую пару.
+    tweet_ids = bindparam(
+        "entity_tweet_ids", [tweet_id for tweet_id, _ in rows], ARRAY(Integer)
+    )
+    names = bindparam("entity_names", [name for _, name in rows], ARRAY(String))
+    return (
+        func.unnest(tweet_ids, names)
+        .table_valued("tweet_id", "name")
+        .render_derived(name="entities")
+    )
+
+
+async def backfill_tweet_entities(
+    session: AsyncSession,
+    batch_size: int,
+    after_id: int = 0,
+) -> int | None:
+    """
+    Индексация хэштегов и упоминаний одной пачки существующих твитов.
+
+    Твиты перебираются по возрастанию id, каждая пачка фиксируется отдельно.
+    :param after_id: id последнего обработанного твита предыдущей пачки.
+    :return int | None: id последнего твита пачки или None, если твитов больше нет.
+    """
+    stmt = (
+        select(TweetModel.id, TweetModel.tweet_data)
+        .where(TweetModel.id > after_id)
+        .order_by(TweetModel.id)
+        .limit(batch_size)
+    )
+    tweets = [tuple(row) for row in await session.execute(stmt)]
+    if not tweets:
+        return None
+
+    await index_tweet_entities(session=session, tweets=tweets)
+    await session.commit()
+    return tweets[-1][0]
+
+
+async def get_tweets_by_tag_db(
+    session: AsyncSession,
+    tag: str,
+    limit: int,
+    cursor: int | None = None,
+) -> list[TweetModel]:
+    """
+    Получение твитов с хэштегом, новые первыми.
+
+    Читается диапазон индекса (hashtag_id, tweet_id). Курсор - id твита,
+    после которого начинается страница.
+    """
+    stmt = (
+        select(TweetModel)
+        .join(TweetHashtagModel, TweetHashtagModel.tweet_id == TweetModel.id)
+        .join(HashtagModel, HashtagModel.id == TweetHashtagModel.hashtag_id)
+        .where(HashtagModel.name == normalize_tag(tag))
+        .options(*TWEET_FEED_VIEW)
+        .order_by(TweetHashtagModel.tweet_id.desc())
+        .limit(limit)
+    )
+    if cursor is not None:
+        stmt = stmt.where(TweetHashtagModel.tweet_id < cursor)
+
+    tweets = await session.scalars(stmt)
+    return list(tweets.unique().all())
+
+
+async def get_mentions_tweets_db(
+    session: AsyncSession,
+    user_id: int,
+    limit: int,
+    cursor: int | None = None,
+) -> list[TweetModel]:
+    """
+    Получение твитов, в которых упомянут пользователь, новые первыми.
+
+    Читается диапазон индекса (user_id, tweet_id). Курсор - id твита,
+    после которого начинается страница.
+    """
+    stmt = (
+        select(TweetModel)
+        .join(TweetMentionModel, TweetMentionModel.tweet_id == TweetModel.id)
+        .where(TweetMentionModel.user_id == user_id)
+        .options(*TWEET_FEED_VIEW)
+        .order_by(TweetMentionModel.tweet_id.desc())
+        .limit(limit)
+    )
+    if cursor is not None:
+        stmt = stmt.where(TweetMentionModel.tweet_id < cursor)
+
+    tweets = await session.scalars(stmt)
+    return list(tweets.unique().all())
+
+
+def encode_tweet_id_cursor(tweet: TweetModel) -> str:
+    """Кодирование id последнего твита страницы в непрозрачный курсор."""
+    return base64.urlsafe_b64encode(str(tweet.id).encode()).decode()
+
+
+def decode_tweet_id_cursor(cursor: str) -> int:
+    """
+    Декодирование курсора в id твита.
+
+    :raise ValueError: Если курсор некорректен.
+    """
+    try:
+        return int(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
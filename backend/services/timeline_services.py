@@ -0,0 +1,209 @@
+import asyncio
+import logging
+
+from sqlalchemy import (
+    ColumnElement,
+    Integer,
+    column,
+    delete,
+    func,
+    literal,
+    select,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.config import settings
+from backend.models.db_helper import db_helper
+from backend.models.home_timeline import HomeTimelineModel
+from backend.models.tweets import TweetModel
+from backend.models.users import SubscriptionModel
+
+logger = logging.getLogger(__name__)
+
+TIMELINE_COLUMNS = ("user_id", "tweet_id", "author_id", "likes_count")
+
+# Пространство ключей advisory-блокировок лент: ключ блокировки - пара
+# (TIMELINE_LOCK, id автора).
+TIMELINE_LOCK = 1
+
+
+def timeline_lock(author_id: int, shared: bool = False) -> ColumnElement:
+    """
+    Advisory-блокировка рассылки твитов автора до конца транзакции.
+
+    Рассылка нового твита берет исключительную блокировку, подписка и отписка -
+    разделяемую. Иначе рассылка, читающая подписки, и подписка, читающая твиты,
+    не видят незафиксированных изменений друг друга: подписчик не получает
+    твит в ленту или отписавшийся пользователь получает твит автора.
+    """
+    if shared:
+        return func.pg_advisory_xact_lock_shared(TIMELINE_LOCK, author_id)
+    return func.pg_advisory_xact_lock(TIMELINE_LOCK, author_id)
+
+
+async def fan_out_tweet(session: AsyncSession, tweet_id: int, author_id: int) -> None:
+    """
+    Добавление твита в ленты всех подписчиков автора.
+
+    Подписки читаются после блокировки timeline_lock отдельным запросом, чтобы
+    видеть подписки, зафиксированные за время ожидания блокировки. Твиты
+    одного автора рассылаются последовательно.
+    Изменения не фиксируются: вызывающая функция делает commit сама.
+    """
+    await session.execute(select(timeline_lock(author_id)))
+    followers = select(
+        SubscriptionModel.user_id,
+        literal(tweet_id),
+        literal(author_id),
+        literal(0),
+    ).where(SubscriptionModel.subscribed_to_id == author_id)
+    stmt = (
+        insert(HomeTimelineModel)
+        .from_select(TIMELINE_COLUMNS, followers)
+        .on_conflict_do_nothing()
+    )
+    await session.execute(stmt)
+
+
+async def backfill_timeline(
+    session: AsyncSession,
+    user_id: int,
+    author_id: int,
+) -> None:
+    """
+    Добавление всех твитов автора в ленту пользователя после подписки.
+
+    Изменения не фиксируются: вызывающая функция делает commit сама.
+    """
+    author_tweets = select(
+        literal(user_id),
+        TweetModel.id,
+        TweetModel.author_id,
+        TweetModel.likes_count,
+    ).where(TweetModel.author_id == author_id)
+    stmt = (
+        insert(HomeTimelineModel)
+        .from_select(TIMELINE_COLUMNS, author_tweets)
+        .on_conflict_do_nothing()
+    )
+    await session.execute(stmt)
+
+
+async def prune_timeline(session: AsyncSession, user_id: int, author_id: int) -> None:
+    """
+    Удаление твитов автора из ленты пользователя после отписки.
+
+    Изменения не фиксируются: вызывающая функция делает commit сама.
+    """
+    stmt = delete(HomeTimelineModel).where(
+        HomeTimelineModel.user_id == user_id,
+        HomeTimelineModel.author_id == author_id,
+    )
+    await session.execute(stmt)
+
+
+async def rebuild_home_timeline(
+    session: AsyncSession,
+    user_ids: list[int] | None = None,
+) -> None:
+    """
+    Пересборка лент по текущим подпискам и твитам.
+
+    Если user_ids не переданы, пересобираются ленты всех пользователей.
+    """
+    clear_stmt = delete(HomeTimelineModel)
+    timeline = select(
+        SubscriptionModel.user_id,
+        TweetModel.id,
+        TweetModel.author_id,
+        TweetModel.likes_count,
+    ).join(TweetModel, TweetModel.author_id == SubscriptionModel.subscribed_to_id)
+
+    if user_ids is not None:
+        clear_stmt = clear_stmt.where(HomeTimelineModel.user_id.in_(user_ids))
+        timeline = timeline.where(SubscriptionModel.user_id.in_(user_ids))
+
+    await session.execute(clear_stmt)
+    await session.execute(
+        insert(HomeTimelineModel)
+        .from_select(TIMELINE_COLUMNS, timeline)
+        .on_conflict_do_nothing(),
+    )
+    await session.commit()
+
+
+async def sync_timeline_likes(session: AsyncSession, batch_size: int) -> int:
+    """
+    Копирование изменившихся счетчиков лайков в home_timeline.
+
+    Лайк меняет только tweets.likes_count, а твиты, счетчик которых еще не
+    скопирован, находятся по частичному индексу. За проход каждый твит
+    копируется один раз, сколько бы лайков он ни получил с прошлого прохода.
+    Пачка копируется в отдельной транзакции, а отметка о копировании ставится
+    следующей короткой транзакцией: строки tweets не блокируются на время
+    обновления лент, и лайки не ждут его. Если счетчик изменился во время
+    копирования, твит остается в индексе до следующего прохода.
+
+    :return int: Число твитов, счетчики которых скопированы.
+    """
+    synced, last_id = 0, 0
+    while True:
+        pending_stmt = (
+            select(TweetModel.id, TweetModel.likes_count)
+            .where(
+                TweetModel.likes_count != TweetModel.timeline_likes_count,
+                TweetModel.id > last_id,
+            )
+            .order_by(TweetModel.id)
+            .limit(batch_size)
+        )
+        rows = (await session.execute(pending_stmt)).all()
+        if not rows:
+            return synced
+
+        pending = values(
+            column("tweet_id", Integer),
+            column("likes_count", Integer),
+            name="pending",
+        ).data([tuple(row) for row in rows])
+        await session.execute(
+            update(HomeTimelineModel)
+            .where(
+                HomeTimelineModel.tweet_id == pending.c.tweet_id,
+                HomeTimelineModel.likes_count != pending.c.likes_count,
+            )
+            .values(likes_count=pending.c.likes_count)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+
+        await session.execute(
+            update(TweetModel)
+            .where(TweetModel.id == pending.c.tweet_id)
+            .values(timeline_likes_count=pending.c.likes_count)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+
+        synced += len(rows)
+        last_id = rows[-1].id
+
+
+async def run_timeline_likes_sync_periodically(interval: float) -> None:
+    """Копирование счетчиков лайков в ленты каждые interval секунд."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with db_helper.session_factory() as session:
+                synced = await sync_timeline_likes(
+                    session=session,
+                    batch_size=settings.timeline_likes_sync_batch_size,
+                )
+        except Exception:
+            logger.exception("Timeline likes sync failed")
+        else:
+            if synced:
+                logger.info("Timeline likes sync: %s tweets", synced)
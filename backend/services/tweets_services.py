@@ -1,16 +1,40 @@
-from sqlalchemy import delete
+import base64
+import binascii
+
+from sqlalchemy import (
+    CTE,
+    ColumnElement,
+    Select,
+    cast,
+    delete,
+    exists,
+    func,
+    literal,
+    select,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import REAL, REGCONFIG, insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from backend.models.tweets import TweetModel
-from backend.schemas import CreateTweetSchema, TweetLikesSchema, TweetSchema, UserSchema
-from backend.services.medias_services import get_images_obj_from_ids
-from backend.services.other_services import (
-    get_full_name,
-    get_tweet,
-    get_user_with_following,
-    get_user_with_liked_tweets,
-    get_user_with_tweets,
+from backend.config import settings
+from backend.models.home_timeline import HomeTimelineModel
+from backend.models.images import ImageModel
+from backend.models.likes_tweets import TweetLikes
+from backend.models.tweets import SEARCH_CONFIG, TweetModel
+from backend.models.users import SubscriptionModel
+from backend.schemas import (
+    AttachmentSchema,
+    CreateTweetSchema,
+    TweetLikesSchema,
+    TweetSchema,
+    UserSchema,
 )
+from backend.services.loaders import TWEET_FEED_VIEW
+from backend.services.medias_services import get_image_url, get_image_variants
+from backend.services.other_services import get_full_name
+from backend.services.tags_services import index_tweet_entities
+from backend.services.timeline_services import fan_out_tweet
 
 
 async def create_tweet_db(
@@ -19,40 +43,100 @@ async def create_tweet_db(
     tweet_data: CreateTweetSchema,
 ) -> int:
     """
-    Создание твита.
+    Создание твита. Твит сразу добавляется в ленты подписчиков автора,
+    его хэштеги и упоминания - в таблицы связей (index_tweet_entities).
+
+    Твит вставляется и изображения прикрепляются одним запросом. Изображение
+    прикрепляется, только если оно еще не прикреплено: из параллельных
+    твитов с одним изображением его получит только один, остальные
+    откатываются с ошибкой.
 
-    :raise ValueError: Если изображение используется в другом твите.
+    :raise ValueError: Если изображение не найдено или используется в другом твите.
     """
-    if tweet_data.tweet_media_ids:
-        images = await get_images_obj_from_ids(
-            session=session,
-            image_ids=tweet_data.tweet_media_ids,
-        )
-        tweet = TweetModel(
-            author_id=user_id,
-            tweet_data=tweet_data.tweet_data,
-            images=images,
-        )
-        for image in images:
-            if image.tweet_id is None:
-                image.tweet_id = tweet.id
-            else:
-                raise ValueError("Image used in more than one tweet")
-    else:
-        tweet = TweetModel(
-            author_id=user_id,
-            tweet_data=tweet_data.tweet_data,
+    media_ids = sorted(set(tweet_data.tweet_media_ids))
+    new_tweet = (
+        insert(TweetModel)
+        .values(author_id=user_id, tweet_data=tweet_data.tweet_data)
+        .returning(TweetModel.id)
+        .cte("new_tweet")
+    )
+    attached = (
+        update(ImageModel)
+        .where(ImageModel.id.in_(media_ids), ImageModel.tweet_id.is_(None))
+        .values(tweet_id=select(new_tweet.c.id).scalar_subquery())
+        .returning(ImageModel.id)
+        .cte("attached")
+    )
+    stmt = select(
+        new_tweet.c.id,
+        select(func.count()).select_from(attached).scalar_subquery(),
+    )
+    tweet_id, attached_count = (await session.execute(stmt)).one()
+
+    if attached_count != len(media_ids):
+        found_count = await session.scalar(
+            select(func.count(ImageModel.id)).where(ImageModel.id.in_(media_ids))
         )
-    session.add(tweet)
+        await session.rollback()
+        if found_count != len(media_ids):
+            raise ValueError("Image not found")
+        raise ValueError("Image used in more than one tweet")
+
+    await index_tweet_entities(
+        session=session, tweets=[(tweet_id, tweet_data.tweet_data)]
+    )
+    await fan_out_tweet(session=session, tweet_id=tweet_id, author_id=user_id)
     await session.commit()
-    return tweet.id
+    return tweet_id
 
 
-async def delete_tweet_db(session: AsyncSession, tweet_id: int) -> None:
-    """Удаление твита из БД."""
-    stmt = delete(TweetModel).where(TweetModel.id == tweet_id)
-    await session.execute(stmt)
+async def delete_tweet_db(
+    session: AsyncSession,
+    tweet_id: int,
+    author_id: int,
+) -> list[int]:
+    """
+    Удаление твита его автором одним запросом.
+
+    Записи лент подписчиков и изображения твита удаляются каскадно внешними
+    ключами. Файлы изображений освобождает вызывающий код через
+    release_image_blobs после коммита. Файлы изображений, загруженных
+    до хранения по хэшу, удаляет сборщик мусора (media_gc).
+
+    :raise ValueError: Если твит не найден.
+    :raise PermissionError: Если пользователь не автор твита.
+    :return list[int]: id файлов изображений удаленного твита.
+    """
+    deleted = (
+        delete(TweetModel)
+        .where(TweetModel.id == tweet_id, TweetModel.author_id == author_id)
+        .returning(TweetModel.id)
+        .cte("deleted")
+    )
+    # Подзапросы видят строки до удаления: автор твита нужен, чтобы отличить
+    # чужой твит от несуществующего, изображения - чтобы освободить их файлы.
+    blob_ids = (
+        select(ImageModel.blob_id)
+        .where(
+            ImageModel.tweet_id.in_(select(deleted.c.id)),
+            ImageModel.blob_id.is_not(None),
+        )
+        .distinct()
+    )
+    stmt = select(
+        select(TweetModel.author_id).where(TweetModel.id == tweet_id).scalar_subquery(),
+        select(deleted.c.id).exists(),
+        func.array(blob_ids.scalar_subquery()),
+    )
+    tweet_author_id, is_deleted, tweet_blob_ids = (await session.execute(stmt)).one()
+
+    if tweet_author_id is None:
+        raise ValueError("Tweet not found")
+    if not is_deleted:
+        raise PermissionError("You are not the author of the tweet")
+
     await session.commit()
+    return tweet_blob_ids
 
 
 async def add_like_to_tweet_db(
@@ -61,15 +145,27 @@ async def add_like_to_tweet_db(
     tweet_id: int,
 ) -> None:
     """
-    Добавление лайка к твиту.
+    Добавление лайка к твиту одним запросом.
+
+    Повторный лайк ничего не меняет: счетчик лайков увеличивается только
+    при фактической вставке строки в tweets_likes.
 
-    :raise ValueError: Если пользователь или твит не найдены.
+    :raise ValueError: Если твит не найден.
     """
-    user_db = await get_user_with_liked_tweets(session, user_id)
-    tweet = await get_tweet(session, tweet_id)
+    liked = (
+        insert(TweetLikes)
+        .from_select(
+            ("user_id", "tweet_id"),
+            select(literal(user_id), TweetModel.id).where(TweetModel.id == tweet_id),
+        )
+        .on_conflict_do_nothing(constraint="idx_unique_user_to_tweet")
+        .returning(TweetLikes.tweet_id)
+        .cte("liked")
+    )
+    tweet_exists, _ = await _change_likes_count(session, tweet_id, liked, delta=1)
 
-    user_db.liked_tweets.append(tweet)
-    await session.commit()
+    if not tweet_exists:
+        raise ValueError("Tweet not found")
 
 
 async def remove_like_from_tweet_db(
@@ -78,37 +174,285 @@ async def remove_like_from_tweet_db(
     tweet_id: int,
 ) -> None:
     """
-    Удаление лайка с твита.
+    Удаление лайка с твита одним запросом.
 
-    :raise ValueError: Если пользователь или твит не найдены или если
+    :raise ValueError: Если твит не найден или если
      твита нет в списке понравившихся.
     """
-    user_db = await get_user_with_liked_tweets(session, user_id)
-    tweet = await get_tweet(session, tweet_id)
+    unliked = (
+        delete(TweetLikes)
+        .where(TweetLikes.user_id == user_id, TweetLikes.tweet_id == tweet_id)
+        .returning(TweetLikes.tweet_id)
+        .cte("unliked")
+    )
+    tweet_exists, changed = await _change_likes_count(
+        session,
+        tweet_id,
+        unliked,
+        delta=-1,
+    )
 
-    if tweet not in user_db.liked_tweets:
+    if not tweet_exists:
+        raise ValueError("Tweet not found")
+    if not changed:
         raise ValueError("Tweet is not in the list of liked tweets")
 
-    user_db.liked_tweets.remove(tweet)
+
+async def _change_likes_count(
+    session: AsyncSession,
+    tweet_id: int,
+    changed_likes: CTE,
+    delta: int,
+) -> tuple[bool, bool]:
+    """
+    Изменение счетчика лайков в одном запросе с изменением tweets_likes.
+
+    Копии счетчика в home_timeline запрос не меняет: их обновляет
+    sync_timeline_likes вне запроса лайка, поэтому время лайка не зависит
+    от числа подписчиков автора.
+    :return tuple: Существует ли твит и изменился ли счетчик.
+    """
+    counted = (
+        update(TweetModel)
+        .where(TweetModel.id.in_(select(changed_likes.c.tweet_id)))
+        .values(likes_count=TweetModel.likes_count + delta)
+        .returning(TweetModel.id)
+        .cte("counted")
+    )
+    stmt = select(
+        exists().where(TweetModel.id == tweet_id),
+        exists(select(counted.c.id)),
+    )
+    tweet_exists, changed = (await session.execute(stmt)).one()
+    await session.commit()
+
+    return tweet_exists, changed
+
+
+async def find_likes_count_drift(session: AsyncSession) -> list[tuple[int, int, int]]:
+    """
+    Поиск твитов, у которых счетчик лайков расходится с таблицей лайков.
+
+    :return list: Кортежи (id твита, значение счетчика, фактическое количество).
+    """
+    actual_count = func.count(TweetLikes.id)
+    stmt = (
+        select(TweetModel.id, TweetModel.likes_count, actual_count)
+        .outerjoin(TweetLikes, TweetLikes.tweet_id == TweetModel.id)
+        .group_by(TweetModel.id)
+        .having(TweetModel.likes_count != actual_count)
+        .order_by(TweetModel.id)
+    )
+    drift = await session.execute(stmt)
+    return [(tweet_id, stored, actual) for tweet_id, stored, actual in drift]
+
+
+async def find_timeline_likes_drift(session: AsyncSession) -> list[int]:
+    """
+    Поиск твитов, у которых копия счетчика лайков в home_timeline
+    расходится с последним скопированным значением.
+
+    Копии, которые sync_timeline_likes еще не обновил, расхождением не
+    считаются. Расхождение остается, если подписка на автора добавила строки
+    ленты во время копирования; следующее изменение счетчика его исправит.
+    :return list[int]: id твитов.
+    """
+    stmt = (
+        select(HomeTimelineModel.tweet_id)
+        .join(TweetModel, TweetModel.id == HomeTimelineModel.tweet_id)
+        .where(HomeTimelineModel.likes_count != TweetModel.timeline_likes_count)
+        .distinct()
+        .order_by(HomeTimelineModel.tweet_id)
+    )
+    return list((await session.scalars(stmt)).all())
+
+
+async def repair_likes_count(session: AsyncSession, tweet_ids: list[int]) -> None:
+    """
+    Пересчет счетчиков лайков у указанных твитов и их копий в home_timeline.
+
+    Строки твитов блокируются до пересчета, поэтому лайки, поставленные
+    параллельно, не теряются: они либо уже видны при подсчете, либо
+    изменят счетчик после завершения транзакции.
+    """
+    lock_stmt = (
+        select(TweetModel.id)
+        .where(TweetModel.id.in_(tweet_ids))
+        .order_by(TweetModel.id)
+        .with_for_update()
+    )
+    await session.execute(lock_stmt)
+
+    actual_count = (
+        select(func.count(TweetLikes.id))
+        .where(TweetLikes.tweet_id == TweetModel.id)
+        .scalar_subquery()
+    )
+    stmt = (
+        update(TweetModel)
+        .where(TweetModel.id.in_(tweet_ids))
+        .values(likes_count=actual_count, timeline_likes_count=actual_count)
+        .execution_options(synchronize_session=False)
+    )
+    await session.execute(stmt)
+
+    timeline_stmt = (
+        update(HomeTimelineModel)
+        .where(
+            HomeTimelineModel.tweet_id == TweetModel.id,
+            TweetModel.id.in_(tweet_ids),
+        )
+        .values(likes_count=TweetModel.likes_count)
+        .execution_options(synchronize_session=False)
+    )
+    await session.execute(timeline_stmt)
     await session.commit()
 
 
-async def get_tweet_feed_db(session: AsyncSession, user_id: int) -> list[TweetModel]:
+async def get_tweet_feed_db(
+    session: AsyncSession,
+    user_id: int,
+    limit: int | None = None,
+    cursor: tuple[int, int] | None = None,
+) -> list[tuple[TweetModel, int]]:
     """
-    Получение ленты твитов.
+    Получение ленты твитов одним запросом.
+
+    Твиты сортируются по счетчику лайков и ограничиваются на стороне БД.
+    Курсор (количество лайков, id твита) задает позицию, после которой
+    начинается страница, без OFFSET. Для ленты из home_timeline страница
+    читается диапазоном индекса (user_id, likes_count, tweet_id), и ее время
+    не зависит от глубины прокрутки и числа твитов в БД. Копия счетчика
+    в home_timeline отстает от tweets на интервал sync_timeline_likes.
+    Для ленты из подписок такого индекса нет: обходится общий индекс
+    (likes_count, id).
 
-    :raise ValueError: Если пользователь не найден.
+    Счетчик лайков меняется, поэтому курсор не дает снимка ленты: твит,
+    который набрал лайки после выдачи страницы, не попадет в следующие
+    страницы, а потерявший лайки - попадет повторно.
+
+    :return list[tuple[TweetModel, int]]: Твиты с числом лайков, по которому
+        они отсортированы: для ленты из home_timeline это копия счетчика.
     """
-    user = await get_user_with_following(session, user_id)
+    likes_key, id_key = _feed_sort_key()
+    stmt = (
+        _select_feed_tweets(user_id)
+        .add_columns(likes_key)
+        .options(*TWEET_FEED_VIEW)
+        .order_by(likes_key.desc(), id_key.desc())
+        .limit(limit)
+    )
+    if cursor is not None:
+        stmt = stmt.where(tuple_(likes_key, id_key) < tuple_(*cursor))
 
-    following_user_tweets = []
-    for following_user in user.following:
-        following_user = await get_user_with_tweets(session, following_user.id)
-        following_user_tweets.extend(following_user.tweets)
+    rows = await session.execute(stmt)
+    return [(tweet, likes_count) for tweet, likes_count in rows.unique()]
 
-    following_user_tweets.sort(key=lambda tweet: tweet.count_likes, reverse=True)
 
-    return following_user_tweets
+def encode_feed_cursor(tweet: TweetModel, likes_count: int) -> str:
+    """
+    Кодирование позиции твита в ленте в непрозрачный курсор.
+
+    likes_count - число лайков, с которым твит выбран get_tweet_feed_db.
+    """
+    position = f"{likes_count}:{tweet.id}".encode()
+    return base64.urlsafe_b64encode(position).decode()
+
+
+def decode_feed_cursor(cursor: str) -> tuple[int, int]:
+    """
+    Декодирование курсора ленты в пару (количество лайков, id твита).
+
+    :raise ValueError: Если курсор некорректен.
+    """
+    try:
+        position = base64.urlsafe_b64decode(cursor.encode()).decode()
+        likes_count, tweet_id = position.split(":")
+        return int(likes_count), int(tweet_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+
+async def search_tweets_db(
+    session: AsyncSession,
+    query: str,
+    limit: int,
+    cursor: tuple[float, int] | None = None,
+) -> list[tuple[TweetModel, float]]:
+    """
+    Полнотекстовый поиск твитов по GIN-индексу столбца search_vector.
+
+    Запрос разбирается websearch_to_tsquery: слова, "фразы", OR и -исключения.
+    Твиты сортируются по релевантности ts_rank, затем по id. Курсор
+    (релевантность, id твита) задает позицию, после которой начинается страница.
+
+    :return list[tuple[TweetModel, float]]: Твиты с их релевантностью.
+    """
+    ts_query = func.websearch_to_tsquery(cast(SEARCH_CONFIG, REGCONFIG), query)
+    rank = func.ts_rank(TweetModel.search_vector, ts_query)
+    stmt = (
+        select(TweetModel, rank)
+        .where(TweetModel.search_vector.bool_op("@@")(ts_query))
+        .options(*TWEET_FEED_VIEW)
+        .order_by(rank.desc(), TweetModel.id.desc())
+        .limit(limit)
+    )
+    if cursor is not None:
+        # ts_rank возвращает real: курсор сравнивается в том же типе,
+        # иначе округление при переводе в double смещает границу страницы.
+        cursor_rank, cursor_id = cursor
+        stmt = stmt.where(
+            tuple_(rank, TweetModel.id) < tuple_(cast(cursor_rank, REAL), cursor_id)
+        )
+
+    rows = await session.execute(stmt)
+    return [(tweet, tweet_rank) for tweet, tweet_rank in rows]
+
+
+def encode_search_cursor(tweet: TweetModel, rank: float) -> str:
+    """Кодирование позиции твита в результатах поиска в непрозрачный курсор."""
+    position = f"{rank!r}:{tweet.id}".encode()
+    return base64.urlsafe_b64encode(position).decode()
+
+
+def decode_search_cursor(cursor: str) -> tuple[float, int]:
+    """
+    Декодирование курсора поиска в пару (релевантность, id твита).
+
+    :raise ValueError: Если курсор некорректен.
+    """
+    try:
+        position = base64.urlsafe_b64decode(cursor.encode()).decode()
+        rank, tweet_id = position.split(":")
+        return float(rank), int(tweet_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+
+def _feed_sort_key() -> tuple[ColumnElement[int], ColumnElement[int]]:
+    # Ключ сортировки берется из той же таблицы, по которой фильтруется
+    # лента, чтобы поиск по курсору шел по ее индексу.
+    if settings.feed_source == "subscriptions":
+        return TweetModel.likes_count, TweetModel.id
+    return HomeTimelineModel.likes_count, HomeTimelineModel.tweet_id
+
+
+def _select_feed_tweets(user_id: int) -> Select[tuple[TweetModel]]:
+    if settings.feed_source == "subscriptions":
+        return (
+            select(TweetModel)
+            .join(
+                SubscriptionModel,
+                SubscriptionModel.subscribed_to_id == TweetModel.author_id,
+            )
+            .where(SubscriptionModel.user_id == user_id)
+        )
+
+    return (
+        select(TweetModel)
+        .join(HomeTimelineModel, HomeTimelineModel.tweet_id == TweetModel.id)
+        .where(HomeTimelineModel.user_id == user_id)
+    )
 
 
 async def serialize_tweets(tweets: list[TweetModel]) -> list[TweetSchema]:
@@ -118,7 +462,11 @@ async def serialize_tweets(tweets: list[TweetModel]) -> list[TweetSchema]:
         schema = TweetSchema(
             id=tweet.id,
             content=tweet.tweet_data,
-            attachments=[image.image_path for image in tweet.images],
+            attachments=[get_image_url(image) for image in tweet.images],
+            attachment_variants=[
+                AttachmentSchema(id=image.id, variants=get_image_variants(image))
+                for image in tweet.images
+            ],
             author=UserSchema(
                 id=tweet.author.id,
                 name=get_full_name(tweet.author),
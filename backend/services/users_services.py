@@ -1,13 +1,18 @@
+from sqlalchemy import CTE, delete, exists, literal, select
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from backend.models import UserModel
+from backend.models import SubscriptionModel, UserModel
 from backend.schemas import ExtendedUserSchema, UserSchema
 from backend.services.other_services import (
     get_full_name,
-    get_user,
-    get_user_with_following,
     get_user_with_following_and_followers,
 )
+from backend.services.timeline_services import (
+    backfill_timeline,
+    prune_timeline,
+    timeline_lock,
+)
 
 
 async def add_follow_user_db(
@@ -16,14 +21,38 @@ async def add_follow_user_db(
     follow_user_id: int,
 ) -> None:
     """
-    Добавление подписки на пользователя.
+    Добавление подписки на пользователя. Твиты пользователя добавляются в ленту.
+
+    Подписка вставляется одним запросом, повторная подписка ничего не меняет.
 
     :raise ValueError: Если пользователь не найден.
     """
-    current_user = await get_user_with_following(session, user_id)
-    follow_user = await get_user(session, follow_user_id)
+    followed = (
+        insert(SubscriptionModel)
+        .from_select(
+            ("user_id", "subscribed_to_id"),
+            select(literal(user_id), UserModel.id).where(
+                UserModel.id == follow_user_id
+            ),
+        )
+        .on_conflict_do_nothing(constraint="idx_unique_user_to_user")
+        .returning(SubscriptionModel.id)
+        .cte("followed")
+    )
+    user_exists, created = await _change_subscription(
+        session,
+        follow_user_id,
+        followed,
+    )
 
-    current_user.following.append(follow_user)
+    if not user_exists:
+        raise ValueError("User not found")
+    if created:
+        await backfill_timeline(
+            session=session,
+            user_id=user_id,
+            author_id=follow_user_id,
+        )
     await session.commit()
 
 
@@ -33,18 +62,55 @@ async def delete_follow_user_db(
     follow_user_id: int,
 ) -> None:
     """
-    Удаление подписки на пользователя.
+    Удаление подписки на пользователя. Твиты пользователя удаляются из ленты.
 
     :raise ValueError: Если пользователь не найден или если его нет в подписках.
     """
-    current_user = await get_user_with_following(session, user_id)
-    follow_user = await get_user(session, follow_user_id)
-
-    if follow_user in current_user.following:
-        current_user.following.remove(follow_user)
-        await session.commit()
-        return
-    raise ValueError("No user subscription")
+    unfollowed = (
+        delete(SubscriptionModel)
+        .where(
+            SubscriptionModel.user_id == user_id,
+            SubscriptionModel.subscribed_to_id == follow_user_id,
+        )
+        .returning(SubscriptionModel.id)
+        .cte("unfollowed")
+    )
+    user_exists, deleted = await _change_subscription(
+        session,
+        follow_user_id,
+        unfollowed,
+    )
+
+    if not user_exists:
+        raise ValueError("User not found")
+    if not deleted:
+        raise ValueError("No user subscription")
+
+    await prune_timeline(session=session, user_id=user_id, author_id=follow_user_id)
+    await session.commit()
+
+
+async def _change_subscription(
+    session: AsyncSession,
+    follow_user_id: int,
+    changed_subscriptions: CTE,
+) -> tuple[bool, bool]:
+    """
+    Изменение подписки с проверкой существования пользователя в одном запросе.
+
+    Тот же запрос берет разделяемую блокировку timeline_lock автора, поэтому
+    следующие за ним backfill_timeline и prune_timeline видят все твиты,
+    разосланные до подписки или отписки.
+    :return tuple: Существует ли пользователь и изменилась ли подписка.
+    """
+    stmt = select(
+        timeline_lock(follow_user_id, shared=True),
+        exists().where(UserModel.id == follow_user_id),
+        exists(select(changed_subscriptions.c.id)),
+    )
+    _, user_exists, changed = (await session.execute(stmt)).one()
+
+    return user_exists, changed
 
 
 async def serialize_user_extended(
@@ -1,10 +1,12 @@
 import asyncio
 import io
 import sys
+from pathlib import Path
 
 import pytest
 from httpx import AsyncClient
 from PIL import Image
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.config import settings
@@ -12,16 +14,11 @@ from backend.main import app
 from backend.models import ImageModel, TweetModel, UserModel
 from backend.models.base import Base
 from backend.models.db_helper import db_helper
-from backend.services.medias_services import add_image_path_to_db, get_image, save_image
+from backend.services.medias_services import get_image, save_image
+from backend.services.storage import media_storage
 from backend.tests.factories import TweetFactory, UserFactory
 
 
-@pytest.fixture(scope="session")
-async def db() -> AsyncSession:
-    async for session in db_helper.session_dependency():
-        yield session
-
-
 @pytest.fixture(scope="session", autouse=True)
 async def prepare_db():
     assert settings.mode == "TEST"
@@ -33,6 +30,23 @@ async def prepare_db():
         await conn.run_sync(Base.metadata.drop_all)
 
 
+@pytest.fixture(scope="session")
+async def db(prepare_db) -> AsyncSession:
+    # Зависимость от prepare_db закрывает сессию до удаления таблиц: иначе
+    # DROP TABLE ждет открытую транзакцию сессии.
+    async for session in db_helper.session_dependency():
+        yield session
+
+
+@pytest.fixture(scope="session", autouse=True)
+def media_dir(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    # Файлы изображений пишутся во временную директорию, а не в static/images.
+    root = tmp_path_factory.mktemp("media")
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(media_storage, "root", root)
+        yield root
+
+
 @pytest.fixture(scope="session")
 def event_loop(request):
     if sys.platform == "win32":
@@ -43,6 +57,33 @@ def event_loop(request):
     loop.close()
 
 
+class StatementRecorder:
+    """Records executed SQL statements together with their row counts."""
+
+    def __init__(self):
+        self.statements: list[tuple[str, int]] = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append((statement, cursor.rowcount))
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def rowcounts(self) -> list[int]:
+        return [rowcount for _, rowcount in self.statements]
+
+
+@pytest.fixture
+def sql_statements() -> StatementRecorder:
+    recorder = StatementRecorder()
+    engine = db_helper.engine.sync_engine
+    event.listen(engine, "after_cursor_execute", recorder)
+    yield recorder
+    event.remove(engine, "after_cursor_execute", recorder)
+
+
 @pytest.fixture
 async def client(user: UserModel) -> AsyncClient:
     async with AsyncClient(
@@ -79,7 +120,6 @@ async def image_bytes() -> bytes:
 @pytest.fixture
 async def image(image_bytes: bytes) -> ImageModel:
     async for session in db_helper.session_dependency():
-        path = await save_image(image_bytes)
-        image_id = await add_image_path_to_db(session=session, photo_path=path)
+        image = await save_image(session=session, image=image_bytes)
 
-        return await get_image(session=session, image_id=image_id)
+        return await get_image(session=session, image_id=image.id)
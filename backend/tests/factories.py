@@ -7,11 +7,13 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from backend.models.db_helper import db_helper
 from backend.models.tweets import TweetModel
 from backend.models.users import UserModel
-from backend.services.other_services import (
-    get_user_with_following,
-    get_user_with_following_and_liked_tweets,
+from backend.services.other_services import get_user_with_following_and_liked_tweets
+from backend.services.timeline_services import rebuild_home_timeline
+from backend.services.tweets_services import (
+    find_likes_count_drift,
+    get_tweet_feed_db,
+    repair_likes_count,
 )
-from backend.services.tweets_services import get_tweet_feed_db
 
 
 class UserFactory(SQLAlchemyModelFactory):
@@ -97,12 +99,12 @@ async def generate_likes(session: AsyncSession, user_id: int) -> None:
     Генерация лайков на посты пользователей из подписок пользователя.
     Ожидается id пользователя, который подписан на других пользователей.
     """
-    user = await get_user_with_following(session, user_id)
+    user = await get_user_with_following_and_liked_tweets(session, user_id)
 
     following_user_tweets = set()
-    for user in user.following:
-        tweets = await get_tweet_feed_db(session, user.id)
-        following_user_tweets.update(tweets)
+    for following in user.following:
+        rows = await get_tweet_feed_db(session, following.id)
+        following_user_tweets.update(tweet for tweet, _ in rows)
 
     count_liked_tweets = random.randint(1, len(following_user_tweets))
 
@@ -123,7 +125,14 @@ async def generate_data(
     users = await generate_users_and_tweets(count_users, count_tweets)
     user_ids = [user.id for user in users]
     await generate_subscriptions(session=session, user_ids=user_ids)
+    await rebuild_home_timeline(session=session, user_ids=user_ids)
     for user in users:
         await generate_likes(session=session, user_id=user.id)
 
+    drift = await find_likes_count_drift(session=session)
+    await repair_likes_count(
+        session=session,
+        tweet_ids=[tweet_id for tweet_id, *_ in drift],
+    )
+
     return users
@@ -0,0 +1,178 @@
+import sys
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from backend.config import Settings, settings
+from backend.models import TweetModel
+from backend.models.db_helper import DatabaseHelper, RecentWrites, db_helper
+from backend.services.security import api_key_cache
+
+PREPARED_STATEMENTS = text("SELECT count(*) FROM pg_prepared_statements")
+
+
+async def _count_prepared_statements(helper: DatabaseHelper) -> int:
+    async with helper.engine.connect() as conn:
+        for _ in range(5):
+            await conn.execute(text("SELECT 1"))
+        return await conn.scalar(PREPARED_STATEMENTS)
+
+
+async def test_pool_stats_endpoint(client: AsyncClient):
+    checkouts = db_helper.pool_stats()["checkouts"]
+
+    response = await client.get("http://127.0.0.1:5000/stats")
+
+    assert response.status_code == 200
+    pool = response.json()["db_pool"]
+    assert pool["checkouts"] > checkouts
+    assert pool["size"] == settings.db_pool_size
+    assert {"checked_out", "overflow", "wait_time_max_ms"} <= pool.keys()
+
+
+async def test_pool_timeout_is_counted():
+    helper = DatabaseHelper(
+        url=settings.db_url,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.1,
+    )
+    async with helper.engine.connect():
+        with pytest.raises(PoolTimeoutError):
+            async with helper.engine.connect():
+                pass
+
+    stats = helper.pool_stats()
+    assert stats["timeouts"] == 1
+    assert stats["checked_out"] == 0
+    assert stats["wait_time_max_ms"] >= 100
+    await helper.engine.dispose()
+
+
+async def test_pgbouncer_mode_disables_prepared_statements():
+    pgbouncer_settings = Settings(db_pgbouncer=True, db_prepare_threshold=0)
+    assert pgbouncer_settings.prepare_threshold is None
+
+    helper = DatabaseHelper(
+        url=settings.db_url,
+        prepare_threshold=pgbouncer_settings.prepare_threshold,
+    )
+    assert await _count_prepared_statements(helper) == 0
+    await helper.engine.dispose()
+
+    helper = DatabaseHelper(url=settings.db_url, prepare_threshold=0)
+    assert await _count_prepared_statements(helper) > 0
+    await helper.engine.dispose()
+
+
+async def test_recent_writes_window(monkeypatch: pytest.MonkeyPatch):
+    now = 100.0
+    clock = SimpleNamespace(monotonic=lambda: now)
+    monkeypatch.setattr(sys.modules["backend.models.db_helper"], "time", clock)
+    recent_writes = RecentWrites(window=5)
+
+    recent_writes.mark("writer")
+    assert recent_writes.is_recent("writer")
+    assert not recent_writes.is_recent("reader")
+
+    now = 105.0
+    assert not recent_writes.is_recent("writer")
+
+
+async def test_read_sessions_round_robin_replicas():
+    helper = DatabaseHelper(
+        url=settings.db_url,
+        replica_urls=[settings.db_url, settings.db_url],
+    )
+    replicas = helper.replica_session_factories
+
+    chosen = [helper.get_read_session_factory(None) for _ in range(4)]
+    assert chosen == [replicas[0], replicas[1], replicas[0], replicas[1]]
+
+    helper.recent_writes.mark("writer")
+    assert helper.get_read_session_factory("writer") is helper.session_factory
+    assert helper.get_read_session_factory("reader") in replicas
+    await helper.dispose()
+
+
+async def test_reads_go_to_replica_except_after_own_write(
+    client: AsyncClient,
+    tweet: TweetModel,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    # Реплика-заглушка указывает на ту же тестовую БД через отдельный пул.
+    replica = DatabaseHelper(url=settings.db_url)
+    monkeypatch.setattr(db_helper, "replica_engines", [replica.engine])
+    monkeypatch.setattr(
+        db_helper,
+        "replica_session_factories",
+        [replica.session_factory],
+    )
+
+    def replica_checkouts() -> int:
+        return replica.pool_stats()["checkouts"]
+
+    response = await client.get("/tweets")
+    assert response.status_code == 200
+    assert replica_checkouts() == 1
+
+    response = await client.get(f"/users/{tweet.author_id}")
+    assert response.status_code == 200
+    assert replica_checkouts() == 2
+
+    response = await client.post(f"/tweets/{tweet.id}/likes")
+    assert response.status_code == 200
+
+    response = await client.get("/users/me")
+    assert response.status_code == 200
+    assert replica_checkouts() == 2
+    await replica.dispose()
+
+
+async def test_only_authenticated_writes_are_tracked(client: AsyncClient, user):
+    unknown_key = str(uuid4())
+
+    response = await client.post(
+        "/tweets", json={"tweet_data": "test"}, headers={"api-key": unknown_key}
+    )
+    assert response.status_code == 403
+    assert not db_helper.recent_writes.is_recent(unknown_key)
+
+    response = await client.post("/tweets", json={"tweet_data": "test"})
+    assert response.status_code == 201
+    assert db_helper.recent_writes.is_recent(str(user.api_key))
+
+
+async def test_one_connection_checkout_per_request(
+    client: AsyncClient,
+    user,
+    tweet: TweetModel,
+):
+    requests = (
+        ("POST", f"/tweets/{tweet.id}/likes"),
+        ("GET", "/tweets"),
+        ("GET", f"/users/{user.id}"),
+        ("DELETE", f"/tweets/{tweet.id}/likes"),
+    )
+    for method, url in requests:
+        # Промах кэша API-ключей: авторизация тоже обращается к БД.
+        api_key_cache.invalidate(user.api_key)
+        checkouts = db_helper.pool_stats()["checkouts"]
+
+        response = await client.request(method, url)
+
+        assert response.status_code == 200
+        assert db_helper.pool_stats()["checkouts"] == checkouts + 1
+
+
+async def test_failed_request_releases_connection(client: AsyncClient):
+    checked_out = db_helper.pool_stats()["checked_out"]
+
+    response = await client.get("/tweets", headers={"api-key": str(uuid4())})
+
+    assert response.status_code == 403
+    assert db_helper.pool_stats()["checked_out"] == checked_out
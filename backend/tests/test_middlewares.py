@@ -0,0 +1,45 @@
+from fastapi import FastAPI, Request
+from httpx import AsyncClient
+
+from backend.middlewares import MaxBodySizeMiddleware
+
+app = FastAPI()
+app.add_middleware(MaxBodySizeMiddleware, max_size=10, paths=frozenset(("/upload",)))
+
+
+@app.post("/upload")
+@app.post("/other")
+async def upload(request: Request) -> dict:
+    return {"size": len(await request.body())}
+
+
+async def _chunks(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+async def test_max_body_size_allows_small_body():
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post("/upload", content=b"x" * 10)
+    assert response.status_code == 200
+    assert response.json() == {"size": 10}
+
+
+async def test_max_body_size_rejects_by_content_length():
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post("/upload", content=b"x" * 11)
+    assert response.status_code == 413
+    assert response.json()["error_type"] == "Payload too large"
+
+
+async def test_max_body_size_rejects_streamed_body():
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post("/upload", content=_chunks(b"x" * 6, b"x" * 6))
+    assert "content-length" not in response.request.headers
+    assert response.status_code == 413
+
+
+async def test_max_body_size_ignores_other_paths():
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post("/other", content=b"x" * 11)
+    assert response.status_code == 200
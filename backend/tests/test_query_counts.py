@@ -0,0 +1,123 @@
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models import UserModel
+from backend.services.security import api_key_cache
+from backend.services.users_services import add_follow_user_db
+from backend.tests.conftest import StatementRecorder
+from backend.tests.factories import TweetFactory, UserFactory
+
+
+async def _follow_author_with_tweets(
+    db: AsyncSession,
+    user: UserModel,
+    count_tweets: int,
+) -> tuple[UserModel, list[int]]:
+    author = await UserFactory()
+    tweets = [await TweetFactory(author=author) for _ in range(count_tweets)]
+    await add_follow_user_db(session=db, user_id=user.id, follow_user_id=author.id)
+    return author, [tweet.id for tweet in tweets]
+
+
+async def test_get_tweet_feed_queries(
+    db: AsyncSession,
+    client: AsyncClient,
+    user: UserModel,
+    sql_statements: StatementRecorder,
+):
+    _, tweet_ids = await _follow_author_with_tweets(db, user, count_tweets=3)
+    likers = [await UserFactory() for _ in range(4)]
+    for liker in likers:
+        await client.post(
+            f"/tweets/{tweet_ids[0]}/likes",
+            headers={"api-key": str(liker.api_key)},
+        )
+    api_key_cache.invalidate(user.api_key)
+    sql_statements.statements.clear()
+
+    response = await client.get("/tweets")
+
+    assert len(response.json()["tweets"]) == 3
+    # Авторизация, твиты с автором, вложения, лайкнувшие пользователи.
+    assert sql_statements.count == 4
+    # Нет декартова произведения вложений и лайков: одна строка на твит,
+    # коллекции загружаются отдельно (0 вложений и 4 лайка).
+    assert sql_statements.rowcounts[:2] == [1, 3]
+    assert sorted(sql_statements.rowcounts[2:]) == [0, 4]
+
+
+async def test_delete_tweet_queries(
+    client: AsyncClient,
+    user: UserModel,
+    sql_statements: StatementRecorder,
+):
+    tweet = await TweetFactory(author=user)
+    api_key_cache.invalidate(user.api_key)
+    sql_statements.statements.clear()
+
+    response = await client.delete(f"/tweets/{tweet.id}")
+
+    assert response.status_code == 200
+    # Авторизация, удаление с проверкой авторства.
+    assert sql_statements.count == 2
+    assert sql_statements.rowcounts == [1, 1]
+
+
+async def test_like_queries(
+    client: AsyncClient,
+    user: UserModel,
+    tweet,
+    sql_statements: StatementRecorder,
+):
+    api_key_cache.invalidate(user.api_key)
+    sql_statements.statements.clear()
+    response = await client.post(f"/tweets/{tweet.id}/likes")
+    assert response.status_code == 200
+    assert sql_statements.count == 2
+
+    sql_statements.statements.clear()
+    response = await client.delete(f"/tweets/{tweet.id}/likes")
+    assert response.status_code == 200
+    # API-ключ уже в кэше, авторизация не обращается к БД.
+    assert sql_statements.count == 1
+
+
+async def test_follow_queries(
+    client: AsyncClient,
+    user: UserModel,
+    sql_statements: StatementRecorder,
+):
+    author = await UserFactory()
+    await TweetFactory(author=author)
+
+    api_key_cache.invalidate(user.api_key)
+    sql_statements.statements.clear()
+    response = await client.post(f"/users/{author.id}/follow")
+    assert response.status_code == 200
+    # Авторизация, подписка, заполнение ленты.
+    assert sql_statements.count == 3
+
+    sql_statements.statements.clear()
+    response = await client.delete(f"/users/{author.id}/follow")
+    assert response.status_code == 200
+    # API-ключ уже в кэше: удаление подписки, очистка ленты.
+    assert sql_statements.count == 2
+
+
+async def test_get_me_info_queries(
+    db: AsyncSession,
+    client: AsyncClient,
+    user: UserModel,
+    sql_statements: StatementRecorder,
+):
+    await _follow_author_with_tweets(db, user, count_tweets=1)
+    api_key_cache.invalidate(user.api_key)
+    sql_statements.statements.clear()
+
+    response = await client.get("/users/me")
+
+    assert response.status_code == 200
+    # Авторизация, пользователь, подписки, подписчики.
+    assert sql_statements.count == 4
+    assert sql_statements.rowcounts[:2] == [1, 1]
+    assert sorted(sql_statements.rowcounts[2:]) == [0, 1]
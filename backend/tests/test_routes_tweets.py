@@ -1,18 +1,34 @@
+import asyncio
+import io
+import json
+import threading
+
 import pytest
 from httpx import AsyncClient
+from PIL import Image
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from backend.models import ImageModel, TweetModel
-from backend.services.medias_services import delete_image_from_memory, get_image
+from backend.config import settings
+from backend.models import ImageBlobModel, ImageModel, TweetModel, UserModel
+from backend.services import medias_services
+from backend.services.image_processing import EncodingOptions, ImageProcessor
+from backend.services.medias_services import (
+    create_image_variants,
+    delete_image_from_memory,
+    get_image,
+)
 from backend.services.other_services import (
     get_tweet,
     get_user,
-    get_user_with_liked_tweets,
-    get_user_with_tweets,
+    get_user_with_following,
+    get_user_with_following_and_liked_tweets,
 )
+from backend.services.storage import media_storage
+from backend.services.timeline_services import rebuild_home_timeline
 from backend.services.tweets_services import add_like_to_tweet_db
-from backend.tests.factories import generate_data
+from backend.services.users_services import add_follow_user_db
+from backend.tests.factories import TweetFactory, UserFactory, generate_data
 
 
 async def test_add_tweet(db: AsyncSession, client: AsyncClient):
@@ -49,7 +65,81 @@ async def test_upload_medias(db: AsyncSession, client: AsyncClient, image_bytes:
     image = await get_image(session=db, image_id=image_id)
     assert image
 
-    await delete_image_from_memory(path=image.image_path)
+    await delete_image_from_memory(session=db, image_id=image.id)
+
+
+async def test_upload_medias_when_processing_queue_is_full(
+    client: AsyncClient,
+    image_bytes: bytes,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    processor = ImageProcessor(executor_type="thread", max_workers=1, max_queue=0)
+    monkeypatch.setattr(medias_services, "image_processor", processor)
+    release = threading.Event()
+    running = asyncio.create_task(processor.run(release.wait, 5))
+    await asyncio.sleep(0.05)
+
+    response = await client.post(
+        "/medias", files={"file": ("image.jpg", image_bytes, "image/jpeg")}
+    )
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+    release.set()
+    await running
+    processor.shutdown()
+
+
+async def test_upload_medias_with_too_many_pixels(
+    client: AsyncClient,
+    image_bytes: bytes,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    options = EncodingOptions(max_pixels=99 * 100)
+    monkeypatch.setattr(medias_services, "encoding_options", options)
+
+    response = await client.post(
+        "/medias", files={"file": ("image.jpg", image_bytes, "image/jpeg")}
+    )
+    assert response.status_code == 413
+    assert response.json()["error_type"] == "Payload too large"
+
+
+async def test_upload_medias_creates_variants(db: AsyncSession, client: AsyncClient):
+    buffer = io.BytesIO()
+    Image.new("RGB", (1200, 800)).save(buffer, format="JPEG")
+    response = await client.post(
+        "/medias", files={"file": ("image.jpg", buffer.getvalue(), "image/jpeg")}
+    )
+    assert response.status_code == 201
+
+    image = await get_image(session=db, image_id=response.json()["media_id"])
+    await db.refresh(image)
+    assert set(image.variants) == {"150", "600"}
+    assert Image.open(media_storage.path(image.variants["150"])).size == (150, 100)
+    assert Image.open(media_storage.path(image.variants["600"])).size == (600, 400)
+
+    await delete_image_from_memory(session=db, image_id=image.id)
+    assert not media_storage.path(image.variants["150"]).exists()
+
+
+async def test_get_image_variant_redirects(db: AsyncSession, client: AsyncClient):
+    buffer = io.BytesIO()
+    Image.new("RGB", (1200, 800)).save(buffer, format="JPEG")
+    image = await medias_services.save_image(session=db, image=buffer.getvalue())
+
+    client.headers = {}
+    response = await client.get(f"/medias/{image.id}/variants/600")
+    assert response.status_code == 307
+    variant = response.headers["location"].removeprefix("/static/")
+    assert Image.open(media_storage.path(variant)).size == (600, 400)
+
+    response = await client.get(f"/medias/{image.id}/variants/601")
+    assert response.status_code == 404
+    response = await client.get("/medias/999999/variants/600")
+    assert response.status_code == 404
+
+    await delete_image_from_memory(session=db, image_id=image.id)
 
 
 async def test_upload_medias_with_no_image(client: AsyncClient):
@@ -80,7 +170,7 @@ async def test_add_tweet_with_image(
     assert image.tweet_id == tweet_db.id
     assert tweet_db.images == [image]
 
-    await delete_image_from_memory(path=image.image_path)
+    await delete_image_from_memory(session=db, image_id=image.id)
 
 
 async def test_get_tweet_feed(db: AsyncSession, client: AsyncClient):
@@ -93,11 +183,76 @@ async def test_get_tweet_feed(db: AsyncSession, client: AsyncClient):
     assert len(response.json()["tweets"]) > 1
 
 
+async def test_search_tweets(client: AsyncClient):
+    for text in ("wombat burrow", "wombat", "burrow"):
+        response = await client.post("/tweets", json={"tweet_data": text})
+        assert response.status_code == 201
+
+    response = await client.get("/tweets/search", params={"q": "wombat", "limit": 1})
+    assert response.status_code == 200
+    page = response.json()
+    assert [tweet["content"] for tweet in page["tweets"]] == ["wombat"]
+
+    response = await client.get(
+        "/tweets/search",
+        params={"q": "wombat", "limit": 1, "cursor": page["next_cursor"]},
+    )
+    assert [tweet["content"] for tweet in response.json()["tweets"]] == [
+        "wombat burrow"
+    ]
+
+    response = await client.get("/tweets/search", params={"q": "x", "cursor": "?"})
+    assert response.status_code == 400
+    response = await client.get("/tweets/search", params={"q": ""})
+    assert response.status_code == 422
+
+
+async def test_get_tweets_by_tag(client: AsyncClient):
+    for text in ("#Dingo howl", "#dingo #dingo pack", "dingo"):
+        response = await client.post("/tweets", json={"tweet_data": text})
+        assert response.status_code == 201
+
+    response = await client.get("/tweets/tags/DINGO", params={"limit": 1})
+    assert response.status_code == 200
+    page = response.json()
+    assert [tweet["content"] for tweet in page["tweets"]] == ["#dingo #dingo pack"]
+
+    response = await client.get(
+        "/tweets/tags/%23dingo",
+        params={"limit": 1, "cursor": page["next_cursor"]},
+    )
+    assert [tweet["content"] for tweet in response.json()["tweets"]] == ["#Dingo howl"]
+
+    response = await client.get("/tweets/tags/dingo", params={"cursor": "?"})
+    assert response.status_code == 400
+    response = await client.get("/tweets/tags/not-a-tag")
+    assert response.status_code == 422
+
+
+async def test_get_mentions_tweets(client: AsyncClient):
+    mentioned = await UserFactory(first_name="Bilby", last_name="Macrotis")
+    response = await client.post(
+        "/tweets", json={"tweet_data": "Hello, @bilbymacrotis!"}
+    )
+    assert response.status_code == 201
+
+    response = await client.get(f"/tweets/mentions/{mentioned.id}")
+    assert response.status_code == 200
+    page = response.json()
+    assert [tweet["content"] for tweet in page["tweets"]] == ["Hello, @bilbymacrotis!"]
+    assert page.get("next_cursor") is None
+
+    response = await client.get(
+        f"/tweets/mentions/{mentioned.id}", params={"cursor": "?"}
+    )
+    assert response.status_code == 400
+
+
 async def test_delete_tweet(db: AsyncSession, client: AsyncClient):
     users = await generate_data(db, count_users=3, count_tweets=5)
-    user = await get_user_with_tweets(db, users[0].id)
+    user = await get_user(db, users[0].id)
     client.headers = {"api-key": str(user.api_key)}
-    tweet = user.tweets[0]
+    tweet = await db.scalar(select(TweetModel).where(TweetModel.author_id == user.id))
 
     response = await client.delete(f"/tweets/{tweet.id}")
     assert response.status_code == 200
@@ -106,13 +261,44 @@ async def test_delete_tweet(db: AsyncSession, client: AsyncClient):
         await get_tweet(db, tweet.id)
 
 
+async def test_delete_tweet_of_another_user(client: AsyncClient):
+    tweet = await TweetFactory(author=await UserFactory())
+
+    response = await client.delete(f"/tweets/{tweet.id}")
+    assert response.status_code == 403
+    assert response.json()["error_type"] == "Forbidden"
+
+    response = await client.delete("/tweets/999999")
+    assert response.status_code == 404
+
+
+async def test_delete_tweet_releases_image_files(
+    db: AsyncSession,
+    client: AsyncClient,
+):
+    # Уникальное содержимое: файл не разделяется с изображениями других тестов.
+    buffer = io.BytesIO()
+    Image.new("RGB", (10, 10), (17, 71, 117)).save(buffer, format="PNG")
+    image = await medias_services.save_image(session=db, image=buffer.getvalue())
+    data = {"tweet_data": "test", "tweet_media_ids": [image.id]}
+    tweet_id = (await client.post("/tweets", json=data)).json()["tweet_id"]
+    assert media_storage.path(image.image_path).exists()
+
+    response = await client.delete(f"/tweets/{tweet_id}")
+    assert response.status_code == 200
+
+    assert await db.get(ImageBlobModel, image.blob_id) is None
+    assert not media_storage.path(image.image_path).exists()
+
+
 async def test_add_like_to_tweet(db: AsyncSession, client: AsyncClient):
     users = await generate_data(db, count_users=3, count_tweets=5)
-    user1 = await get_user_with_liked_tweets(db, users[0].id)
-    user2 = await get_user_with_tweets(db, users[1].id)
+    user1 = await get_user_with_following_and_liked_tweets(db, users[0].id)
+    tweet = await db.scalar(
+        select(TweetModel).where(TweetModel.author_id == users[1].id)
+    )
 
     client.headers = {"api-key": str(user1.api_key)}
-    tweet = user2.tweets[0]
 
     if tweet in user1.liked_tweets:
         user1.liked_tweets.remove(tweet)
@@ -125,11 +311,12 @@ async def test_add_like_to_tweet(db: AsyncSession, client: AsyncClient):
 
 async def test_remove_like_from_tweet(db: AsyncSession, client: AsyncClient):
     users = await generate_data(db, count_users=3, count_tweets=5)
-    user1 = await get_user_with_liked_tweets(db, users[0].id)
-    user2 = await get_user_with_tweets(db, users[1].id)
+    user1 = await get_user_with_following_and_liked_tweets(db, users[0].id)
+    tweet = await db.scalar(
+        select(TweetModel).where(TweetModel.author_id == users[1].id)
+    )
 
     client.headers = {"api-key": str(user1.api_key)}
-    tweet = user2.tweets[0]
 
     await add_like_to_tweet_db(session=db, user_id=user1.id, tweet_id=tweet.id)
     await db.refresh(user1)
@@ -139,3 +326,151 @@ async def test_remove_like_from_tweet(db: AsyncSession, client: AsyncClient):
     assert response.status_code == 200
     await db.refresh(user1)
     assert tweet not in user1.liked_tweets
+
+
+async def test_get_tweet_feed_pagination(db: AsyncSession, client: AsyncClient):
+    users = await generate_data(db, count_users=3, count_tweets=5)
+    user = await get_user(db, users[0].id)
+    client.headers = {"api-key": str(user.api_key)}
+
+    full_feed = (await client.get("/tweets")).json()
+    assert full_feed["next_cursor"] is None
+
+    paged_ids = []
+    params = {"limit": 2}
+    while True:
+        response = await client.get("/tweets", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        paged_ids.extend(tweet["id"] for tweet in page["tweets"])
+        if page["next_cursor"] is None:
+            break
+        params["cursor"] = page["next_cursor"]
+
+    assert paged_ids == [tweet["id"] for tweet in full_feed["tweets"]]
+
+
+async def test_get_tweet_feed_with_invalid_cursor(client: AsyncClient):
+    response = await client.get("/tweets", params={"cursor": "invalid"})
+    assert response.status_code == 400
+
+
+async def test_get_tweet_feed_sql_renderer_is_byte_equivalent(
+    db: AsyncSession,
+    client: AsyncClient,
+    image: ImageModel,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    users = await generate_data(db, count_users=3, count_tweets=3)
+    reader = await get_user_with_following(db, users[0].id)
+    author = reader.following[0]
+
+    client.headers = {"api-key": str(author.api_key)}
+    data = {
+        "tweet_data": 'Кавычки " \\ и\nперенос \t\x01 😀',
+        "tweet_media_ids": [image.id],
+    }
+    response = await client.post("/tweets", json=data)
+    assert response.status_code == 201
+    client.headers = {"api-key": str(reader.api_key)}
+    # Одна копия создана, вторая будет создана по запросу.
+    await create_image_variants(
+        session=db,
+        image_id=image.id,
+        image_path=image.image_path,
+        sizes=[150],
+    )
+
+    async def get_feed(renderer: str, params: dict) -> bytes:
+        monkeypatch.setattr(settings, "feed_renderer", renderer)
+        response = await client.get("/tweets", params=params)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+        return response.content
+
+    for params in ({}, {"limit": 2}):
+        while True:
+            orm_content = await get_feed("orm", params)
+            assert await get_feed("sql", params) == orm_content
+
+            next_cursor = json.loads(orm_content)["next_cursor"]
+            if next_cursor is None:
+                break
+            params["cursor"] = next_cursor
+
+    await delete_image_from_memory(session=db, image_id=image.id)
+
+
+async def test_get_tweet_feed_pages_with_lagging_timeline_likes(
+    db: AsyncSession,
+    client: AsyncClient,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    # Копии счетчиков в home_timeline не скопированы после лайков: курсор
+    # должен строиться по копии, по которой отсортирована лента.
+    author: UserModel = await UserFactory()
+    reader: UserModel = await UserFactory()
+    likers: list[UserModel] = [await UserFactory() for _ in range(2)]
+    await add_follow_user_db(db, reader.id, author.id)
+    tweets = [await TweetFactory(author=author) for _ in range(3)]
+    await rebuild_home_timeline(session=db, user_ids=[reader.id])
+    for liker, tweet in zip(likers, tweets):
+        await add_like_to_tweet_db(session=db, user_id=liker.id, tweet_id=tweet.id)
+    await add_like_to_tweet_db(session=db, user_id=likers[1].id, tweet_id=tweets[0].id)
+    client.headers = {"api-key": str(reader.api_key)}
+
+    async def get_feed(renderer: str, params: dict) -> bytes:
+        monkeypatch.setattr(settings, "feed_renderer", renderer)
+        response = await client.get("/tweets", params=params)
+        assert response.status_code == 200
+        return response.content
+
+    paged_ids = []
+    params = {"limit": 1}
+    while True:
+        orm_content = await get_feed("orm", params)
+        assert await get_feed("sql", params) == orm_content
+
+        page = json.loads(orm_content)
+        paged_ids.extend(tweet["id"] for tweet in page["tweets"])
+        if page["next_cursor"] is None:
+            break
+        params["cursor"] = page["next_cursor"]
+
+    assert paged_ids == [tweet.id for tweet in reversed(tweets)]
+
+
+async def test_get_tweet_feed_fast_json_is_byte_equivalent(
+    db: AsyncSession,
+    client: AsyncClient,
+    image: ImageModel,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    users = await generate_data(db, count_users=3, count_tweets=3)
+    reader = await get_user_with_following(db, users[0].id)
+    author = reader.following[0]
+
+    client.headers = {"api-key": str(author.api_key)}
+    data = {
+        "tweet_data": 'Кавычки " \\ и\nперенос \t\x01 😀',
+        "tweet_media_ids": [image.id],
+    }
+    response = await client.post("/tweets", json=data)
+    assert response.status_code == 201
+    client.headers = {"api-key": str(reader.api_key)}
+
+    async def get_feed(fast_json: bool) -> bytes:
+        monkeypatch.setattr(settings, "fast_json", fast_json)
+        response = await client.get("/tweets", params={"limit": 2})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+        return response.content
+
+    assert await get_feed(True) == await get_feed(False)
+
+    monkeypatch.setattr(settings, "fast_json", True)
+    response = await client.post("/tweets", json={"tweet_data": "fast"})
+    assert response.status_code == 201
+    assert response.json()["tweet_id"] > 0
+
+    await delete_image_from_memory(session=db, image_id=image.id)
@@ -1,6 +1,8 @@
+import pytest
 from httpx import AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from backend.config import settings
 from backend.models import UserModel
 from backend.services.other_services import (
     get_user_with_following,
@@ -32,6 +34,11 @@ async def test_add_follow_user_with_not_exist_user(client: AsyncClient):
     assert response.status_code == 404
 
 
+async def test_add_follow_yourself(client: AsyncClient, user: UserModel):
+    response = await client.post(f"/users/{user.id}/follow")
+    assert response.status_code == 403
+
+
 async def test_delete_follow_user(
     db: AsyncSession,
     client: AsyncClient,
@@ -106,3 +113,19 @@ async def sort_keys(follow):
 async def test_get_user_info_with_not_exist_user(client: AsyncClient):
     response = await client.get(f"/users/999")
     assert response.status_code == 404
+
+
+async def test_get_user_info_fast_json_is_byte_equivalent(
+    db: AsyncSession,
+    client: AsyncClient,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    users = await generate_data(db, count_users=3, count_tweets=1)
+
+    async def get_user(fast_json: bool) -> bytes:
+        monkeypatch.setattr(settings, "fast_json", fast_json)
+        response = await client.get(f"/users/{users[0].id}")
+        assert response.status_code == 200
+        return response.content
+
+    assert await get_user(True) == await get_user(False)
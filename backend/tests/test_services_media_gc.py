@@ -0,0 +1,91 @@
+import io
+import os
+import time
+from datetime import timedelta
+from pathlib import Path
+
+import pytest
+from PIL import Image
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models import ImageBlobModel, ImageModel, TweetModel
+from backend.services import media_gc, medias_services
+from backend.services.media_gc import collect_media_garbage
+from backend.services.medias_services import get_variant_key, save_image
+from backend.services.storage import LocalStorage
+from backend.services.tweets_services import delete_tweet_db
+
+GRACE_PERIOD = 3600
+
+
+@pytest.fixture
+def storage(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> LocalStorage:
+    storage = LocalStorage(root=tmp_path, url_prefix="static/")
+    monkeypatch.setattr(medias_services, "media_storage", storage)
+    monkeypatch.setattr(media_gc, "media_storage", storage)
+    return storage
+
+
+async def _save_image(db: AsyncSession, color: str) -> ImageModel:
+    buffer = io.BytesIO()
+    Image.new("RGB", (10, 10), color).save(buffer, format="PNG")
+    return await save_image(session=db, image=buffer.getvalue())
+
+
+async def test_collect_media_garbage(
+    db: AsyncSession,
+    storage: LocalStorage,
+    tweet: TweetModel,
+):
+    unattached = await _save_image(db, "red")
+    unattached_id, unattached_key = unattached.id, unattached.image_path
+    await db.execute(
+        update(ImageModel)
+        .where(ImageModel.id == unattached_id)
+        .values(created_at=ImageModel.created_at - timedelta(seconds=2 * GRACE_PERIOD))
+    )
+    fresh_key = (await _save_image(db, "green")).image_path
+    attached = await _save_image(db, "blue")
+    attached_key = attached.image_path
+    attached.tweet_id = tweet.id
+    await db.commit()
+    await delete_tweet_db(session=db, tweet_id=tweet.id, author_id=tweet.author_id)
+
+    orphan_key = f"images/{'0' * 64}.png"
+    temp_key = f"{orphan_key}.1.abc.tmp"
+    await storage.save(orphan_key, b"orphan")
+    await storage.save(get_variant_key(orphan_key, 150), b"variant")
+    await storage.save(temp_key, b"temp")
+    recent_key = f"images/{'1' * 64}.png"
+    await storage.save(recent_key, b"recent")
+
+    deleted_keys = [
+        unattached_key,
+        attached_key,
+        orphan_key,
+        get_variant_key(orphan_key, 150),
+        temp_key,
+    ]
+    old = time.time() - 2 * GRACE_PERIOD
+    for key in (*deleted_keys, fresh_key):
+        os.utime(storage.path(key), (old, old))
+    deleted_bytes = sum(storage.path(key).stat().st_size for key in deleted_keys)
+
+    report = await collect_media_garbage(
+        session=db, grace_period=GRACE_PERIOD, batch_size=2, batch_delay=0
+    )
+
+    assert report.images >= 1
+    assert report.blobs >= 2
+    assert report.files == len(deleted_keys)
+    assert report.reclaimed_bytes == deleted_bytes
+    assert await db.get(ImageModel, unattached_id) is None
+    for key in deleted_keys:
+        assert not await storage.exists(key)
+    assert await storage.exists(fresh_key)
+    assert await storage.exists(recent_key)
+
+    blob_keys = set(await db.scalars(select(ImageBlobModel.path)))
+    assert fresh_key in blob_keys
+    assert not blob_keys & {unattached_key, attached_key, orphan_key}
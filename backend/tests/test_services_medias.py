@@ -1,50 +1,367 @@
+import asyncio
+import hashlib
+import io
+import threading
 from pathlib import Path
 
 import pytest
+from PIL import Image, PngImagePlugin
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from backend.models import ImageModel
+from backend.models import ImageBlobModel, ImageModel
+from backend.models.db_helper import db_helper
+from backend.services import medias_services
+from backend.services.image_processing import (
+    EncodingOptions,
+    ImageProcessor,
+    ImageTooLarge,
+    ProcessingQueueFull,
+    check_image_header,
+    encode_image,
+    encode_variant,
+)
 from backend.services.medias_services import (
-    add_image_path_to_db,
+    UPLOAD_CHUNK_SIZE,
+    create_image_variants,
     delete_image_from_memory,
     get_image,
-    get_images_obj_from_ids,
+    get_image_variant,
+    get_image_variants,
+    get_source_key,
+    get_variant_key,
+    release_image_blobs,
     save_image,
+    spool_upload,
 )
+from backend.services.storage import media_storage
 
 
-async def test_save_image(image_bytes: bytes):
-    path = await save_image(image_bytes)
-    with open(path, "rb") as f:
+async def test_save_image(db: AsyncSession, image_bytes: bytes):
+    image = await save_image(session=db, image=image_bytes)
+    with open(media_storage.path(image.image_path), "rb") as f:
         assert f.read()
-    Path(path).unlink()
+    await delete_image_from_memory(session=db, image_id=image.id)
+
 
+async def test_save_image_not_bytes(db: AsyncSession, tmp_path: Path):
+    with pytest.raises(TypeError):
+        await save_image(session=db, image=b"qwerty")
 
-async def test_save_image_not_bytes():
+    not_image = tmp_path / "image.jpg"
+    not_image.write_bytes(b"qwerty")
     with pytest.raises(TypeError):
-        await save_image("qwerty")
+        await save_image(session=db, image=str(not_image))
+
+
+async def test_save_image_checks_pixels_from_header(
+    db: AsyncSession,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    options = EncodingOptions(max_pixels=100 * 100)
+    monkeypatch.setattr(medias_services, "encoding_options", options)
+    large = tmp_path / "large.png"
+    large.write_bytes(_encode(Image.new("RGB", (101, 100)), "PNG"))
+
+    with pytest.raises(ImageTooLarge):
+        check_image_header(str(large), options)
+    with pytest.raises(ImageTooLarge):
+        await save_image(session=db, image=str(large))
+    with pytest.raises(ImageTooLarge):
+        encode_image(large.read_bytes(), options)
+
+
+async def test_spool_upload(tmp_path: Path):
+    data = b"x" * (UPLOAD_CHUNK_SIZE + 10)
+
+    path = spool_upload(io.BytesIO(data), max_bytes=len(data))
+    assert Path(path).read_bytes() == data
+    Path(path).unlink()
+
+    with pytest.raises(ImageTooLarge):
+        spool_upload(io.BytesIO(data), max_bytes=len(data) - 1)
+
+
+async def test_save_image_deduplicates_content(db: AsyncSession, image_bytes: bytes):
+    first = await save_image(session=db, image=image_bytes)
+    second = await save_image(session=db, image=image_bytes)
+
+    assert first.id != second.id
+    assert first.blob_id == second.blob_id
+    assert first.image_path == second.image_path
+    blob = await db.get(ImageBlobModel, first.blob_id)
+    assert Path(blob.path).stem == blob.content_hash
+    assert blob.path.startswith("images/")
+
+    await delete_image_from_memory(session=db, image_id=first.id)
+    assert media_storage.path(second.image_path).exists()
+
+    await delete_image_from_memory(session=db, image_id=second.id)
+    assert not media_storage.path(second.image_path).exists()
+    db.expunge(blob)
+    assert await db.get(ImageBlobModel, first.blob_id) is None
+
+
+async def test_save_image_restores_missing_blob_file(
+    db: AsyncSession,
+    image_bytes: bytes,
+):
+    first = await save_image(session=db, image=image_bytes)
+    media_storage.path(first.image_path).unlink()
+
+    second = await save_image(session=db, image=image_bytes)
+    assert media_storage.path(second.image_path).read_bytes() == image_bytes
+
+    await delete_image_from_memory(session=db, image_id=first.id)
+    await delete_image_from_memory(session=db, image_id=second.id)
 
 
-async def test_delete_image_from_memory(image_bytes: bytes):
-    path = await save_image(image_bytes)
-    with open(path, "rb") as f:
+async def test_delete_image_from_memory(db: AsyncSession, image_bytes: bytes):
+    image = await save_image(session=db, image=image_bytes)
+    with open(media_storage.path(image.image_path), "rb") as f:
         assert f.read()
-    await delete_image_from_memory(path=path)
+    await delete_image_from_memory(session=db, image_id=image.id)
+
+    assert not media_storage.path(image.image_path).exists()
+    with pytest.raises(ValueError):
+        await delete_image_from_memory(session=db, image_id=image.id)
+
+
+async def test_release_image_blobs_keeps_referenced_blob(
+    db: AsyncSession,
+    image: ImageModel,
+):
+    assert await release_image_blobs(db, [image.blob_id]) == 0
+    await db.commit()
+    assert media_storage.path(image.image_path).exists()
+
+    await delete_image_from_memory(session=db, image_id=image.id)
+
+
+async def test_save_image_in_thread_pool(
+    db: AsyncSession,
+    image_bytes: bytes,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    processor = ImageProcessor(executor_type="thread", max_workers=1, max_queue=1)
+    monkeypatch.setattr(medias_services, "image_processor", processor)
+
+    image = await save_image(session=db, image=image_bytes)
+    assert media_storage.path(image.image_path).stat().st_size > 0
+    with pytest.raises(TypeError):
+        await save_image(session=db, image=b"qwerty")
+
+    processor.shutdown()
+    await delete_image_from_memory(session=db, image_id=image.id)
+
+
+async def test_image_processor_back_pressure():
+    processor = ImageProcessor(executor_type="thread", max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    running = asyncio.create_task(processor.run(release.wait, 5))
+    await asyncio.sleep(0.05)
+    queued = asyncio.create_task(processor.run(sum, [1, 2]))
+    await asyncio.sleep(0)
+
+    assert processor.stats()["running"] == 1
+    assert processor.stats()["queued"] == 1
+    with pytest.raises(ProcessingQueueFull):
+        await processor.run(sum, [3])
+
+    release.set()
+    assert await running is True
+    assert await queued == 3
+    assert processor.stats()["rejected"] == 1
+    assert processor.stats()["running"] == processor.stats()["queued"] == 0
+    processor.shutdown()
+
+
+async def test_image_processor_keeps_slot_until_cancelled_task_finishes():
+    processor = ImageProcessor(executor_type="thread", max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    running = asyncio.create_task(processor.run(release.wait, 5))
+    await asyncio.sleep(0.05)
+    running.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await running
+
+    # Поток пула еще занят: место не освобождается до завершения задачи.
+    assert processor.stats()["running"] == 1
+    queued = asyncio.create_task(processor.run(sum, [1, 2]))
+    await asyncio.sleep(0.05)
+    assert processor.stats()["queued"] == 1
+
+    release.set()
+    assert await queued == 3
+    assert processor.stats()["running"] == processor.stats()["queued"] == 0
+    processor.shutdown()
+
+
+def _encode(image: Image.Image, image_format: str, **params) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **params)
+    return buffer.getvalue()
+
+
+async def test_encode_image_keeps_small_jpeg_unchanged(image_bytes: bytes):
+    encoded = encode_image(image_bytes, EncodingOptions())
+
+    assert encoded.suffix == ".jpg"
+    assert encoded.data == image_bytes
+    assert encoded.content_hash == hashlib.sha256(image_bytes).hexdigest()
+
+
+async def test_encode_image_strips_exif_and_applies_orientation():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: поворот на 90 градусов.
+    exif[0x010F] = "Camera"
+    image = _encode(Image.new("RGB", (300, 200)), "JPEG", exif=exif, comment=b"c")
+
+    encoded = encode_image(image, EncodingOptions())
+
+    saved = Image.open(io.BytesIO(encoded.data))
+    assert encoded.suffix == ".jpg"
+    assert saved.format == "JPEG"
+    assert saved.info.get("progressive")
+    assert saved.size == (200, 300)
+    assert not saved.getexif()
+    assert "comment" not in saved.info
+
+
+async def test_encode_image_downscales_and_converts():
+    image = _encode(Image.new("RGBA", (400, 100)), "PNG")
+    options = EncodingOptions(max_side=200)
+
+    encoded = encode_image(image, options)
+    saved = Image.open(io.BytesIO(encoded.data))
+    assert (encoded.suffix, saved.format, saved.size) == (".png", "PNG", (200, 50))
+
+    options = EncodingOptions(output_format="webp")
+    encoded = encode_image(image, options)
+    saved = Image.open(io.BytesIO(encoded.data))
+    assert (saved.format, saved.mode, saved.size) == ("WEBP", "RGBA", (400, 100))
+    assert encode_image(image, options) == encoded
+
+
+async def test_encode_image_rejects_truncated_image(image_bytes: bytes):
+    with pytest.raises(TypeError):
+        encode_image(image_bytes[: len(image_bytes) // 2], EncodingOptions())
+
+
+async def test_encode_image_strips_trailing_data(image_bytes: bytes):
+    encoded = encode_image(image_bytes + b"PK\x03\x04payload", EncodingOptions())
+
+    assert encoded.data.endswith(b"\xff\xd9")
+    assert b"payload" not in encoded.data
+
+
+async def test_encode_image_strips_png_text_chunks():
+    info = PngImagePlugin.PngInfo()
+    info.add_text("Comment", "secret")
+    info.add_itxt("Description", "secret")
+    image = _encode(Image.new("RGB", (100, 100)), "PNG", pnginfo=info)
+
+    encoded = encode_image(image, EncodingOptions())
+
+    assert b"secret" not in encoded.data
+    assert not Image.open(io.BytesIO(encoded.data)).text
+
+
+async def test_encode_image_keeps_alpha_in_webp():
+    image = _encode(Image.new("LA", (100, 100), (255, 0)), "PNG")
+
+    encoded = encode_image(image, EncodingOptions(output_format="webp"))
+
+    saved = Image.open(io.BytesIO(encoded.data))
+    assert saved.mode == "RGBA"
+    assert saved.getpixel((0, 0))[3] == 0
+
+
+async def test_encode_variant():
+    source = _encode(Image.new("RGB", (400, 100)), "PNG")
+
+    variant = encode_variant(source, 200, EncodingOptions())
+    saved = Image.open(io.BytesIO(variant.data))
+    assert (variant.suffix, saved.format, saved.size) == (".png", "PNG", (200, 50))
+    assert variant.content_hash == hashlib.sha256(variant.data).hexdigest()
+
+    assert encode_variant(source, 400, EncodingOptions()) is None
+
+
+async def test_create_image_variants(db: AsyncSession):
+    image = await save_image(
+        session=db, image=_encode(Image.new("RGB", (800, 400)), "JPEG")
+    )
+    image_id, path = image.id, image.image_path
+
+    variants = await create_image_variants(
+        session=db,
+        image_id=image_id,
+        image_path=path,
+        sizes=[150, 1000],
+    )
+    assert variants == {"150": path.replace(".jpg", "_150.jpg"), "1000": path}
+    assert Image.open(media_storage.path(variants["150"])).size == (150, 75)
+
+    await db.refresh(image)
+    assert image.variants == variants
+    assert get_image_variants(image) == {
+        "150": f"static/{variants['150']}",
+        "600": f"api/medias/{image_id}/variants/600",
+        "original": f"static/{path}",
+    }
+
+    await delete_image_from_memory(session=db, image_id=image_id)
+    assert not media_storage.path(variants["150"]).exists()
+
+
+async def test_get_image_variant_creates_missing_variant(db: AsyncSession):
+    image = await save_image(
+        session=db, image=_encode(Image.new("RGB", (800, 400)), "JPEG")
+    )
+    image_id = image.id
+
+    variant = await get_image_variant(session=db, image_id=image_id, size=600)
+    assert Image.open(media_storage.path(variant)).size == (600, 300)
+    assert await get_image_variant(session=db, image_id=image_id, size=600) == variant
+
+    with pytest.raises(ValueError):
+        await get_image_variant(session=db, image_id=image_id, size=601)
+    with pytest.raises(ValueError):
+        await get_image_variant(session=db, image_id=999999, size=600)
+
+    await delete_image_from_memory(session=db, image_id=image_id)
+
 
-    with pytest.raises(FileNotFoundError):
-        await delete_image_from_memory(path=path)
+async def test_concurrent_variant_requests_encode_once(
+    db: AsyncSession,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    image = await save_image(
+        session=db, image=_encode(Image.new("RGB", (800, 400)), "JPEG")
+    )
+    image_id = image.id
+    # Без очереди: вторая одновременная задача кодирования была бы отклонена.
+    processor = ImageProcessor(executor_type="thread", max_workers=1, max_queue=0)
+    monkeypatch.setattr(medias_services, "image_processor", processor)
 
+    async def request_variant() -> str:
+        async with db_helper.session_factory() as session:
+            return await get_image_variant(session=session, image_id=image_id, size=600)
 
-async def test_get_images_obj_from_ids(db: AsyncSession, image: ImageModel):
-    gotten_image = await get_images_obj_from_ids(session=db, image_ids=[image.id])
-    assert image.image_path == gotten_image[0].image_path
-    await delete_image_from_memory(path=image.image_path)
+    variants = await asyncio.gather(*(request_variant() for _ in range(5)))
 
+    assert len(set(variants)) == 1
+    assert processor.stats()["rejected"] == 0
+    processor.shutdown()
+    await delete_image_from_memory(session=db, image_id=image_id)
 
-async def test_add_image_path_to_db(db: AsyncSession, image_bytes: bytes):
-    path = await save_image(image_bytes)
-    image_id = await add_image_path_to_db(session=db, photo_path=path)
-    image = await get_image(session=db, image_id=image_id)
 
-    assert image.image_path == path
-    await delete_image_from_memory(path=path)
+def test_get_source_key():
+    key = "images/abc.jpg"
+    assert get_variant_key(key, 150) == "images/abc_150.jpg"
+    assert get_source_key(get_variant_key(key, 150)) == key
+    assert get_source_key(key) == key
+    assert get_source_key("images/2024_abc-def_x.png") == "images/2024_abc-def_x.png"
@@ -0,0 +1,82 @@
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+from httpx import AsyncClient
+
+from backend.models import UserModel
+from backend.services import security
+from backend.services.security import ApiKeyCache, api_key_cache
+from backend.tests.conftest import StatementRecorder
+
+
+async def test_api_key_cache_expires_entries(monkeypatch: pytest.MonkeyPatch):
+    now = 100.0
+    monkeypatch.setattr(security, "time", SimpleNamespace(monotonic=lambda: now))
+    cache = ApiKeyCache(max_size=10, ttl=60, negative_ttl=5)
+
+    cache.set("valid", 1)
+    cache.set("invalid", None)
+    assert cache.get("valid") == 1
+    assert cache.get("invalid") is None
+
+    now = 110.0
+    assert cache.get("valid") == 1
+    assert cache.get("invalid") is security._MISSING
+
+    now = 170.0
+    assert cache.get("valid") is security._MISSING
+    assert cache.stats() == {"size": 0, "max_size": 10, "hits": 3, "misses": 2}
+
+
+async def test_api_key_cache_evicts_least_recently_used():
+    cache = ApiKeyCache(max_size=2, ttl=60, negative_ttl=60)
+    cache.set("first", 1)
+    cache.set("second", 2)
+    cache.get("first")
+    cache.set("third", 3)
+
+    assert cache.get("second") is security._MISSING
+    assert cache.get("first") == 1
+    assert cache.get("third") == 3
+
+    cache.invalidate("first")
+    assert cache.get("first") is security._MISSING
+
+
+async def test_api_key_cache_disabled():
+    cache = ApiKeyCache(max_size=0, ttl=60, negative_ttl=60)
+    cache.set("key", 1)
+    assert cache.get("key") is security._MISSING
+
+
+async def test_authentication_uses_cache(
+    client: AsyncClient,
+    user: UserModel,
+    sql_statements: StatementRecorder,
+):
+    api_key_cache.invalidate(user.api_key)
+    unknown_key = str(uuid4())
+
+    for _ in range(2):
+        response = await client.get(f"/users/{user.id}")
+        assert response.status_code == 200
+        response = await client.get("/tweets", headers={"api-key": unknown_key})
+        assert response.status_code == 403
+
+    auth_queries = [
+        statement
+        for statement, _ in sql_statements.statements
+        if "WHERE users.api_key" in statement
+    ]
+    assert len(auth_queries) == 2
+
+    response = await client.get("http://127.0.0.1:5000/stats")
+    assert response.json()["api_key_cache"]["hits"] >= 3
+
+
+async def test_test_user_shortcut_is_not_cached(client: AsyncClient):
+    response = await client.get("/users/me", headers={"api-key": "test"})
+    assert response.status_code == 200
+    assert response.json()["user"]["name"] == "test"
+    assert api_key_cache.get("test") is security._MISSING
@@ -0,0 +1,82 @@
+from pathlib import Path
+
+import pytest
+
+from backend.services.storage import LocalStorage, S3Storage
+
+
+async def test_local_storage(tmp_path: Path):
+    storage = LocalStorage(root=tmp_path, url_prefix="static/")
+    key = "images/abc.jpg"
+
+    assert not await storage.exists(key)
+    await storage.save(key, b"data")
+    assert await storage.exists(key)
+    assert await storage.load(key) == b"data"
+    assert (tmp_path / key).read_bytes() == b"data"
+    assert storage.url(key) == "static/images/abc.jpg"
+
+    await storage.save("images/nested/def.jpg", b"nested")
+    pages = [page async for page in storage.list_files("images/", page_size=1)]
+    assert [len(page) for page in pages] == [1, 1]
+    files = sorted((file for page in pages for file in page), key=lambda f: f.key)
+    assert [(file.key, file.size) for file in files] == [
+        (key, 4),
+        ("images/nested/def.jpg", 6),
+    ]
+    assert [page async for page in storage.list_files("missing/", 10)] == []
+
+    await storage.delete([key, "images/missing.jpg"])
+    assert not await storage.exists(key)
+    with pytest.raises(FileNotFoundError):
+        await storage.load(key)
+
+
+async def test_s3_storage():
+    moto = pytest.importorskip("moto")
+    import boto3
+
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket="media")
+        storage = S3Storage(
+            bucket="media", url_prefix="https://cdn.test/", client=client
+        )
+        keys = [f"images/{num}.png" for num in range(3)]
+
+        assert not await storage.exists(keys[0])
+        for key in keys:
+            await storage.save(key, b"data")
+        assert await storage.exists(keys[0])
+        assert await storage.load(keys[0]) == b"data"
+        head = client.head_object(Bucket="media", Key=keys[0])
+        assert head["ContentType"] == "image/png"
+        assert storage.url(keys[0]) == "https://cdn.test/images/0.png"
+        pages = [page async for page in storage.list_files("images/", page_size=2)]
+        assert [[file.key for file in page] for page in pages] == [keys[:2], keys[2:]]
+        assert pages[0][0].size == 4
+
+        await storage.delete(keys + ["images/missing.png"])
+        assert not await storage.exists(keys[0])
+        with pytest.raises(FileNotFoundError):
+            await storage.load(keys[0])
+
+
+async def test_s3_storage_delete_raises_on_errors():
+    pytest.importorskip("boto3")
+
+    class Client:
+        def delete_objects(self, Bucket, Delete):  # noqa: N803
+            return {
+                "Errors": [
+                    {"Key": obj["Key"], "Code": "AccessDenied", "Message": "Denied"}
+                    for obj in Delete["Objects"]
+                    if obj["Key"].endswith(".png")
+                ]
+            }
+
+    storage = S3Storage(bucket="media", url_prefix="", client=Client())
+
+    await storage.delete(["images/0.jpg"])
+    with pytest.raises(OSError, match="1 objects.*images/1.png.*AccessDenied"):
+        await storage.delete(["images/0.jpg", "images/1.png"])
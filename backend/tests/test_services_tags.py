@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models import HashtagModel, TweetHashtagModel, UserModel
+from backend.models.db_helper import db_helper
+from backend.models.users import make_user_handle
+from backend.schemas import CreateTweetSchema
+from backend.services.tags_services import (
+    backfill_tweet_entities,
+    decode_tweet_id_cursor,
+    encode_tweet_id_cursor,
+    get_mentions_tweets_db,
+    get_tweets_by_tag_db,
+    parse_tweet_entities,
+)
+from backend.services.tweets_services import create_tweet_db, delete_tweet_db
+from backend.tests.factories import TweetFactory, UserFactory
+
+
+def test_parse_tweet_entities():
+    tags, handles = parse_tweet_entities(
+        "#Python и #python, email@example.com, @Ivan_Petrov!"
+        f" #{'a' * 101} a#b #Тег @ivan_petrov"
+    )
+    assert tags == ["python", "тег"]
+    assert handles == ["ivan_petrov"]
+    assert parse_tweet_entities("no entities") == ([], [])
+
+
+async def _create_tweet(db: AsyncSession, user_id: int, text: str) -> int:
+    return await create_tweet_db(
+        session=db, user_id=user_id, tweet_data=CreateTweetSchema(tweet_data=text)
+    )
+
+
+async def test_get_tweets_by_tag_db(db: AsyncSession, user: UserModel):
+    tweet_ids = [
+        await _create_tweet(db, user.id, text)
+        for text in ("#Numbat first", "second #numbat #numbat", "no tag numbat")
+    ]
+
+    tweets = await get_tweets_by_tag_db(session=db, tag="#NUMBAT", limit=1)
+    assert [tweet.id for tweet in tweets] == [tweet_ids[1]]
+    tweets = await get_tweets_by_tag_db(
+        session=db, tag="numbat", limit=10, cursor=tweets[-1].id
+    )
+    assert [tweet.id for tweet in tweets] == [tweet_ids[0]]
+    assert tweets[0].author.id == user.id
+
+    await delete_tweet_db(session=db, tweet_id=tweet_ids[0], author_id=user.id)
+    tweets = await get_tweets_by_tag_db(session=db, tag="numbat", limit=10)
+    assert [tweet.id for tweet in tweets] == [tweet_ids[1]]
+
+
+async def test_get_mentions_tweets_db(db: AsyncSession, user: UserModel):
+    mentioned = await UserFactory(first_name="Quenda", last_name="Bandicoot")
+    namesake = await UserFactory(first_name="Quenda", last_name="Bandicoot")
+    other = await UserFactory(first_name="Quenda", last_name="Other")
+    handle = mentioned.handle
+    assert handle == "quendabandicoot"
+
+    first_id = await _create_tweet(db, user.id, "hi @QuendaBandicoot")
+    second_id = await _create_tweet(db, user.id, f"@{handle} @{handle} @nobody")
+
+    for user_id in (mentioned.id, namesake.id):
+        tweets = await get_mentions_tweets_db(session=db, user_id=user_id, limit=10)
+        assert [tweet.id for tweet in tweets] == [second_id, first_id]
+    tweets = await get_mentions_tweets_db(
+        session=db, user_id=mentioned.id, limit=10, cursor=second_id
+    )
+    assert [tweet.id for tweet in tweets] == [first_id]
+    assert await get_mentions_tweets_db(session=db, user_id=other.id, limit=10) == []
+
+
+async def test_mention_with_non_ascii_name(db: AsyncSession, user: UserModel):
+    mentioned = await UserFactory(first_name="Иван", last_name="Иванов")
+    assert mentioned.handle == make_user_handle("Иван", "Иванов") == "иваниванов"
+
+    first_id = await _create_tweet(db, user.id, "привет @ИванИванов")
+    second_id = await _create_tweet(db, user.id, "@иваниванов, @ИВАНИВАНОВ")
+
+    tweets = await get_mentions_tweets_db(session=db, user_id=mentioned.id, limit=10)
+    assert [tweet.id for tweet in tweets] == [second_id, first_id]
+
+
+async def test_backfill_tweet_entities(db: AsyncSession, user: UserModel):
+    # Фабрика вставляет твиты напрямую, минуя create_tweet_db.
+    tweets = [
+        await TweetFactory(author=user, tweet_data=f"#backfill {num}")
+        for num in range(3)
+    ]
+    assert await get_tweets_by_tag_db(session=db, tag="backfill", limit=10) == []
+
+    last_id = tweets[0].id - 1
+    for _ in range(2):
+        last_id = await backfill_tweet_entities(
+            session=db, batch_size=2, after_id=last_id
+        )
+    assert last_id >= tweets[2].id
+
+    found = await get_tweets_by_tag_db(session=db, tag="backfill", limit=10)
+    assert [tweet.id for tweet in found] == [tweet.id for tweet in reversed(tweets)]
+
+    # Повторная индексация не создает дублей.
+    await backfill_tweet_entities(session=db, batch_size=3, after_id=tweets[0].id - 1)
+    count = await db.scalar(
+        select(func.count())
+        .select_from(TweetHashtagModel)
+        .join(HashtagModel)
+        .where(HashtagModel.name == "backfill")
+    )
+    assert count == 3
+
+
+async def test_create_tweets_with_new_tag_concurrently(user: UserModel):
+    async def create(num: int) -> int:
+        async with db_helper.session_factory() as session:
+            return await _create_tweet(session, user.id, f"#Concurrent{num % 2} #Wave")
+
+    tweet_ids = await asyncio.gather(*(create(num) for num in range(10)))
+
+    async with db_helper.session_factory() as session:
+        tweets = await get_tweets_by_tag_db(session=session, tag="wave", limit=20)
+        assert sorted(tweet.id for tweet in tweets) == sorted(tweet_ids)
+        names = await session.scalars(
+            select(HashtagModel.name).where(HashtagModel.name.like("concurrent%"))
+        )
+        assert sorted(names) == ["concurrent0", "concurrent1"]
+
+
+def test_tweet_id_cursor():
+    class Tweet:
+        id = 42
+
+    assert decode_tweet_id_cursor(encode_tweet_id_cursor(Tweet())) == 42
+    with pytest.raises(ValueError):
+        decode_tweet_id_cursor("not a cursor")
@@ -1,24 +1,39 @@
+import asyncio
+
 import pytest
-from sqlalchemy import select
+from sqlalchemy import delete, func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from backend.models import TweetModel, UserModel
+from backend.config import settings
+from backend.models import HomeTimelineModel, ImageModel, TweetModel, UserModel
+from backend.models.db_helper import db_helper
 from backend.schemas import CreateTweetSchema, TweetSchema, UserSchema
 from backend.services.other_services import (
     get_full_name,
     get_tweet,
     get_user_with_following,
-    get_user_with_liked_tweets,
+    get_user_with_following_and_liked_tweets,
+)
+from backend.services.timeline_services import (
+    rebuild_home_timeline,
+    sync_timeline_likes,
 )
 from backend.services.tweets_services import (
     add_like_to_tweet_db,
     create_tweet_db,
+    decode_search_cursor,
     delete_tweet_db,
+    encode_search_cursor,
+    find_likes_count_drift,
+    find_timeline_likes_drift,
     get_tweet_feed_db,
     remove_like_from_tweet_db,
+    repair_likes_count,
+    search_tweets_db,
     serialize_tweets,
 )
-from backend.tests.factories import TweetFactory, generate_data
+from backend.services.users_services import add_follow_user_db
+from backend.tests.factories import TweetFactory, UserFactory, generate_data
 
 
 async def test_create_tweet(db: AsyncSession, user: UserModel):
@@ -52,11 +67,71 @@ async def test_create_tweet_db(db: AsyncSession, user: UserModel):
     assert res_tweet.tweet_data == tweet_data
 
 
+async def test_create_tweet_db_attaches_images(
+    db: AsyncSession,
+    user: UserModel,
+    image: ImageModel,
+):
+    tweet_data = CreateTweetSchema(tweet_data="test", tweet_media_ids=[image.id])
+    tweet_id = await create_tweet_db(session=db, user_id=user.id, tweet_data=tweet_data)
+
+    res_tweet = await get_tweet(db, tweet_id)
+    assert [attached.id for attached in res_tweet.images] == [image.id]
+
+    with pytest.raises(ValueError, match="Image used in more than one tweet"):
+        await create_tweet_db(session=db, user_id=user.id, tweet_data=tweet_data)
+    with pytest.raises(ValueError, match="Image not found"):
+        await create_tweet_db(
+            session=db,
+            user_id=user.id,
+            tweet_data=CreateTweetSchema(tweet_data="test", tweet_media_ids=[999999]),
+        )
+    assert (
+        await db.scalar(
+            select(func.count(TweetModel.id)).where(TweetModel.author_id == user.id)
+        )
+        == 1
+    )
+
+
+async def test_concurrent_tweets_attach_image_once(user: UserModel, image: ImageModel):
+    tweet_data = CreateTweetSchema(tweet_data="test", tweet_media_ids=[image.id])
+
+    async def create_tweet() -> int | None:
+        async with db_helper.session_factory() as session:
+            try:
+                return await create_tweet_db(session, user.id, tweet_data)
+            except ValueError as exc:
+                assert str(exc) == "Image used in more than one tweet"
+                return None
+
+    results = await asyncio.gather(*(create_tweet() for _ in range(10)))
+
+    tweet_ids = [tweet_id for tweet_id in results if tweet_id is not None]
+    assert len(tweet_ids) == 1
+    async with db_helper.session_factory() as session:
+        attached = await session.get(ImageModel, image.id)
+        assert attached.tweet_id == tweet_ids[0]
+        tweets_count = await session.scalar(
+            select(func.count(TweetModel.id)).where(TweetModel.author_id == user.id)
+        )
+        assert tweets_count == 1
+
+
 async def test_delete_tweet_db(db: AsyncSession, tweet: TweetModel):
-    await delete_tweet_db(session=db, tweet_id=tweet.id)
+    other: UserModel = await UserFactory()
+    with pytest.raises(PermissionError):
+        await delete_tweet_db(session=db, tweet_id=tweet.id, author_id=other.id)
+
+    blob_ids = await delete_tweet_db(
+        session=db, tweet_id=tweet.id, author_id=tweet.author_id
+    )
+    assert blob_ids == []
 
     with pytest.raises(ValueError):
         await get_tweet(db, tweet.id)
+    with pytest.raises(ValueError):
+        await delete_tweet_db(session=db, tweet_id=tweet.id, author_id=tweet.author_id)
 
 
 async def test_add_like_to_tweet_db(
@@ -66,7 +141,7 @@ async def test_add_like_to_tweet_db(
 ):
     await add_like_to_tweet_db(session=db, user_id=user.id, tweet_id=tweet.id)
 
-    user = await get_user_with_liked_tweets(db, user.id)
+    user = await get_user_with_following_and_liked_tweets(db, user.id)
     res_tweet = await get_tweet(db, tweet.id)
 
     assert user in res_tweet.liked_by
@@ -83,19 +158,44 @@ async def test_remove_like_from_tweet_db(
     assert tweet.count_likes == 0
     await add_like_to_tweet_db(session=db, user_id=user.id, tweet_id=tweet.id)
 
+    await db.refresh(tweet)
     assert tweet.count_likes == 1
     await remove_like_from_tweet_db(session=db, user_id=user.id, tweet_id=tweet.id)
 
+    await db.refresh(tweet)
     assert tweet.count_likes == 0
 
 
+async def test_add_like_to_tweet_db_is_idempotent(db: AsyncSession, tweet: TweetModel):
+    user: UserModel = await UserFactory()
+    await add_like_to_tweet_db(session=db, user_id=user.id, tweet_id=tweet.id)
+    await add_like_to_tweet_db(session=db, user_id=user.id, tweet_id=tweet.id)
+
+    res_tweet = await get_tweet(db, tweet.id)
+    await db.refresh(res_tweet)
+    assert res_tweet.likes_count == 1
+
+
+async def test_like_non_existent_tweet(db: AsyncSession, user: UserModel):
+    with pytest.raises(ValueError, match="Tweet not found"):
+        await add_like_to_tweet_db(session=db, user_id=user.id, tweet_id=999999)
+
+    with pytest.raises(ValueError, match="Tweet not found"):
+        await remove_like_from_tweet_db(session=db, user_id=user.id, tweet_id=999999)
+
+
+async def test_remove_not_liked_tweet(db: AsyncSession, user: UserModel, tweet):
+    with pytest.raises(ValueError, match="not in the list of liked tweets"):
+        await remove_like_from_tweet_db(session=db, user_id=user.id, tweet_id=tweet.id)
+
+
 async def test_get_tweet_feed_db(db: AsyncSession):
     users = await generate_data(db, count_users=3, count_tweets=5)
     user = await get_user_with_following(db, users[0].id)
 
     tweet_feed = await get_tweet_feed_db(session=db, user_id=user.id)
 
-    for tweet in tweet_feed:
+    for tweet, _ in tweet_feed:
         assert tweet.author in user.following
 
 
@@ -129,3 +229,211 @@ async def test_serialize_tweets(db: AsyncSession):
 
     assert len(serialized_tweets) == 2
     assert serialized_tweets == expected_data
+
+
+async def test_create_tweet_db_fans_out_to_followers(db: AsyncSession):
+    author: UserModel = await UserFactory()
+    follower: UserModel = await UserFactory()
+    await add_follow_user_db(db, follower.id, author.id)
+
+    tweet_id = await create_tweet_db(
+        session=db,
+        user_id=author.id,
+        tweet_data=CreateTweetSchema(tweet_data="fan out"),
+    )
+
+    tweet_feed = await get_tweet_feed_db(session=db, user_id=follower.id)
+    assert [tweet.id for tweet, _ in tweet_feed] == [tweet_id]
+
+
+async def test_delete_tweet_db_prunes_timeline(db: AsyncSession):
+    author: UserModel = await UserFactory()
+    follower: UserModel = await UserFactory()
+    await add_follow_user_db(db, follower.id, author.id)
+    tweet_id = await create_tweet_db(
+        session=db,
+        user_id=author.id,
+        tweet_data=CreateTweetSchema(tweet_data="to delete"),
+    )
+
+    await delete_tweet_db(session=db, tweet_id=tweet_id, author_id=author.id)
+
+    assert await get_tweet_feed_db(session=db, user_id=follower.id) == []
+
+
+async def test_rebuild_home_timeline(db: AsyncSession):
+    users = await generate_data(db, count_users=3, count_tweets=2)
+    user = await get_user_with_following(db, users[0].id)
+    await db.execute(
+        delete(HomeTimelineModel).where(HomeTimelineModel.user_id == user.id)
+    )
+    await db.commit()
+
+    await rebuild_home_timeline(session=db, user_ids=[user.id])
+
+    tweet_feed = await get_tweet_feed_db(session=db, user_id=user.id)
+    assert len(tweet_feed) == 2 * len(user.following)
+
+
+@pytest.mark.parametrize("feed_source", ["timeline", "subscriptions"])
+async def test_get_tweet_feed_db_orders_by_likes_and_limits(
+    db: AsyncSession,
+    monkeypatch: pytest.MonkeyPatch,
+    feed_source: str,
+):
+    monkeypatch.setattr(settings, "feed_source", feed_source)
+    author: UserModel = await UserFactory()
+    reader: UserModel = await UserFactory()
+    await add_follow_user_db(db, reader.id, author.id)
+    tweets = [await TweetFactory(author=author) for _ in range(3)]
+    await rebuild_home_timeline(session=db, user_ids=[reader.id])
+
+    await add_like_to_tweet_db(session=db, user_id=reader.id, tweet_id=tweets[1].id)
+    await sync_timeline_likes(session=db, batch_size=100)
+
+    tweet_feed = await get_tweet_feed_db(session=db, user_id=reader.id, limit=2)
+
+    assert [tweet.id for tweet, _ in tweet_feed] == [tweets[1].id, tweets[2].id]
+
+
+async def test_sync_timeline_likes(db: AsyncSession):
+    author: UserModel = await UserFactory()
+    readers: list[UserModel] = [await UserFactory() for _ in range(2)]
+    for reader in readers:
+        await add_follow_user_db(db, reader.id, author.id)
+    tweet = await TweetFactory(author=author)
+    await rebuild_home_timeline(session=db, user_ids=[reader.id for reader in readers])
+    timeline_likes = select(HomeTimelineModel.likes_count).where(
+        HomeTimelineModel.tweet_id == tweet.id
+    )
+
+    for reader in readers:
+        await add_like_to_tweet_db(session=db, user_id=reader.id, tweet_id=tweet.id)
+    # Лайк не меняет копии в лентах подписчиков.
+    assert (await db.scalars(timeline_likes)).all() == [0, 0]
+
+    assert await sync_timeline_likes(session=db, batch_size=1) >= 1
+    assert (await db.scalars(timeline_likes)).all() == [2, 2]
+    assert tweet.id not in await find_timeline_likes_drift(db)
+
+    await remove_like_from_tweet_db(
+        session=db, user_id=readers[0].id, tweet_id=tweet.id
+    )
+    await sync_timeline_likes(session=db, batch_size=100)
+    assert (await db.scalars(timeline_likes)).all() == [1, 1]
+
+
+@pytest.mark.parametrize("feed_source", ["timeline", "subscriptions"])
+async def test_get_tweet_feed_db_cursor_skips_tweets_that_gained_likes(
+    db: AsyncSession,
+    monkeypatch: pytest.MonkeyPatch,
+    feed_source: str,
+):
+    # Курсор не фиксирует снимок ленты: см. get_tweet_feed_db.
+    monkeypatch.setattr(settings, "feed_source", feed_source)
+    author: UserModel = await UserFactory()
+    reader: UserModel = await UserFactory()
+    await add_follow_user_db(db, reader.id, author.id)
+    tweets = [await TweetFactory(author=author) for _ in range(3)]
+    await rebuild_home_timeline(session=db, user_ids=[reader.id])
+
+    first_page = await get_tweet_feed_db(session=db, user_id=reader.id, limit=1)
+    assert [tweet.id for tweet, _ in first_page] == [tweets[2].id]
+    await add_like_to_tweet_db(session=db, user_id=reader.id, tweet_id=tweets[0].id)
+    await sync_timeline_likes(session=db, batch_size=100)
+
+    first_tweet, first_likes = first_page[0]
+    cursor = (first_likes, first_tweet.id)
+    next_page = await get_tweet_feed_db(
+        session=db, user_id=reader.id, limit=10, cursor=cursor
+    )
+    assert [tweet.id for tweet, _ in next_page] == [tweets[1].id]
+
+
+async def test_concurrent_likes_keep_likes_count(tweet: TweetModel):
+    users = [await UserFactory() for _ in range(10)]
+
+    async def like(user_id: int) -> None:
+        async with db_helper.session_factory() as session:
+            await add_like_to_tweet_db(session, user_id=user_id, tweet_id=tweet.id)
+
+    await asyncio.gather(*(like(user.id) for user in users))
+
+    async with db_helper.session_factory() as session:
+        res_tweet = await get_tweet(session, tweet.id)
+        assert res_tweet.likes_count == len(users)
+
+
+async def test_find_and_repair_likes_count_drift(db: AsyncSession, tweet: TweetModel):
+    await db.execute(
+        update(TweetModel).where(TweetModel.id == tweet.id).values(likes_count=5),
+    )
+    await db.commit()
+
+    drift = await find_likes_count_drift(db)
+    assert (tweet.id, 5, 0) in drift
+
+    await repair_likes_count(db, tweet_ids=[tweet.id])
+
+    assert tweet.id not in [
+        tweet_id for tweet_id, *_ in await find_likes_count_drift(db)
+    ]
+
+
+async def test_find_and_repair_timeline_likes_drift(db: AsyncSession):
+    author: UserModel = await UserFactory()
+    reader: UserModel = await UserFactory()
+    await add_follow_user_db(db, reader.id, author.id)
+    tweet = await TweetFactory(author=author)
+    await rebuild_home_timeline(session=db, user_ids=[reader.id])
+    await db.execute(
+        update(HomeTimelineModel)
+        .where(HomeTimelineModel.tweet_id == tweet.id)
+        .values(likes_count=3)
+    )
+    await db.commit()
+
+    assert tweet.id in await find_timeline_likes_drift(db)
+
+    await repair_likes_count(db, tweet_ids=[tweet.id])
+
+    assert tweet.id not in await find_timeline_likes_drift(db)
+
+
+async def test_search_tweets_db(db: AsyncSession, user: UserModel):
+    texts = [
+        "quokka",
+        "quokka quokka island",
+        "island only",
+        "quokka on the island",
+    ]
+    tweet_ids = [
+        await create_tweet_db(
+            session=db, user_id=user.id, tweet_data=CreateTweetSchema(tweet_data=text)
+        )
+        for text in texts
+    ]
+
+    found = await search_tweets_db(session=db, query="Quokka", limit=10)
+    assert [tweet.id for tweet, _ in found] == [
+        tweet_ids[1],
+        tweet_ids[3],
+        tweet_ids[0],
+    ]
+    assert [rank for _, rank in found] == sorted(
+        (rank for _, rank in found), reverse=True
+    )
+
+    first_page = await search_tweets_db(session=db, query="quokka", limit=2)
+    tweet, rank = first_page[-1]
+    cursor = decode_search_cursor(encode_search_cursor(tweet, rank))
+    next_page = await search_tweets_db(
+        session=db, query="quokka", limit=2, cursor=cursor
+    )
+    assert [tweet.id for tweet, _ in first_page + next_page] == [
+        tweet.id for tweet, _ in found
+    ]
+
+    found = await search_tweets_db(session=db, query='"quokka on" -only', limit=10)
+    assert [tweet.id for tweet, _ in found] == [tweet_ids[3]]
+    assert await search_tweets_db(session=db, query="!!!", limit=10) == []
@@ -1,16 +1,21 @@
+import asyncio
+
 import pytest
 from sqlalchemy import select
 from sqlalchemy.exc import MissingGreenlet
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from backend.models.db_helper import db_helper
 from backend.models.users import UserModel
+from backend.schemas import CreateTweetSchema
 from backend.services.other_services import (
     get_user,
     get_user_with_following,
     get_user_with_following_and_followers,
 )
+from backend.services.tweets_services import create_tweet_db, get_tweet_feed_db
 from backend.services.users_services import add_follow_user_db, delete_follow_user_db
-from backend.tests.factories import UserFactory
+from backend.tests.factories import TweetFactory, UserFactory
 
 
 async def test_create_user(db: AsyncSession):
@@ -87,4 +92,86 @@ async def test_delete_follow_user_db(db: AsyncSession):
 
     assert user2 in user1.following
     await delete_follow_user_db(db, user1.id, user2.id)
+    await db.refresh(user1, ["following"])
     assert user2 not in user1.following
+
+
+async def test_add_follow_user_db_is_idempotent(db: AsyncSession):
+    user1: UserModel = await UserFactory()
+    user2 = await UserFactory()
+
+    await add_follow_user_db(db, user1.id, user2.id)
+    await add_follow_user_db(db, user1.id, user2.id)
+    user1 = await get_user_with_following(db, user1.id)
+
+    assert [user.id for user in user1.following] == [user2.id]
+
+
+async def test_follow_non_existent_user(db: AsyncSession, user: UserModel):
+    with pytest.raises(ValueError, match="User not found"):
+        await add_follow_user_db(db, user.id, 999999)
+
+    with pytest.raises(ValueError, match="User not found"):
+        await delete_follow_user_db(db, user.id, 999999)
+
+
+async def test_delete_missing_subscription(db: AsyncSession, user: UserModel):
+    user2 = await UserFactory()
+
+    with pytest.raises(ValueError, match="No user subscription"):
+        await delete_follow_user_db(db, user.id, user2.id)
+
+
+async def test_follow_and_unfollow_update_timeline(db: AsyncSession):
+    user1: UserModel = await UserFactory()
+    user2: UserModel = await UserFactory()
+    tweet = await TweetFactory(author=user2)
+
+    await add_follow_user_db(db, user1.id, user2.id)
+    tweet_feed = await get_tweet_feed_db(session=db, user_id=user1.id)
+    assert [feed_tweet.id for feed_tweet, _ in tweet_feed] == [tweet.id]
+
+    await delete_follow_user_db(db, user1.id, user2.id)
+    assert await get_tweet_feed_db(session=db, user_id=user1.id) == []
+
+
+async def _create_tweet(author_id: int) -> int:
+    async with db_helper.session_factory() as session:
+        return await create_tweet_db(
+            session=session,
+            user_id=author_id,
+            tweet_data=CreateTweetSchema(tweet_data="race"),
+        )
+
+
+async def _change_follow(user_id: int, author_id: int, follow: bool) -> None:
+    async with db_helper.session_factory() as session:
+        if follow:
+            await add_follow_user_db(session, user_id, author_id)
+        else:
+            await delete_follow_user_db(session, user_id, author_id)
+
+
+async def _race_tweet_with_follow(author: UserModel, follow: bool) -> None:
+    """Твит автора одновременно с подпиской или отпиской нового читателя."""
+    for _ in range(20):
+        reader: UserModel = await UserFactory()
+        if not follow:
+            await _change_follow(reader.id, author.id, follow=True)
+
+        tweet_id, _ = await asyncio.gather(
+            _create_tweet(author.id),
+            _change_follow(reader.id, author.id, follow),
+        )
+
+        async with db_helper.session_factory() as session:
+            tweet_feed = await get_tweet_feed_db(session=session, user_id=reader.id)
+        assert (tweet_id in [tweet.id for tweet, _ in tweet_feed]) is follow
+
+
+async def test_follow_concurrent_with_tweet_keeps_timeline(user: UserModel):
+    await _race_tweet_with_follow(author=user, follow=True)
+
+
+async def test_unfollow_concurrent_with_tweet_prunes_timeline(user: UserModel):
+    await _race_tweet_with_follow(author=user, follow=False)
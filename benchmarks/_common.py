@@ -0,0 +1,77 @@
+"""
+Общие утилиты для бенчмарков.
+
+Бенчмарки пересоздают схему БД, поэтому запускаются только на отдельной базе:
+`MODE=BENCH DB_NAME=bench_db python -m benchmarks.<имя_бенчмарка>`.
+"""
+import statistics
+import time
+from typing import Awaitable, Callable
+
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from backend.config import settings
+from backend.models.base import Base
+from backend.models.db_helper import db_helper
+from backend.models.users import UserModel
+
+
+class QueryCounter:
+    """Счетчик SQL-запросов, выполненных через engine."""
+
+    def __init__(self, engine: AsyncEngine):
+        """Инициализируется engine, запросы которого нужно считать."""
+        self.engine = engine.sync_engine
+        self.count = 0
+
+    def __enter__(self) -> "QueryCounter":
+        """Начало подсчета запросов."""
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Окончание подсчета запросов."""
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args, **kwargs) -> None:
+        self.count += 1
+
+
+async def measure(
+    run: Callable[[], Awaitable[object]],
+    repeat: int = 5,
+) -> tuple[float, int]:
+    """Медианное время одного прогона в мс и число SQL-запросов за прогон."""
+    timings = []
+    with QueryCounter(db_helper.engine) as counter:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            await run()
+            timings.append((time.perf_counter() - start) * 1000)
+
+    return statistics.median(timings), counter.count // repeat
+
+
+async def prepare_db() -> None:
+    """Пересоздание схемы БД для бенчмарка."""
+    assert settings.mode == "BENCH", "Benchmarks must run with MODE=BENCH"
+
+    async with db_helper.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def create_users(count: int) -> list[int]:
+    """Массовое создание пользователей, возвращает их id."""
+    rows = [
+        {"first_name": "Bench", "last_name": f"User{num}", "email": "b@e.ch"}
+        for num in range(count)
+    ]
+    async with db_helper.session_factory() as session:
+        user_ids = await session.scalars(
+            insert(UserModel).returning(UserModel.id),
+            rows,
+        )
+        await session.commit()
+        return list(user_ids.all())
@@ -0,0 +1,140 @@
+"""
+Бенчмарк кодирования загруженных изображений: время CPU и размер файлов.
+
+Сравнивает прежнее сохранение в PNG с optimize=True и кодирование с учетом
+формата (исходный формат и WebP) на наборе изображений. По умолчанию набор
+генерируется: фото с EXIF, небольшое фото, скриншот и логотип с прозрачностью.
+Можно передать директорию со своими изображениями.
+БД не используется: `python -m benchmarks.bench_encoding [директория]`.
+"""
+import io
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+from PIL import Image, ImageDraw
+
+from backend.services.image_processing import (
+    EncodedImage,
+    EncodingOptions,
+    encode_image,
+)
+
+
+def legacy_encode(image: bytes, file_stem: str) -> str:
+    """Сохранение в PNG с optimize=True, как до кодирования с учетом формата."""
+    Image.open(io.BytesIO(image)).save(
+        f"{file_stem}.png",
+        optimize=True,
+        quality=80,
+        format="PNG",
+    )
+    return ".png"
+
+
+def write_encoded(encoded: EncodedImage, file_stem: str) -> str:
+    """Запись закодированного изображения на диск, как при загрузке."""
+    Path(f"{file_stem}{encoded.suffix}").write_bytes(encoded.data)
+    return encoded.suffix
+
+
+def _save(image: Image.Image, image_format: str, **params) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **params)
+    return buffer.getvalue()
+
+
+def make_photo(size: tuple[int, int]) -> Image.Image:
+    """Изображение, похожее на фотографию: плавный градиент с шумом."""
+    gradient = Image.linear_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 40)
+    return Image.merge("RGB", (gradient, noise, gradient.rotate(90).resize(size)))
+
+
+def make_corpus() -> dict[str, bytes]:
+    """Генерация набора изображений."""
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    exif[0x010F] = "Bench Camera"
+
+    screenshot = Image.new("RGB", (1920, 1080), "white")
+    draw = ImageDraw.Draw(screenshot)
+    for row in range(0, 1080, 40):
+        draw.rectangle((40, row, 1880, row + 20), fill=(30, 60 + row % 150, 200))
+        draw.text((60, row + 4), f"Line {row} of the screenshot", fill="black")
+
+    logo = Image.new("RGBA", (512, 512), (0, 0, 0, 0))
+    ImageDraw.Draw(logo).ellipse((32, 32, 480, 480), fill=(220, 40, 40, 255))
+
+    return {
+        "photo 3000x2000 + EXIF": _save(
+            make_photo((3000, 2000)), "JPEG", quality=92, exif=exif
+        ),
+        "photo 800x600": _save(make_photo((800, 600)), "JPEG", quality=85),
+        "screenshot PNG": _save(screenshot, "PNG"),
+        "logo PNG RGBA": _save(logo, "PNG"),
+    }
+
+
+def load_corpus(directory: Path) -> dict[str, bytes]:
+    """Чтение изображений из директории."""
+    return {path.name: path.read_bytes() for path in sorted(directory.iterdir())}
+
+
+def measure(
+    encode: Callable[[bytes, str], str],
+    image: bytes,
+    directory: str,
+) -> tuple[float, int]:
+    """Время CPU в мс и размер файла на диске после кодирования."""
+    file_stem = f"{directory}/image"
+    start = time.process_time()
+    suffix = encode(image, file_stem)
+    elapsed = (time.process_time() - start) * 1000
+    return elapsed, Path(f"{file_stem}{suffix}").stat().st_size
+
+
+def main() -> None:
+    """Запуск бенчмарка."""
+    if len(sys.argv) > 1:
+        corpus = load_corpus(Path(sys.argv[1]))
+    else:
+        corpus = make_corpus()
+
+    variants = {
+        "legacy png": legacy_encode,
+        "original": lambda image, stem: write_encoded(
+            encode_image(image, EncodingOptions()), stem
+        ),
+        "webp": lambda image, stem: write_encoded(
+            encode_image(image, EncodingOptions(output_format="webp")), stem
+        ),
+    }
+    totals = {name: [0.0, 0] for name in variants}
+
+    print(
+        f"{'image':>24} {'input, KB':>10} {'variant':>11} {'cpu, ms':>8} {'disk, KB':>9}"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        for image_name, image in corpus.items():
+            for name, encode in variants.items():
+                elapsed, size = measure(encode, image, directory)
+                totals[name][0] += elapsed
+                totals[name][1] += size
+                print(
+                    f"{image_name:>24} {len(image) / 1024:>10.0f} {name:>11}"
+                    f" {elapsed:>8.0f} {size / 1024:>9.0f}"
+                )
+
+    input_size = sum(len(image) for image in corpus.values())
+    for name, (elapsed, size) in totals.items():
+        print(
+            f"{'total':>24} {input_size / 1024:>10.0f} {name:>11}"
+            f" {elapsed:>8.0f} {size / 1024:>9.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Бенчмарк чтения ленты: прежний цикл по подпискам против одного SQL-запроса.
+
+Для 10/100/1000 подписок выводит медианное время и число SQL-запросов,
+а также время чтения первой и глубоких страниц ленты по курсору.
+Кроме твитов подписок в БД есть BACKGROUND_TWEETS твитов других авторов
+с лайками: по ним видно, обходит ли запрос общий индекс твитов.
+Счетчики likes_count заполняются по таблице лайков.
+Запуск: `MODE=BENCH DB_NAME=bench_db python -m benchmarks.bench_feed`.
+"""
+import asyncio
+import random
+from functools import partial
+
+from sqlalchemy import insert, select, text
+from sqlalchemy.orm import joinedload, selectinload
+
+from backend.config import settings
+from backend.models.db_helper import db_helper
+from backend.models.likes_tweets import TweetLikes
+from backend.models.tweets import TweetModel
+from backend.models.users import SubscriptionModel, UserModel
+from backend.services.timeline_services import rebuild_home_timeline
+from backend.services.tweets_services import get_tweet_feed_db
+from benchmarks._common import create_users, measure, prepare_db
+
+FOLLOWING_COUNTS = (10, 100, 1000)
+TWEETS_PER_USER = 5
+LIKERS_COUNT = 50
+BACKGROUND_AUTHORS = 1000
+BACKGROUND_TWEETS = 200_000
+PAGE_SIZE = 50
+
+# Твиты других авторов с 0-5 лайками от первых LIKERS_COUNT пользователей.
+BACKGROUND_SQL = """
+    WITH new_tweets AS (
+        INSERT INTO tweets (author_id, tweet_data)
+        SELECT :first_author + n % :authors, 'background'
+        FROM generate_series(1, :tweets) AS n
+        RETURNING id
+    )
+    INSERT INTO tweets_likes (user_id, tweet_id)
+    SELECT :first_liker + (new_tweets.id + num * 13) % :likers, new_tweets.id
+    FROM new_tweets
+    CROSS JOIN LATERAL generate_series(1, new_tweets.id * 7919 % 6) AS num
+"""
+COUNT_LIKES_SQL = """
+    UPDATE tweets SET likes_count = counts.likes
+    FROM (
+        SELECT tweet_id, count(*) AS likes FROM tweets_likes GROUP BY tweet_id
+    ) AS counts
+    WHERE tweets.id = counts.tweet_id
+"""
+
+
+async def legacy_feed(user_id: int) -> list[TweetModel]:
+    """
+    Лента в виде цикла по подпискам, как до перехода на один запрос.
+
+    Повторяет исходный код: у твитов жадно загружались изображения, автор
+    и лайкнувшие (lazy="joined"), а лента сортировалась по длине списка
+    лайкнувших.
+    """
+    tweet_relations = (
+        joinedload(TweetModel.images),
+        joinedload(TweetModel.author),
+        joinedload(TweetModel.liked_by),
+    )
+    async with db_helper.session_factory() as session:
+        user = await session.scalar(
+            select(UserModel)
+            .where(UserModel.id == user_id)
+            .options(selectinload(UserModel.following))
+        )
+
+        tweets = []
+        for following_user in user.following:
+            following_user = await session.scalar(
+                select(UserModel)
+                .where(UserModel.id == following_user.id)
+                .options(selectinload(UserModel.tweets).options(*tweet_relations))
+            )
+            tweets.extend(following_user.tweets)
+
+        tweets.sort(key=lambda tweet: len(tweet.liked_by), reverse=True)
+        return tweets
+
+
+async def query_feed(user_id: int) -> list[TweetModel]:
+    """Лента одним запросом из tweets_services."""
+    async with db_helper.session_factory() as session:
+        rows = await get_tweet_feed_db(session=session, user_id=user_id)
+        return [tweet for tweet, _ in rows]
+
+
+async def feed_page(user_id: int, cursor: tuple[int, int] | None) -> None:
+    """Страница ленты по курсору."""
+    async with db_helper.session_factory() as session:
+        await get_tweet_feed_db(
+            session=session,
+            user_id=user_id,
+            limit=PAGE_SIZE,
+            cursor=cursor,
+        )
+
+
+async def bench_pages(user_id: int) -> list[float]:
+    """Время чтения первой, средней и последней страниц ленты в мс."""
+    async with db_helper.session_factory() as session:
+        rows = await get_tweet_feed_db(session=session, user_id=user_id)
+    timings = []
+    for position in (None, len(rows) // 2, len(rows) - PAGE_SIZE):
+        cursor = None
+        if position is not None:
+            tweet, likes_count = rows[position]
+            cursor = (likes_count, tweet.id)
+        elapsed, _ = await measure(partial(feed_page, user_id, cursor))
+        timings.append(elapsed)
+    return timings
+
+
+async def seed(following_count: int) -> int:
+    """Создание читателя, его подписок, твитов и лайков. Возвращает id читателя."""
+    reader_id, *authors = await create_users(1 + following_count)
+    likers = await create_users(LIKERS_COUNT)
+    background_authors = await create_users(BACKGROUND_AUTHORS)
+
+    async with db_helper.session_factory() as session:
+        await session.execute(
+            insert(SubscriptionModel),
+            [{"user_id": reader_id, "subscribed_to_id": author} for author in authors],
+        )
+        tweet_ids = await session.scalars(
+            insert(TweetModel).returning(TweetModel.id),
+            [
+                {"author_id": author, "tweet_data": f"tweet {num}"}
+                for author in authors
+                for num in range(TWEETS_PER_USER)
+            ],
+        )
+        likes = [
+            {"user_id": liker, "tweet_id": tweet_id}
+            for tweet_id in tweet_ids.all()
+            for liker in random.sample(likers, random.randint(0, 5))
+        ]
+        await session.execute(insert(TweetLikes), likes)
+        await session.execute(
+            text(BACKGROUND_SQL),
+            {
+                "first_author": background_authors[0],
+                "authors": BACKGROUND_AUTHORS,
+                "tweets": BACKGROUND_TWEETS,
+                "first_liker": likers[0],
+                "likers": LIKERS_COUNT,
+            },
+        )
+        await session.execute(text(COUNT_LIKES_SQL))
+        await session.commit()
+
+        await rebuild_home_timeline(session=session, user_ids=[reader_id])
+
+    async with db_helper.engine.connect() as conn:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("VACUUM ANALYZE"))
+    return reader_id
+
+
+async def main() -> None:
+    """Запуск бенчмарка."""
+    variants = (
+        ("legacy loop", legacy_feed, "timeline"),
+        ("query (subscriptions)", query_feed, "subscriptions"),
+        ("query (timeline)", query_feed, "timeline"),
+    )
+    feed_rows, page_rows = [], []
+    for following_count in FOLLOWING_COUNTS:
+        await prepare_db()
+        reader_id = await seed(following_count)
+
+        for name, feed, feed_source in variants:
+            settings.feed_source = feed_source  # type: ignore[assignment]
+            elapsed, queries = await measure(partial(feed, reader_id))
+            feed_rows.append((following_count, name, queries, elapsed))
+        for feed_source in ("subscriptions", "timeline"):
+            settings.feed_source = feed_source  # type: ignore[assignment]
+            timings = await bench_pages(reader_id)
+            page_rows.append((following_count, feed_source, *timings))
+
+    print(f"{'following':>9} {'variant':>22} {'queries':>8} {'median, ms':>11}")
+    for following_count, name, queries, elapsed in feed_rows:
+        print(f"{following_count:>9} {name:>22} {queries:>8} {elapsed:>11.1f}")
+    print(f"\npages of {PAGE_SIZE}, median ms")
+    print(f"{'following':>9} {'source':>14} {'first':>7} {'middle':>7} {'last':>7}")
+    for following_count, feed_source, first, middle, last in page_rows:
+        print(
+            f"{following_count:>9} {feed_source:>14}"
+            f" {first:>7.1f} {middle:>7.1f} {last:>7.1f}"
+        )
+    await db_helper.engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
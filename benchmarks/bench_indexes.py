@@ -0,0 +1,246 @@
+"""
+Бенчмарк индексов внешних ключей и api_key: планы запросов сервисов до и после.
+
+Заполняет БД ~1 млн строк в каждой крупной таблице, один раз выполняет
+сервисные функции и записывает их SQL-запросы. Затем для каждого запроса
+выводит узлы сканирования из EXPLAIN ANALYZE и время выполнения: сначала
+с удаленными индексами миграции e3a9c5b71d48, потом с индексами.
+Обе серии выполняются в транзакциях с откатом, данные не меняются.
+Запуск: `MODE=BENCH DB_NAME=bench_db python -m benchmarks.bench_indexes`.
+Полные планы выводятся с флагом `--full`.
+"""
+import asyncio
+import re
+import sys
+
+from sqlalchemy import event, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from backend.config import settings
+from backend.models.db_helper import db_helper
+from backend.models.users import UserModel
+from backend.services.security import api_key_cache, get_user_id_from_api_key
+from backend.services.timeline_services import rebuild_home_timeline
+from backend.services.tweets_services import (
+    add_like_to_tweet_db,
+    delete_tweet_db,
+    get_tweet_feed_db,
+    remove_like_from_tweet_db,
+)
+from backend.services.users_services import (
+    add_follow_user_db,
+    delete_follow_user_db,
+    serialize_user_extended,
+)
+from benchmarks._common import prepare_db
+
+USERS_COUNT = 100_000
+TWEETS_COUNT = 1_000_000
+FOLLOWING_PER_USER = 10
+LIKES_PER_USER = 10
+IMAGES_COUNT = 200_000
+READER_ID = 1
+
+INDEXES = (
+    "idx_unique_users_api_key",
+    "idx_tweets_author_id",
+    "idx_images_tweet_id",
+    "idx_subscriptions_subscribed_to_user",
+    "idx_tweets_likes_tweet_user",
+)
+
+SEED_SQL = (
+    """
+    INSERT INTO users (first_name, last_name, email, handle)
+    SELECT 'Bench', 'User' || n, 'b@e.ch', 'benchuser' || n
+    FROM generate_series(1, :users) AS n
+    """,
+    """
+    INSERT INTO tweets (author_id, tweet_data)
+    SELECT n % :users + 1, 'tweet ' || n
+    FROM generate_series(1, :tweets) AS n
+    """,
+    """
+    INSERT INTO subscriptions (user_id, subscribed_to_id)
+    SELECT DISTINCT u, (u + k * 7919) % :users + 1
+    FROM generate_series(1, :users) AS u, generate_series(1, :following) AS k
+    WHERE (u + k * 7919) % :users + 1 != u
+    """,
+    """
+    INSERT INTO tweets_likes (user_id, tweet_id)
+    SELECT u, (u::bigint * 104729 + k * 15485863) % :tweets + 1
+    FROM generate_series(1, :users) AS u, generate_series(1, :likes) AS k
+    ON CONFLICT DO NOTHING
+    """,
+    """
+    INSERT INTO images (image_path, tweet_id)
+    SELECT 'images/' || n || '.jpg', n::bigint * 5 % :tweets + 1
+    FROM generate_series(1, :images) AS n
+    """,
+    """
+    UPDATE tweets
+    SET likes_count = likes.count
+    FROM (
+        SELECT tweet_id, count(*) AS count
+        FROM tweets_likes
+        GROUP BY tweet_id
+    ) AS likes
+    WHERE tweets.id = likes.tweet_id
+    """,
+)
+
+
+class StatementCapture:
+    """Запись SQL-запросов с параметрами и названием сервисной функции."""
+
+    def __init__(self):
+        """Инициализация пустого списка запросов."""
+        self.label = ""
+        self.statements: list[tuple[str, str, dict]] = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        """Обработчик события before_cursor_execute."""
+        if not executemany:
+            self.statements.append((self.label, statement, parameters))
+
+
+async def seed() -> None:
+    """Заполнение БД через generate_series и сбор статистики."""
+    params = {
+        "users": USERS_COUNT,
+        "tweets": TWEETS_COUNT,
+        "following": FOLLOWING_PER_USER,
+        "likes": LIKES_PER_USER,
+        "images": IMAGES_COUNT,
+    }
+    async with db_helper.engine.begin() as conn:
+        for stmt in SEED_SQL:
+            await conn.execute(text(stmt), params)
+
+    async with db_helper.session_factory() as session:
+        await rebuild_home_timeline(session=session, user_ids=[READER_ID])
+
+    async with db_helper.engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("ANALYZE"))
+
+
+async def capture_statements() -> StatementCapture:
+    """
+    Однократное выполнение сервисных функций с записью их запросов.
+
+    Коммиты сервисов превращаются в точки сохранения внешней транзакции,
+    которая затем откатывается.
+    """
+    async with db_helper.session_factory() as session:
+        api_key = await session.scalar(
+            select(UserModel.api_key).where(UserModel.id == READER_ID)
+        )
+        tweet, _ = (await get_tweet_feed_db(session, READER_ID, limit=1))[0]
+        tweet_id, author_id = tweet.id, tweet.author_id
+    followed_id = READER_ID + USERS_COUNT // 2
+
+    calls = (
+        (
+            "auth",
+            lambda s: get_user_id_from_api_key(None, str(api_key), s),
+        ),
+        (
+            "feed (subscriptions)",
+            lambda s: get_tweet_feed_db(s, READER_ID, limit=100),
+        ),
+        ("user info", lambda s: serialize_user_extended(s, READER_ID)),
+        ("like", lambda s: add_like_to_tweet_db(s, READER_ID, tweet_id)),
+        ("unlike", lambda s: remove_like_from_tweet_db(s, READER_ID, tweet_id)),
+        ("follow", lambda s: add_follow_user_db(s, READER_ID, followed_id)),
+        ("unfollow", lambda s: delete_follow_user_db(s, READER_ID, followed_id)),
+        ("delete tweet", lambda s: delete_tweet_db(s, tweet_id, author_id)),
+    )
+
+    capture = StatementCapture()
+    api_key_cache.clear()
+    settings.feed_source = "subscriptions"  # type: ignore[assignment]
+    engine = db_helper.engine.sync_engine
+    async with db_helper.engine.connect() as conn:
+        await conn.begin()
+        session = AsyncSession(bind=conn, join_transaction_mode="create_savepoint")
+        event.listen(engine, "before_cursor_execute", capture)
+        try:
+            for label, call in calls:
+                capture.label = label
+                await call(session)
+                session.expunge_all()
+        finally:
+            event.remove(engine, "before_cursor_execute", capture)
+            await session.close()
+            await conn.rollback()
+
+    capture.statements = [
+        (label, statement, parameters)
+        for label, statement, parameters in capture.statements
+        if not statement.startswith(("SAVEPOINT", "RELEASE", "ROLLBACK"))
+    ]
+    return capture
+
+
+async def explain_all(
+    conn: AsyncConnection,
+    capture: StatementCapture,
+) -> list[tuple[str, list[str], float]]:
+    """EXPLAIN ANALYZE каждого записанного запроса: метка, узлы плана и время в мс."""
+    results = []
+    for label, statement, parameters in capture.statements:
+        result = await conn.exec_driver_sql(
+            f"EXPLAIN (ANALYZE, COSTS OFF, TIMING OFF) {statement}",
+            parameters,
+        )
+        plan = [line for line, in result]
+        elapsed = float(re.search(r"Execution Time: ([\d.]+)", plan[-1]).group(1))
+        results.append((label, plan, elapsed))
+    return results
+
+
+async def run_plans(capture: StatementCapture, drop_indexes: bool) -> list:
+    """Планы запросов без индексов миграции или с ними, в транзакции с откатом."""
+    async with db_helper.engine.connect() as conn:
+        await conn.begin()
+        if drop_indexes:
+            for index in INDEXES:
+                await conn.execute(text(f"DROP INDEX {index}"))
+        try:
+            return await explain_all(conn, capture)
+        finally:
+            await conn.rollback()
+
+
+def print_plan(plan: list[str], full: bool) -> None:
+    """Вывод плана целиком или только узлов сканирования и триггеров."""
+    for line in plan:
+        if full or re.search(r"Scan|Trigger for", line):
+            print(f"      {line.strip()}")
+
+
+async def main() -> None:
+    """Запуск бенчмарка."""
+    full = "--full" in sys.argv
+    await prepare_db()
+    await seed()
+    capture = await capture_statements()
+
+    before = await run_plans(capture, drop_indexes=True)
+    after = await run_plans(capture, drop_indexes=False)
+
+    for (label, plan_before, ms_before), (_, plan_after, ms_after) in zip(
+        before, after
+    ):
+        print(f"{label}: {ms_before:.2f} ms -> {ms_after:.2f} ms")
+        print("    before:")
+        print_plan(plan_before, full)
+        print("    after:")
+        print_plan(plan_after, full)
+
+    await db_helper.engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
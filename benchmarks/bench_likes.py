@@ -0,0 +1,155 @@
+"""
+Бенчмарк лайков: загрузка понравившихся твитов через ORM против одного запроса.
+
+Для пользователей с разной историей лайков выводит медианное время
+и число SQL-запросов на пару "лайк + снятие лайка". Для авторов с разным
+числом подписчиков выводит время той же пары и время копирования
+изменившегося счетчика в home_timeline (sync_timeline_likes), которое
+выполняется вне запроса лайка.
+Запуск: `MODE=BENCH DB_NAME=bench_db python -m benchmarks.bench_likes`.
+"""
+import asyncio
+from functools import partial
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from backend.models.db_helper import db_helper
+from backend.models.likes_tweets import TweetLikes
+from backend.models.tweets import TweetModel
+from backend.models.users import SubscriptionModel, UserModel
+from backend.services.other_services import get_tweet
+from backend.services.timeline_services import fan_out_tweet, sync_timeline_likes
+from backend.services.tweets_services import (
+    add_like_to_tweet_db,
+    remove_like_from_tweet_db,
+)
+from benchmarks._common import create_users, measure, prepare_db
+
+HISTORY_SIZES = (0, 100, 1000, 10000)
+FOLLOWER_COUNTS = (1, 1000, 10000, 200000)
+
+
+async def get_user_with_liked_tweets(session: AsyncSession, user_id: int) -> UserModel:
+    """Загрузка юзера вместе со всеми понравившимися твитами."""
+    stmt = (
+        select(UserModel)
+        .where(UserModel.id == user_id)
+        .options(selectinload(UserModel.liked_tweets))
+    )
+    return (await session.scalars(stmt)).one()
+
+
+async def legacy_like_unlike(user_id: int, tweet_id: int) -> None:
+    """Лайк и снятие лайка через загрузку всех понравившихся твитов."""
+    async with db_helper.session_factory() as session:
+        user = await get_user_with_liked_tweets(session, user_id)
+        tweet = await get_tweet(session, tweet_id)
+        user.liked_tweets.append(tweet)
+        await session.commit()
+
+    async with db_helper.session_factory() as session:
+        user = await get_user_with_liked_tweets(session, user_id)
+        tweet = await get_tweet(session, tweet_id)
+        user.liked_tweets.remove(tweet)
+        await session.commit()
+
+
+async def statement_like_unlike(user_id: int, tweet_id: int) -> None:
+    """Лайк и снятие лайка одним запросом каждый."""
+    async with db_helper.session_factory() as session:
+        await add_like_to_tweet_db(session, user_id=user_id, tweet_id=tweet_id)
+        await remove_like_from_tweet_db(session, user_id=user_id, tweet_id=tweet_id)
+
+
+async def like_unlike_with_sync(user_id: int, tweet_id: int) -> None:
+    """Лайк и снятие лайка, каждое с копированием счетчика в ленты."""
+    async with db_helper.session_factory() as session:
+        await add_like_to_tweet_db(session, user_id=user_id, tweet_id=tweet_id)
+        await sync_timeline_likes(session, batch_size=1000)
+        await remove_like_from_tweet_db(session, user_id=user_id, tweet_id=tweet_id)
+        await sync_timeline_likes(session, batch_size=1000)
+
+
+async def seed(history_size: int) -> tuple[int, int]:
+    """Создание пользователя с history_size лайками. Возвращает id юзера и твита."""
+    user_id, author_id = await create_users(2)
+
+    async with db_helper.session_factory() as session:
+        tweet_ids = await session.scalars(
+            insert(TweetModel).returning(TweetModel.id),
+            [
+                {"author_id": author_id, "tweet_data": f"tweet {num}"}
+                for num in range(history_size + 1)
+            ],
+        )
+        target_id, *liked_ids = tweet_ids.all()
+        if liked_ids:
+            await session.execute(
+                insert(TweetLikes),
+                [{"user_id": user_id, "tweet_id": tweet_id} for tweet_id in liked_ids],
+            )
+        await session.commit()
+
+    return user_id, target_id
+
+
+async def seed_followers(follower_count: int) -> tuple[int, int]:
+    """
+    Создание автора с follower_count подписчиками и твита в их лентах.
+    Возвращает id подписчика и твита.
+    """
+    author_id, *follower_ids = await create_users(follower_count + 1)
+
+    async with db_helper.session_factory() as session:
+        await session.execute(
+            insert(SubscriptionModel),
+            [
+                {"user_id": follower_id, "subscribed_to_id": author_id}
+                for follower_id in follower_ids
+            ],
+        )
+        tweet_id = await session.scalar(
+            insert(TweetModel)
+            .values(author_id=author_id, tweet_data="popular tweet")
+            .returning(TweetModel.id)
+        )
+        await fan_out_tweet(session, tweet_id=tweet_id, author_id=author_id)
+        await session.commit()
+
+    return follower_ids[0], tweet_id
+
+
+async def main() -> None:
+    """Запуск бенчмарка."""
+    print(f"{'liked':>7} {'variant':>10} {'queries':>8} {'median, ms':>11}")
+    await prepare_db()
+    for history_size in HISTORY_SIZES:
+        user_id, tweet_id = await seed(history_size)
+
+        variants = (
+            ("legacy", legacy_like_unlike),
+            ("statement", statement_like_unlike),
+        )
+        for name, like_unlike in variants:
+            elapsed, queries = await measure(partial(like_unlike, user_id, tweet_id))
+            print(f"{history_size:>7} {name:>10} {queries:>8} {elapsed:>11.1f}")
+
+    print(f"\n{'followers':>9} {'variant':>10} {'queries':>8} {'median, ms':>11}")
+    for follower_count in FOLLOWER_COUNTS:
+        user_id, tweet_id = await seed_followers(follower_count)
+
+        variants = (
+            ("statement", statement_like_unlike),
+            ("with sync", like_unlike_with_sync),
+        )
+        for name, like_unlike in variants:
+            elapsed, queries = await measure(partial(like_unlike, user_id, tweet_id))
+            print(f"{follower_count:>9} {name:>10} {queries:>8} {elapsed:>11.1f}")
+
+    await db_helper.engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,139 @@
+"""
+Бенчмарк накладных расходов на сессии БД в одном запросе к API.
+
+Сравнивает прежнюю схему (реестр async_scoped_session для авторизации
+и отдельная сессия чтения для обработчика) с одной сессией на запрос.
+Для GET /api/users/{id} выводит медианное время запроса и число выдач
+соединений из пула на запрос, с кэшем API-ключей и без него.
+Запуск: `MODE=BENCH DB_NAME=bench_db python -m benchmarks.bench_requests`.
+"""
+import asyncio
+import statistics
+import time
+from asyncio import current_task
+from typing import Annotated, AsyncGenerator
+
+from fastapi import Depends, FastAPI, Path, Request, Security
+from httpx import AsyncClient
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_scoped_session
+
+from backend.main import app
+from backend.models.db_helper import db_helper
+from backend.models.users import SubscriptionModel, UserModel
+from backend.schemas import OutUserSchema
+from backend.services.security import api_key_cache, api_key_h, get_user_id_from_api_key
+from backend.services.users_services import serialize_user_extended
+from benchmarks._common import create_users, prepare_db
+
+REQUESTS_COUNT = 300
+FOLLOWERS_COUNT = 20
+
+legacy_app = FastAPI()
+
+
+async def legacy_scoped_session() -> AsyncGenerator[AsyncSession, None]:
+    """Сессия авторизации, как до перехода на одну сессию на запрос."""
+    session = async_scoped_session(
+        session_factory=db_helper.session_factory,
+        scopefunc=current_task,
+    )
+    yield session
+    await session.close()
+
+
+async def legacy_read_session() -> AsyncGenerator[AsyncSession, None]:
+    """Отдельная сессия чтения для обработчика."""
+    async with db_helper.session_factory() as session:
+        yield session
+
+
+async def legacy_auth(
+    request: Request,
+    api_key_header: str = Security(api_key_h),
+    session: AsyncSession = Depends(legacy_scoped_session),
+) -> int | dict:
+    """Авторизация через сессию из реестра."""
+    return await get_user_id_from_api_key(request, api_key_header, session)
+
+
+@legacy_app.get("/api/users/{user_id}", response_model=OutUserSchema)
+async def legacy_get_user_info(
+    user_id: Annotated[int, Path(gt=0)],
+    _: Annotated[int, Depends(legacy_auth)],
+    session: AsyncSession = Depends(legacy_read_session),
+):
+    """Профиль пользователя с двумя сессиями на запрос."""
+    user = await serialize_user_extended(session=session, user_id=user_id)
+    return OutUserSchema(user=user)
+
+
+async def seed() -> tuple[int, str]:
+    """Создание пользователя с подписчиками. Возвращает его id и API-ключ."""
+    user_id, *followers = await create_users(1 + FOLLOWERS_COUNT)
+    async with db_helper.session_factory() as session:
+        await session.execute(
+            insert(SubscriptionModel),
+            [
+                {"user_id": follower, "subscribed_to_id": user_id}
+                for follower in followers
+            ],
+        )
+        await session.commit()
+        api_key = await session.scalar(
+            select(UserModel.api_key).where(UserModel.id == user_id)
+        )
+    return user_id, str(api_key)
+
+
+async def measure_requests(
+    target: FastAPI,
+    user_id: int,
+    api_key: str,
+    use_cache: bool,
+) -> tuple[float, float]:
+    """Медианное время запроса в мс и число выдач соединений на запрос."""
+    timings = []
+    checkouts = db_helper.pool_stats()["checkouts"]
+    async with AsyncClient(
+        app=target,
+        base_url="http://127.0.0.1:5000/api",
+        headers={"api-key": api_key},
+    ) as client:
+        for _ in range(REQUESTS_COUNT):
+            if not use_cache:
+                api_key_cache.invalidate(api_key)
+            start = time.perf_counter()
+            response = await client.get(f"/users/{user_id}")
+            timings.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200
+
+    checkouts = db_helper.pool_stats()["checkouts"] - checkouts
+    return statistics.median(timings), checkouts / REQUESTS_COUNT
+
+
+async def main() -> None:
+    """Запуск бенчмарка."""
+    await prepare_db()
+    user_id, api_key = await seed()
+
+    print(f"{'variant':>22} {'api key cache':>14} {'checkouts':>10} {'median, ms':>11}")
+    for use_cache in (False, True):
+        for name, target in (
+            ("legacy two sessions", legacy_app),
+            ("session per request", app),
+        ):
+            elapsed, checkouts = await measure_requests(
+                target,
+                user_id,
+                api_key,
+                use_cache,
+            )
+            cache = "on" if use_cache else "off"
+            print(f"{name:>22} {cache:>14} {checkouts:>10.1f} {elapsed:>11.2f}")
+
+    await db_helper.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
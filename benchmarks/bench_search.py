@@ -0,0 +1,144 @@
+"""
+Бенчмарк поиска твитов: ILIKE по тексту против полнотекстового поиска.
+
+Заполняет БД TWEETS_COUNT твитами из слов словаря с неравномерной
+частотой: частые слова встречаются в большой доле твитов, редкие - в единицах.
+Для частого, среднего, редкого слова и фразы выводит медианное время первой
+страницы ILIKE '%слово%' (последовательное сканирование таблицы) и поиска
+через search_tweets_db (GIN-индекс, сортировка по ts_rank), время второй
+страницы по курсору и узлы сканирования плана поиска.
+Запуск: `MODE=BENCH DB_NAME=bench_db python -m benchmarks.bench_search`.
+"""
+import asyncio
+import re
+from functools import partial
+
+from sqlalchemy import select, text
+
+from backend.models.db_helper import db_helper
+from backend.models.tweets import TweetModel
+from backend.services.tweets_services import search_tweets_db
+from benchmarks._common import create_users, measure, prepare_db
+
+TWEETS_COUNT = 2_000_000
+USERS_COUNT = 1000
+WORDS_COUNT = 50_000
+WORDS_PER_TWEET = 12
+PAGE_SIZE = 50
+
+# Индекс слова word<N> берется как WORDS_COUNT * random()^4: слова с малым
+# номером встречаются часто, с большим - редко.
+SEED_SQL = """
+    INSERT INTO tweets (author_id, tweet_data)
+    SELECT n % :users + 1, words.tweet_data
+    FROM generate_series(1, :tweets) AS n
+    CROSS JOIN LATERAL (
+        SELECT string_agg('word' || floor(:words * power(random(), 4)), ' ')
+            AS tweet_data
+        FROM generate_series(1, :words_per_tweet)
+        WHERE n > 0
+    ) AS words
+"""
+QUERIES = {
+    "frequent word": "word1",
+    "middle word": "word300",
+    "rare word": "word40000",
+    "phrase": '"word1 word2"',
+}
+
+
+async def seed() -> None:
+    """Заполнение таблицы твитов и обновление статистики планировщика."""
+    await create_users(USERS_COUNT)
+    async with db_helper.engine.begin() as conn:
+        await conn.execute(text("SELECT setseed(0.5)"))
+        await conn.execute(
+            text(SEED_SQL),
+            {
+                "users": USERS_COUNT,
+                "tweets": TWEETS_COUNT,
+                "words": WORDS_COUNT,
+                "words_per_tweet": WORDS_PER_TWEET,
+            },
+        )
+    async with db_helper.engine.connect() as conn:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("VACUUM ANALYZE tweets"))
+
+
+async def ilike_page(word: str) -> None:
+    """Первая страница поиска подстроки через ILIKE, новые твиты первыми."""
+    async with db_helper.session_factory() as session:
+        stmt = (
+            select(TweetModel.id)
+            .where(TweetModel.tweet_data.ilike(f"%{word}%"))
+            .order_by(TweetModel.id.desc())
+            .limit(PAGE_SIZE)
+        )
+        await session.scalars(stmt)
+
+
+async def search_page(query: str, cursor: tuple[float, int] | None) -> list:
+    """Страница полнотекстового поиска."""
+    async with db_helper.session_factory() as session:
+        return await search_tweets_db(
+            session=session,
+            query=query,
+            limit=PAGE_SIZE,
+            cursor=cursor,
+        )
+
+
+async def search_plan(query: str) -> list[str]:
+    """Узлы сканирования плана поиска."""
+    async with db_helper.engine.connect() as conn:
+        result = await conn.execute(
+            text(
+                "EXPLAIN (COSTS OFF) SELECT id FROM tweets"
+                " WHERE search_vector @@ websearch_to_tsquery('simple', :query)"
+            ),
+            {"query": query},
+        )
+        return [line.strip() for line, in result if re.search(r"Scan", line)]
+
+
+async def main() -> None:
+    """Запуск бенчмарка."""
+    await prepare_db()
+    await seed()
+    print(f"tweets: {TWEETS_COUNT}, page size: {PAGE_SIZE}")
+
+    print(
+        f"{'query':>14} {'matches':>8} {'ilike, ms':>10}"
+        f" {'search, ms':>11} {'page 2, ms':>11}"
+    )
+    for name, query in QUERIES.items():
+        async with db_helper.session_factory() as session:
+            matches = await session.scalar(
+                text(
+                    "SELECT count(*) FROM tweets"
+                    " WHERE search_vector @@ websearch_to_tsquery('simple', :query)"
+                ),
+                {"query": query},
+            )
+        word = query.strip('"')
+        ilike_ms, _ = await measure(partial(ilike_page, word))
+        search_ms, _ = await measure(partial(search_page, query, None))
+        first_page = await search_page(query, None)
+        cursor = None
+        if len(first_page) == PAGE_SIZE:
+            tweet, rank = first_page[-1]
+            cursor = (rank, tweet.id)
+        next_ms, _ = await measure(partial(search_page, query, cursor))
+        print(
+            f"{name:>14} {matches:>8} {ilike_ms:>10.1f}"
+            f" {search_ms:>11.1f} {next_ms:>11.1f}"
+        )
+        for line in await search_plan(query):
+            print(f"{'':>16}{line}")
+
+    await db_helper.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+"""
+Бенчмарк сериализации ответа ленты из 1000 твитов.
+
+Сравнивает стандартный путь FastAPI (повторная валидация по response_model
+и JSONResponse) с кодированием уже провалидированной модели через orjson.
+БД не используется: запуск `python -m benchmarks.bench_serialization`.
+"""
+import asyncio
+import statistics
+import time
+from typing import Callable
+
+from fastapi.routing import APIRoute, serialize_response
+from starlette.responses import JSONResponse
+
+from backend.main import app
+from backend.responses import ModelORJSONResponse
+from backend.schemas import OutTweetsSchema, TweetLikesSchema, TweetSchema, UserSchema
+
+TWEETS_COUNT = 1000
+LIKES_PER_TWEET = 10
+ATTACHMENTS_PER_TWEET = 2
+REPEAT = 20
+
+
+def build_feed() -> OutTweetsSchema:
+    """Создание провалидированной модели ленты, как ее собирает serialize_tweets."""
+    tweets = [
+        TweetSchema(
+            id=num,
+            content=f"Твит номер {num} с текстом средней длины",
+            attachments=[
+                f"images/{num}_{image}.jpg" for image in range(ATTACHMENTS_PER_TWEET)
+            ],
+            author=UserSchema(id=num % 100 + 1, name="Bench Author"),
+            likes=[
+                TweetLikesSchema(user_id=user_id, name=f"Bench User{user_id}")
+                for user_id in range(1, LIKES_PER_TWEET + 1)
+            ],
+        )
+        for num in range(1, TWEETS_COUNT + 1)
+    ]
+    return OutTweetsSchema(tweets=tweets, next_cursor="MTAwOjE=")
+
+
+def feed_route() -> APIRoute:
+    """Маршрут GET /api/tweets с его response_model."""
+    for route in app.routes:
+        if isinstance(route, APIRoute) and route.path == "/api/tweets":
+            if "GET" in route.methods:
+                return route
+    raise LookupError("GET /api/tweets route not found")
+
+
+def measure(run: Callable[[], bytes]) -> float:
+    """Медианное время одного прогона в мс."""
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+async def fastapi_default(feed: OutTweetsSchema, route: APIRoute) -> bytes:
+    """Стандартный путь FastAPI: валидация по response_model и JSONResponse."""
+    content = await serialize_response(
+        field=route.response_field,
+        response_content=feed,
+    )
+    return JSONResponse(content=content).body
+
+
+def main() -> None:
+    """Запуск бенчмарка."""
+    feed = build_feed()
+    route = feed_route()
+
+    def run_default() -> bytes:
+        return asyncio.run(fastapi_default(feed, route))
+
+    def run_fast() -> bytes:
+        return ModelORJSONResponse(feed).body
+
+    assert run_default() == run_fast()
+    print(f"{'variant':>16} {'median, ms':>11}")
+    for name, run in (("fastapi default", run_default), ("orjson", run_fast)):
+        print(f"{name:>16} {measure(run):>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
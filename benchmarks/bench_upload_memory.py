@@ -0,0 +1,163 @@
+"""
+Бенчмарк памяти сервера при одновременной загрузке крупных изображений.
+
+Запускает uvicorn в отдельном процессе и отправляет UPLOADS_COUNT
+одновременных загрузок изображения ~20 МБ в /api/medias. Выводит пиковый RSS
+процесса сервера, время и коды ответов для прежней загрузки (тело файла
+читается в память через `await file.read()`) и для потоковой загрузки
+во временный файл. Изображения обрабатываются в пуле потоков, чтобы память
+декодирования учитывалась в том же процессе. Пиковый RSS читается из VmHWM
+в /proc, поэтому бенчмарк работает только в Linux: ru_maxrss дочернего
+процесса включает память родителя на момент fork.
+Запуск: `MODE=BENCH DB_NAME=bench_db python -m benchmarks.bench_upload_memory`.
+"""
+import asyncio
+import io
+import os
+import signal
+import subprocess
+import sys
+import time
+from collections import Counter
+from typing import Annotated
+
+import httpx
+from fastapi import Depends, FastAPI, UploadFile
+from PIL import Image
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.main import lifespan
+from backend.models.db_helper import db_helper
+from backend.models.users import UserModel
+from backend.schemas import OutMediaSchema
+from backend.services.medias_services import save_image
+from backend.services.security import get_user_id_from_api_key
+from benchmarks._common import create_users, prepare_db
+
+UPLOADS_COUNT = 50
+IMAGE_SIZE = (4800, 3500)
+PORT = 5081
+SERVER_ENV = {
+    "IMAGE_EXECUTOR": "thread",
+    "IMAGE_QUEUE_SIZE": str(UPLOADS_COUNT),
+    "IMAGE_MAX_UPLOAD_BYTES": str(32 * 1024 * 1024),
+}
+
+legacy_app = FastAPI(lifespan=lifespan)
+
+
+@legacy_app.post("/api/medias", status_code=201, response_model=OutMediaSchema)
+async def legacy_upload_image(
+    file: UploadFile,
+    _: Annotated[int, Depends(get_user_id_from_api_key)],
+    session: AsyncSession = Depends(db_helper.request_session_dependency),
+):
+    """Загрузка с чтением всего файла в память, как до потоковой загрузки."""
+    file_data = await file.read()
+    image = await save_image(session=session, image=file_data)
+    return OutMediaSchema(media_id=image.id)
+
+
+def make_image() -> bytes:
+    """JPEG из случайного шума размером около 20 МБ."""
+    image = Image.frombytes(
+        "RGB", IMAGE_SIZE, os.urandom(IMAGE_SIZE[0] * IMAGE_SIZE[1] * 3)
+    )
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=95)
+    return buffer.getvalue()
+
+
+async def seed() -> str:
+    """Создание пользователя. Возвращает его API-ключ."""
+    user_id, *_ = await create_users(1)
+    async with db_helper.session_factory() as session:
+        api_key = await session.scalar(
+            select(UserModel.api_key).where(UserModel.id == user_id)
+        )
+    await db_helper.dispose()
+    return str(api_key)
+
+
+async def wait_for_server(client: httpx.AsyncClient) -> None:
+    """Ожидание запуска сервера."""
+    for _ in range(100):
+        try:
+            await client.get("/")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("Server did not start")
+
+
+async def upload_all(api_key: str, image: bytes) -> tuple[float, Counter]:
+    """Одновременные загрузки. Возвращает время в секундах и коды ответов."""
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{PORT}",
+        headers={"api-key": api_key},
+        timeout=300,
+        limits=httpx.Limits(max_connections=UPLOADS_COUNT),
+    ) as client:
+        await wait_for_server(client)
+        start = time.perf_counter()
+        responses = await asyncio.gather(
+            *(
+                client.post(
+                    "/api/medias",
+                    files={"file": ("image.jpg", image, "image/jpeg")},
+                )
+                for _ in range(UPLOADS_COUNT)
+            )
+        )
+        elapsed = time.perf_counter() - start
+    return elapsed, Counter(response.status_code for response in responses)
+
+
+def read_peak_rss(pid: int) -> int:
+    """Пиковый RSS процесса в КБ."""
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    raise RuntimeError("VmHWM is not available")
+
+
+def run_server(target: str, api_key: str, image: bytes) -> tuple[int, float, Counter]:
+    """Запуск сервера с загрузками. Возвращает пиковый RSS в КБ, время и коды."""
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", target, "--port", str(PORT)],
+        env={**os.environ, **SERVER_ENV},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        elapsed, statuses = asyncio.run(upload_all(api_key, image))
+        peak_rss = read_peak_rss(server.pid)
+    finally:
+        server.send_signal(signal.SIGINT)
+        server.wait()
+    return peak_rss, elapsed, statuses
+
+
+def main() -> None:
+    """Запуск бенчмарка."""
+    asyncio.run(prepare_db())
+    api_key = asyncio.run(seed())
+    image = make_image()
+    print(f"image: {len(image) / 1_000_000:.1f} MB, uploads: {UPLOADS_COUNT}")
+
+    print(f"{'variant':>10} {'peak rss, MB':>13} {'time, s':>8}  statuses")
+    for name, target in (
+        ("read", "benchmarks.bench_upload_memory:legacy_app"),
+        ("streaming", "backend.main:app"),
+    ):
+        peak_rss, elapsed, statuses = run_server(target, api_key, image)
+        print(
+            f"{name:>10} {peak_rss / 1024:>13.0f} {elapsed:>8.1f}"
+            f"  {dict(sorted(statuses.items()))}"
+        )
+
+
+if __name__ == "__main__":
+    main()
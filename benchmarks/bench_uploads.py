@@ -0,0 +1,161 @@
+"""
+Бенчмарк задержки ленты во время загрузки изображений.
+
+Пока несколько клиентов загружают крупные изображения через /api/medias,
+другой клиент последовательно читает ленту. Выводит медиану, 95-й перцентиль
+и максимум задержки чтения ленты для обработки изображений в цикле событий
+(как до переноса в пул), в пуле потоков и в пуле процессов.
+Запуск: `MODE=BENCH DB_NAME=bench_db python -m benchmarks.bench_uploads`.
+"""
+import asyncio
+import io
+import os
+import statistics
+import time
+
+from httpx import AsyncClient
+from PIL import Image
+from sqlalchemy import insert, select
+
+from backend.main import app
+from backend.models.db_helper import db_helper
+from backend.models.images import ImageModel
+from backend.models.tweets import TweetModel
+from backend.models.users import SubscriptionModel, UserModel
+from backend.services import medias_services
+from backend.services.image_processing import ImageProcessor
+from backend.services.medias_services import delete_image_from_memory
+from backend.services.timeline_services import rebuild_home_timeline
+from benchmarks._common import create_users, prepare_db
+
+UPLOADERS_COUNT = 4
+UPLOADS_PER_CLIENT = 2
+IMAGE_SIZE = (1600, 1200)
+AUTHORS_COUNT = 10
+TWEETS_PER_AUTHOR = 5
+
+
+class InlineProcessor(ImageProcessor):
+    """Обработка изображения прямо в цикле событий, как до переноса в пул."""
+
+    async def run(self, func, *args):
+        """Синхронное выполнение func(*args)."""
+        return func(*args)
+
+
+def make_image() -> bytes:
+    """Крупное JPEG-изображение из случайного шума: его дорого сжимать в PNG."""
+    image = Image.frombytes(
+        "RGB", IMAGE_SIZE, os.urandom(IMAGE_SIZE[0] * IMAGE_SIZE[1] * 3)
+    )
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=95)
+    return buffer.getvalue()
+
+
+async def seed() -> str:
+    """Создание читателя с лентой. Возвращает API-ключ читателя."""
+    reader_id, *authors = await create_users(1 + AUTHORS_COUNT)
+    async with db_helper.session_factory() as session:
+        await session.execute(
+            insert(SubscriptionModel),
+            [{"user_id": reader_id, "subscribed_to_id": author} for author in authors],
+        )
+        await session.execute(
+            insert(TweetModel),
+            [
+                {"author_id": author, "tweet_data": f"tweet {num}"}
+                for author in authors
+                for num in range(TWEETS_PER_AUTHOR)
+            ],
+        )
+        await session.commit()
+        await rebuild_home_timeline(session=session, user_ids=[reader_id])
+        api_key = await session.scalar(
+            select(UserModel.api_key).where(UserModel.id == reader_id)
+        )
+    return str(api_key)
+
+
+async def upload(client: AsyncClient, image: bytes) -> None:
+    """Последовательная загрузка изображений одним клиентом."""
+    for _ in range(UPLOADS_PER_CLIENT):
+        response = await client.post(
+            "/medias",
+            files={"file": ("image.jpg", image, "image/jpeg")},
+        )
+        assert response.status_code == 201
+
+
+async def read_feed(client: AsyncClient, uploads: asyncio.Future) -> list[float]:
+    """Чтение ленты, пока идут загрузки. Возвращает задержки в мс."""
+    timings = []
+    while not uploads.done():
+        start = time.perf_counter()
+        response = await client.get("/tweets")
+        timings.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200
+    return timings
+
+
+async def run_variant(api_key: str, image: bytes, with_uploads: bool) -> list[float]:
+    """Задержки чтения ленты с загрузками в фоне или без них."""
+    async with AsyncClient(
+        app=app,
+        base_url="http://127.0.0.1:5000/api",
+        headers={"api-key": api_key},
+    ) as client:
+        if with_uploads:
+            uploads = asyncio.gather(
+                *(upload(client, image) for _ in range(UPLOADERS_COUNT))
+            )
+        else:
+            uploads = asyncio.ensure_future(asyncio.sleep(1))
+        timings = await read_feed(client, uploads)
+        await uploads
+    return timings
+
+
+async def remove_uploaded_images() -> None:
+    """Удаление загруженных файлов и записей о них."""
+    async with db_helper.session_factory() as session:
+        image_ids = (await session.scalars(select(ImageModel.id))).all()
+        for image_id in image_ids:
+            await delete_image_from_memory(session=session, image_id=image_id)
+
+
+async def main() -> None:
+    """Запуск бенчмарка."""
+    await prepare_db()
+    api_key = await seed()
+    image = make_image()
+
+    variants = (
+        ("no uploads", None, False),
+        ("inline", InlineProcessor("thread", 1, 0), True),
+        ("thread pool", ImageProcessor("thread", 2, UPLOADERS_COUNT), True),
+        ("process pool", ImageProcessor("process", 2, UPLOADERS_COUNT), True),
+    )
+    print(f"{'variant':>13} {'reads':>6} {'p50, ms':>8} {'p95, ms':>8} {'max, ms':>8}")
+    for name, processor, with_uploads in variants:
+        if processor is not None:
+            medias_services.image_processor = processor
+        timings = await run_variant(api_key, image, with_uploads)
+        p95 = (
+            statistics.quantiles(timings, n=20, method="inclusive")[-1]
+            if len(timings) > 1
+            else timings[0]
+        )
+        print(
+            f"{name:>13} {len(timings):>6} {statistics.median(timings):>8.1f}"
+            f" {p95:>8.1f} {max(timings):>8.1f}"
+        )
+        if processor is not None:
+            processor.shutdown()
+        await remove_uploaded_images()
+
+    await db_helper.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())